@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Recall vs. latency of the IVF index against exact search.
+
+Builds a synthetic, clustered set of normalized embeddings (no model
+needed), trains an IVFIndex over it, and compares top-k results for a range
+of nprobe values with brute-force scoring.
+
+Usage:
+    python benchmarks/ann_recall.py --rows 200000 --queries 200
+    python benchmarks/ann_recall.py --json ann.json
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from cc_dev.sessions.ann import IVFIndex
+
+
+def clustered_vectors(rows: int, dim: int, clusters: int, seed: int = 0):
+    """Unit vectors scattered around random cluster centres."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, rows)
+    vectors = centres[labels] + 0.6 * rng.standard_normal((rows, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def top_k(scores, k: int):
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def run(rows: int, dim: int, queries: int, k: int, nprobes: list, seed: int) -> dict:
+    matrix = clustered_vectors(rows, dim, clusters=max(8, rows // 500), seed=seed)
+    query_vectors = clustered_vectors(queries, dim, clusters=max(8, rows // 500), seed=seed + 1)
+
+    start = time.perf_counter()
+    index = IVFIndex.train(matrix, seed=seed)
+    train_seconds = time.perf_counter() - start
+
+    exact_results = []
+    start = time.perf_counter()
+    for query in query_vectors:
+        exact_results.append(set(top_k(matrix @ query, k)))
+    exact_ms = (time.perf_counter() - start) * 1000 / queries
+
+    report = {
+        "rows": rows, "dim": dim, "queries": queries, "k": k,
+        "nlist": index.nlist, "train_seconds": round(train_seconds, 3),
+        "exact_ms": round(exact_ms, 3), "ivf": [],
+    }
+
+    for nprobe in nprobes:
+        hits = 0
+        scanned = 0
+        start = time.perf_counter()
+        for query, expected in zip(query_vectors, exact_results):
+            rows_probed = index.probe(query, nprobe)
+            scores = matrix[rows_probed] @ query
+            found = rows_probed[top_k(scores, min(k, len(rows_probed)))]
+            hits += len(expected.intersection(found.tolist()))
+            scanned += len(rows_probed)
+        elapsed_ms = (time.perf_counter() - start) * 1000 / queries
+        report["ivf"].append({
+            "nprobe": nprobe,
+            "recall": round(hits / (k * queries), 4),
+            "ms": round(elapsed_ms, 3),
+            "scanned_fraction": round(scanned / (rows * queries), 4),
+        })
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    report = run(args.rows, args.dim, args.queries, args.k, args.nprobe, args.seed)
+
+    print(f"rows={report['rows']} dim={report['dim']} nlist={report['nlist']} "
+          f"train={report['train_seconds']}s exact={report['exact_ms']}ms/query")
+    print(f"{'nprobe':>6} {'recall@' + str(args.k):>10} {'ms/query':>9} {'scanned':>8}")
+    for row in report["ivf"]:
+        print(f"{row['nprobe']:>6} {row['recall']:>10.3f} {row['ms']:>9.3f} "
+              f"{row['scanned_fraction']:>8.2%}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
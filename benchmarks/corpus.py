@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic session corpora.
+
+Writes a PROJECTS_DIR-shaped tree of JSONL session files that look like
+real ones: a summary line, then turns of a user prompt, an assistant reply
+with thinking, text and a tool call, and the tool result, with the odd
+file-history snapshot. Each project talks about its own topic, so search
+has something to find. Session lengths follow a log-normal distribution,
+tools are drawn from a weighted mix, and a share of tool results is
+giant. The same arguments always write the same bytes.
+
+Usage:
+    python benchmarks/corpus.py /tmp/projects --sessions 2000
+"""
+
+import argparse
+import json
+import math
+import random
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+# Share of tool calls per tool
+DEFAULT_TOOLS = {"Read": 0.35, "Bash": 0.25, "Edit": 0.2, "Grep": 0.1, "Write": 0.05, "Task": 0.05}
+
+# Words every session uses, and the topics projects are about
+_COMMON = ("the", "this", "that", "should", "check", "change", "file", "function", "test",
+           "error", "value", "update", "code", "look", "now", "with", "before", "after")
+_TOPICS = (
+    ("jwt", "token", "auth", "login", "session", "expiry", "refresh", "oauth"),
+    ("sqlite", "index", "query", "migration", "schema", "transaction", "vacuum", "wal"),
+    ("parser", "json", "decode", "lines", "stream", "buffer", "offset", "utf8"),
+    ("embedding", "vector", "cosine", "model", "batch", "quantize", "centroid", "recall"),
+    ("react", "component", "render", "state", "hook", "props", "layout", "css"),
+    ("docker", "container", "image", "deploy", "kubernetes", "helm", "ingress", "pod"),
+    ("cache", "eviction", "ttl", "redis", "latency", "hit", "miss", "warmup"),
+    ("pytest", "fixture", "mock", "assert", "coverage", "flaky", "parametrize", "conftest"),
+)
+_BRANCHES = ("main", "develop", "feature/search", "fix/parser", "release/1.2")
+
+_BASE_TIME = datetime(2026, 1, 1, 9, 0, 0)
+
+
+def _text(rng: random.Random, topic: tuple, words: int) -> str:
+    return " ".join(rng.choice(topic) if rng.random() < 0.4 else rng.choice(_COMMON)
+                    for _ in range(words))
+
+
+def _topic(project: str) -> tuple:
+    # Not hash(): str hashes vary between processes
+    return _TOPICS[sum(project.encode()) % len(_TOPICS)]
+
+
+def _turns(rng: random.Random, median: float, max_turns: int) -> int:
+    """A log-normally distributed session length."""
+    return max(1, min(max_turns, round(rng.lognormvariate(math.log(median), 1.0))))
+
+
+def _tool_input(rng: random.Random, tool: str, project: str, turn: int) -> dict:
+    path = f"/work/{project}/src/module_{turn % 50}.py"
+    if tool == "Bash":
+        return {"command": rng.choice(["pytest -q", "git status", "ls -la", "make build"])}
+    if tool == "Edit":
+        return {"file_path": path, "old_string": "return None", "new_string": "return value"}
+    if tool == "Grep":
+        return {"pattern": rng.choice(["def ", "TODO", "import "]), "path": f"/work/{project}"}
+    if tool == "Task":
+        return {"description": "Explore the code", "prompt": "Find where the index is built"}
+    return {"file_path": path}
+
+
+def write_session(path: Path, rng: random.Random, project: str, turns: int,
+                  start: datetime, tools: dict, result_bytes: int,
+                  giant_result_rate: float, giant_result_bytes: int) -> int:
+    """
+    Write one session file.
+
+    Returns:
+        Number of lines written
+    """
+    topic = _topic(project)
+    session_id = path.stem
+    branch = rng.choice(_BRANCHES)
+    tool_names, weights = zip(*tools.items())
+    lines = [{"type": "summary", "summary": _text(rng, topic, 8), "leafUuid": session_id}]
+
+    for turn in range(turns):
+        timestamp = (start + timedelta(seconds=30 * turn)).isoformat() + "Z"
+        common = {"sessionId": session_id, "cwd": f"/work/{project}", "gitBranch": branch,
+                  "timestamp": timestamp}
+        tool = rng.choices(tool_names, weights)[0]
+        tool_id = f"toolu_{session_id[:8]}_{turn}"
+        size = giant_result_bytes if rng.random() < giant_result_rate else \
+            rng.randint(result_bytes // 4, result_bytes * 2)
+
+        lines.append({"type": "user", **common, "message": {
+            "role": "user", "content": _text(rng, topic, rng.randint(5, 60))}})
+        lines.append({"type": "assistant", **common, "message": {"role": "assistant", "content": [
+            {"type": "thinking", "thinking": _text(rng, topic, rng.randint(20, 120))},
+            {"type": "text", "text": _text(rng, topic, rng.randint(10, 80))},
+            {"type": "tool_use", "id": tool_id, "name": tool,
+             "input": _tool_input(rng, tool, project, turn)},
+        ]}})
+        lines.append({"type": "user", **common, "message": {"role": "user", "content": [
+            {"type": "tool_result", "tool_use_id": tool_id,
+             "content": (_text(rng, topic, 40) + "\n") * (size // 300 + 1)},
+        ]}})
+        if turn % 20 == 19:
+            lines.append({"type": "file-history-snapshot", "messageId": tool_id, "snapshot": {
+                "files": {f"/work/{project}/src/module_{turn % 50}.py": "x" * result_bytes}}})
+
+    with open(path, "w") as f:
+        for line in lines:
+            f.write(json.dumps(line) + "\n")
+    return len(lines)
+
+
+def write_corpus(root: Path, sessions: int = 500, projects: int = 20,
+                 median_turns: float = 30, max_turns: int = 2000,
+                 tools: Optional[dict] = None, result_bytes: int = 2000,
+                 giant_result_rate: float = 0.002, giant_result_bytes: int = 1 << 20,
+                 seed: int = 0) -> dict:
+    """
+    Write a corpus of sessions under root, one directory per project.
+
+    Args:
+        root: Directory to write into (PROJECTS_DIR)
+        sessions: Number of session files
+        projects: Number of project directories
+        median_turns: Median turns per session
+        max_turns: Most turns in a session
+        tools: Tool name to share of tool calls (default: DEFAULT_TOOLS)
+        result_bytes: Typical size of a tool result
+        giant_result_rate: Share of tool results that are giant
+        giant_result_bytes: Size of a giant tool result
+        seed: Random seed
+
+    Returns:
+        Dict with the session files (largest first), and the corpus size
+    """
+    rng = random.Random(seed)
+    root = Path(root)
+    files = []
+    total_lines = 0
+    for i in range(sessions):
+        project = f"-work-project-{i % projects:03d}"
+        (root / project).mkdir(parents=True, exist_ok=True)
+        path = root / project / f"{uuid.UUID(int=rng.getrandbits(128), version=4)}.jsonl"
+        total_lines += write_session(
+            path, rng, project, _turns(rng, median_turns, max_turns),
+            _BASE_TIME + timedelta(hours=i), tools or DEFAULT_TOOLS, result_bytes,
+            giant_result_rate, giant_result_bytes)
+        files.append(path)
+
+    sizes = {path: path.stat().st_size for path in files}
+    files.sort(key=sizes.get, reverse=True)
+    return {"files": files, "sessions": sessions, "lines": total_lines,
+            "mb": round(sum(sizes.values()) / 1e6, 1)}
+
+
+def append_turns(path: Path, turns: int, seed: int = 0) -> None:
+    """Append turns to a session file, as a live session would."""
+    rng = random.Random(seed)
+    project = path.parent.name
+    topic = _topic(project)
+    with open(path, "a") as f:
+        for _ in range(turns):
+            f.write(json.dumps({
+                "type": "user", "sessionId": path.stem, "cwd": f"/work/{project}",
+                "timestamp": _BASE_TIME.isoformat() + "Z",
+                "message": {"role": "user", "content": _text(rng, topic, 20)},
+            }) + "\n")
+
+
+def queries(count: int, seed: int = 0) -> list[str]:
+    """Search queries about the corpus topics."""
+    rng = random.Random(seed)
+    return [" ".join(rng.sample(rng.choice(_TOPICS), 3)) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("root", type=Path, help="Directory to write the projects into")
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--projects", type=int, default=20)
+    parser.add_argument("--median-turns", type=float, default=30)
+    parser.add_argument("--max-turns", type=int, default=2000)
+    parser.add_argument("--tools", type=json.loads, metavar="JSON",
+                        help='Tool mix, e.g. \'{"Read": 3, "Edit": 1}\'')
+    parser.add_argument("--result-bytes", type=int, default=2000)
+    parser.add_argument("--giant-result-rate", type=float, default=0.002)
+    parser.add_argument("--giant-result-bytes", type=int, default=1 << 20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = write_corpus(args.root, args.sessions, args.projects, args.median_turns,
+                          args.max_turns, args.tools, args.result_bytes,
+                          args.giant_result_rate, args.giant_result_bytes, args.seed)
+    print(f"Wrote {corpus['sessions']} sessions, {corpus['lines']} lines, "
+          f"{corpus['mb']}MB to {args.root}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Session parsing throughput per JSON backend, with and without prefiltering.
+
+Writes a synthetic session file shaped like real ones (prompts, assistant
+turns with thinking and tool calls, large tool results, file snapshots)
+and times the index parse and a read() scan over it. The json backend
+without the prefilter is the decoding the index used before both existed.
+
+Usage:
+    python benchmarks/parse_throughput.py --turns 5000
+    python benchmarks/parse_throughput.py --json parse.json
+"""
+
+import argparse
+import json
+import random
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from cc_dev.sessions import core, decode
+
+
+def write_session(path: Path, turns: int, result_bytes: int, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    words = ["token", "index", "parser", "request", "module", "cache", "error", "session"]
+
+    def text(n):
+        return " ".join(rng.choice(words) for _ in range(n))
+
+    with open(path, "w") as f:
+        f.write(json.dumps({"type": "summary", "summary": text(8)}) + "\n")
+        for i in range(turns):
+            timestamp = f"2026-01-05T10:{i // 60 % 60:02d}:{i % 60:02d}Z"
+            f.write(json.dumps({
+                "type": "user", "timestamp": timestamp, "cwd": "/work/project",
+                "gitBranch": "main", "message": {"role": "user", "content": text(30)},
+            }) + "\n")
+            f.write(json.dumps({
+                "type": "assistant", "timestamp": timestamp, "message": {"role": "assistant", "content": [
+                    {"type": "thinking", "thinking": text(60)},
+                    {"type": "text", "text": text(40)},
+                    {"type": "tool_use", "id": f"tool-{i}", "name": rng.choice(["Read", "Edit", "Bash"]),
+                     "input": {"file_path": f"/work/project/file_{i}.py"}},
+                ]},
+            }) + "\n")
+            f.write(json.dumps({
+                "type": "user", "timestamp": timestamp, "message": {"role": "user", "content": [
+                    {"type": "tool_result", "tool_use_id": f"tool-{i}",
+                     "content": "x" * rng.randint(result_bytes // 2, result_bytes * 2)},
+                ]},
+            }) + "\n")
+            if i % 10 == 0:
+                f.write(json.dumps({
+                    "type": "file-history-snapshot",
+                    "snapshot": {"files": {f"/work/project/file_{i}.py": "y" * result_bytes}},
+                }) + "\n")
+
+
+@contextmanager
+def settings(backend: str, prefiltered: bool):
+    original_backend, original_prefilter = core.JSON_BACKEND, decode.prefilter
+    core.JSON_BACKEND = backend
+    if not prefiltered:
+        decode.prefilter = lambda types=None, tools=None: None
+    try:
+        yield
+    finally:
+        core.JSON_BACKEND, decode.prefilter = original_backend, original_prefilter
+
+
+def best_of(repeat: int, func) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(turns: int, result_bytes: int, repeat: int, seed: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "session.jsonl"
+        write_session(path, turns, result_bytes, seed)
+        size = path.stat().st_size
+
+        report = {"turns": turns, "file_mb": round(size / 1e6, 2), "runs": []}
+        for backend in decode.available_backends():
+            for prefiltered in (False, True):
+                with settings(backend, prefiltered):
+                    parse = best_of(repeat, lambda: core._parse_session_file(path))
+                    read_all = best_of(repeat, lambda: core._extract_messages(str(path)))
+                    read_user = best_of(repeat, lambda: core._extract_messages(
+                        str(path), types=["user"]))
+                    read_edits = best_of(repeat, lambda: core._extract_messages(
+                        str(path), types=["tool_use"], tools=["Edit"]))
+                report["runs"].append({
+                    "backend": backend,
+                    "prefilter": prefiltered,
+                    "parse_mb_s": round(size / 1e6 / parse, 1),
+                    "read_all_ms": round(read_all * 1000, 1),
+                    "read_user_ms": round(read_user * 1000, 1),
+                    "read_edits_ms": round(read_edits * 1000, 1),
+                })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--turns", type=int, default=3000)
+    parser.add_argument("--result-bytes", type=int, default=4000,
+                        help="Typical size of a tool result")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    report = run(args.turns, args.result_bytes, args.repeat, args.seed)
+
+    print(f"turns={report['turns']} file={report['file_mb']}MB")
+    print(f"{'backend':>8} {'prefilter':>9} {'parse MB/s':>10} {'read all':>10} "
+          f"{'read user':>10} {'read Edit':>10}")
+    for row in report["runs"]:
+        print(f"{row['backend']:>8} {str(row['prefilter']):>9} {row['parse_mb_s']:>10.1f} "
+              f"{row['read_all_ms']:>8.1f}ms {row['read_user_ms']:>8.1f}ms "
+              f"{row['read_edits_ms']:>8.1f}ms")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
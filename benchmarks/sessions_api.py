@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Latency and throughput of the sessions API on a synthetic corpus.
+
+Writes a corpus with corpus.py into a temporary directory, points the
+index there, and measures:
+
+- sync: cold build, warm no-op sync, and an incremental sync after
+  appending to some sessions
+- search: p50/p99 per search mode, with the query cache off
+- read: p50/p99 of the first, last and middle messages of sessions,
+  largest sessions included
+- meta and list_sessions: p50/p99
+- peak RSS after each phase
+
+Everything runs in-process (no session server). The hashing embedder is
+the default, so no model is downloaded; pass --embedder
+sentence-transformers to time the real model. The JSON report records
+the commit and settings, and --compare prints the change against an
+earlier report.
+
+Usage:
+    python benchmarks/sessions_api.py --sessions 2000
+    python benchmarks/sessions_api.py --json after.json --compare before.json
+"""
+
+import argparse
+import json
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import corpus
+from cc_dev.sessions import core
+
+
+def use_index_dir(claude_dir: Path) -> None:
+    """Point the index and the projects at a directory, as tests/conftest.py does."""
+    index_dir = claude_dir / "session-index"
+    core.CLAUDE_DIR = claude_dir
+    core.PROJECTS_DIR = claude_dir / "projects"
+    core.INDEX_DIR = index_dir
+    core.DB_PATH = index_dir / "sessions.db"
+    core.EMBEDDINGS_PATH = index_dir / "embeddings.bin"
+    core.SERVER_SOCKET = index_dir / "server.sock"
+    core.QUERY_CACHE_PATH = index_dir / "query_cache.db"
+    core.CHUNKS_PATH = index_dir / "chunks.bin"
+
+
+def peak_rss_mb() -> float:
+    """Peak RSS of this process and of its largest finished child (parsers)."""
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) * scale / 1e6, 1)
+
+
+def timed(func) -> tuple:
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def percentiles(seconds: list) -> dict:
+    ms = sorted(s * 1000 for s in seconds)
+    return {"p50_ms": round(statistics.median(ms), 3),
+            "p99_ms": round(ms[min(len(ms) - 1, round(0.99 * (len(ms) - 1)))], 3),
+            "n": len(ms)}
+
+
+def latencies(calls: list, repeat: int) -> dict:
+    """Percentiles of calling each function repeat times, after a warm-up call."""
+    for call in calls:
+        call()
+    seconds = []
+    for _ in range(repeat):
+        for call in calls:
+            seconds.append(timed(call)[0])
+    return percentiles(seconds)
+
+
+def commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> dict:
+    core.USE_SERVER = False
+    core.QUERY_CACHE_SIZE = 0
+    core.EMBEDDING_BACKEND = args.embedder
+
+    report = {
+        "commit": commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "settings": {key: value for key, value in vars(args).items()
+                     if key not in ("json", "compare")},
+        "peak_rss_mb": {},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        use_index_dir(Path(tmp) / ".claude")
+        seconds, written = timed(lambda: corpus.write_corpus(
+            core.PROJECTS_DIR, args.sessions, args.projects, args.median_turns,
+            args.max_turns, result_bytes=args.result_bytes,
+            giant_result_rate=args.giant_result_rate, seed=args.seed))
+        files = written["files"]
+        report["corpus"] = {"sessions": written["sessions"], "lines": written["lines"],
+                            "mb": written["mb"], "write_seconds": round(seconds, 2)}
+
+        # Sync
+        sync = {}
+        seconds, stats = timed(lambda: core.build_index(workers=args.workers))
+        sync["cold_seconds"] = round(seconds, 3)
+        sync["cold_stats"] = stats
+        report["peak_rss_mb"]["cold_sync"] = peak_rss_mb()
+        sync["warm_seconds"] = round(timed(lambda: core.build_index(workers=args.workers))[0], 3)
+        for i, path in enumerate(files[::max(1, len(files) // args.appended)][:args.appended]):
+            corpus.append_turns(path, 5, seed=i)
+        seconds, stats = timed(lambda: core.build_index(workers=args.workers))
+        sync["incremental_seconds"] = round(seconds, 3)
+        sync["incremental_stats"] = stats
+        report["sync"] = sync
+        report["peak_rss_mb"]["sync"] = peak_rss_mb()
+
+        # Search
+        queries = corpus.queries(args.queries, args.seed)
+        core.search(queries[0])  # load the embedder
+        report["search"] = {
+            mode: latencies([lambda q=q, mode=mode: core.search(q, limit=10, mode=mode)
+                             for q in queries], args.repeat)
+            for mode in core.SEARCH_MODES
+        }
+        report["peak_rss_mb"]["search"] = peak_rss_mb()
+
+        # Read: the largest sessions, and an even sample of the rest
+        sample = files[:5] + files[5::max(1, len(files) // args.reads)][:args.reads]
+        session_ids = [path.stem for path in sample]
+        counts = {sid: sum(core.meta(sid)["message_counts"].values()) for sid in session_ids}
+        report["read"] = {
+            "first": latencies([lambda sid=sid: core.read(sid, first=10)
+                                for sid in session_ids], args.repeat),
+            "last": latencies([lambda sid=sid: core.read(sid, last=10)
+                               for sid in session_ids], args.repeat),
+            "offset": latencies([lambda sid=sid: core.read(sid, offset=counts[sid] // 2, limit=10)
+                                 for sid in session_ids], args.repeat),
+        }
+        report["meta"] = latencies([lambda sid=sid: core.meta(sid) for sid in session_ids],
+                                   args.repeat)
+        report["list_sessions"] = latencies([lambda: core.list_sessions(limit=50)],
+                                            args.repeat * 10)
+        report["peak_rss_mb"]["read"] = peak_rss_mb()
+    return report
+
+
+def flatten(report: dict, prefix: str = "") -> dict:
+    """Numeric leaves of a report, keyed by their path."""
+    values = {}
+    for key, value in report.items():
+        if isinstance(value, dict):
+            values.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[prefix + key] = value
+    return values
+
+
+def compare(before: dict, after: dict) -> None:
+    """Print timings and RSS that changed by more than 5%."""
+    old, new = flatten(before), flatten(after)
+    print(f"\nChange from {before.get('commit')} to {after.get('commit')}:")
+    for key, value in new.items():
+        if not (key.endswith(("_ms", "_seconds")) or key.startswith("peak_rss_mb")) \
+                or key.startswith(("corpus", "settings")):
+            continue
+        previous = old.get(key)
+        if previous and abs(value / previous - 1) > 0.05:
+            print(f"  {key:<40} {previous:>10} -> {value:<10} ({value / previous - 1:+.0%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--projects", type=int, default=20)
+    parser.add_argument("--median-turns", type=float, default=30)
+    parser.add_argument("--max-turns", type=int, default=2000)
+    parser.add_argument("--result-bytes", type=int, default=2000)
+    parser.add_argument("--giant-result-rate", type=float, default=0.002)
+    parser.add_argument("--embedder", default="hashing",
+                        help="Embedding backend (default: %(default)s)")
+    parser.add_argument("--workers", type=int, help="Parser processes (default: CPU count)")
+    parser.add_argument("--appended", type=int, default=20,
+                        help="Sessions appended to before the incremental sync")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--reads", type=int, default=50, help="Sessions read")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--compare", help="Earlier report to compare against")
+    args = parser.parse_args()
+
+    report = run(args)
+
+    sync = report["sync"]
+    print(f"corpus: {report['corpus']['sessions']} sessions, {report['corpus']['mb']}MB")
+    print(f"sync: cold {sync['cold_seconds']}s, warm {sync['warm_seconds']}s, "
+          f"incremental {sync['incremental_seconds']}s")
+    print(f"{'':>22} {'p50 ms':>9} {'p99 ms':>9}")
+    rows = [(f"search {mode}", value) for mode, value in report["search"].items()]
+    rows += [(f"read {kind}", value) for kind, value in report["read"].items()]
+    rows += [("meta", report["meta"]), ("list_sessions", report["list_sessions"])]
+    for name, value in rows:
+        print(f"{name:>22} {value['p50_ms']:>9.3f} {value['p99_ms']:>9.3f}")
+    print(f"peak RSS: {report['peak_rss_mb']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
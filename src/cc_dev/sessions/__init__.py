@@ -4,17 +4,24 @@ Claude Code Session History API
 Provides search, meta, read, and list operations for Claude Code session histories.
 
 Usage:
-    from cc_dev.sessions import search, meta, read, list_sessions, sync
+    from cc_dev.sessions import search, search_many, meta, read, iter_messages, list_sessions, sync
 
     # Search sessions semantically
     results = search("debugging authentication", limit=5)
 
+    # Run many searches in one batch
+    results_per_query = search_many(["login bug", "flaky test"], limit=3)
+
     # Get session metadata
     info = meta(session_id)
 
     # Read messages with filtering
     messages = read(session_id, types=["user", "assistant"])
 
+    # Stream messages of a large session without loading them all
+    for message in iter_messages(session_id, types=["tool_use"]):
+        ...
+
     # List recent sessions
     sessions = list_sessions(project="my-app", limit=10)
 
@@ -24,10 +31,13 @@ Usage:
 
 from cc_dev.sessions.core import (
     search,
+    search_many,
     meta,
     read,
+    iter_messages,
     list_sessions,
     build_index as sync,
 )
 
-__all__ = ["search", "meta", "read", "list_sessions", "sync"]
+__all__ = ["search", "search_many", "meta", "read", "iter_messages", "list_sessions",
+           "sync"]
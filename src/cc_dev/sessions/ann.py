@@ -0,0 +1,161 @@
+"""
+Approximate nearest-neighbour index for session embeddings.
+
+A pure-NumPy inverted file (IVF) index: spherical k-means centroids
+partition the embedding store, and a query only scores the rows in the
+nprobe lists whose centroids are closest to it. The index holds one list
+assignment per store row and is persisted next to the store, tagged with
+the store id so it is rebuilt whenever row numbers change.
+"""
+
+import math
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+# Training points sampled per centroid for k-means
+_SAMPLE_PER_LIST = 64
+
+# Rows scored against the centroids at a time
+_ASSIGN_BLOCK_ROWS = 16384
+
+
+def ann_path(store_path: Path) -> Path:
+    """Path of the IVF index for an embedding store."""
+    return Path(store_path).with_suffix(".ivf")
+
+
+def _nearest(vectors, centroids):
+    """Index of the closest centroid (by inner product) for each vector."""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), _ASSIGN_BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + _ASSIGN_BLOCK_ROWS], dtype=np.float32)
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def _kmeans(vectors, k: int, iterations: int = 10, seed: int = 0):
+    """Spherical k-means: centroids are kept unit length."""
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = _nearest(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=k)
+
+        # Reseed empty lists from random points
+        empty = np.flatnonzero(counts == 0)
+        if empty.size:
+            sums[empty] = vectors[rng.choice(len(vectors), empty.size, replace=False)]
+
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.maximum(norms, 1e-10)
+
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file index over the rows of an embedding store."""
+
+    def __init__(self, centroids, assignments, store_id: int = 0,
+                 trained_rows: int = 0):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.assignments = np.asarray(assignments, dtype=np.int32)
+        self.store_id = store_id
+        self.trained_rows = trained_rows
+        self._lists = None
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def train(cls, matrix, live=None, nlist: Optional[int] = None,
+              store_id: int = 0, seed: int = 0) -> "IVFIndex":
+        """
+        Cluster the live rows of matrix and assign every row to a list.
+
+        Args:
+            matrix: Normalized embeddings, one row per store row
+            live: Optional boolean mask of rows to index
+            nlist: Number of lists (default: about sqrt of the live rows)
+            store_id: Id of the store the rows belong to
+            seed: Random seed for sampling and initialization
+        """
+        rows = np.flatnonzero(live) if live is not None else np.arange(len(matrix))
+        if nlist is None:
+            nlist = int(round(math.sqrt(len(rows))))
+        nlist = max(1, min(nlist, len(rows)))
+
+        rng = np.random.default_rng(seed)
+        sample_size = min(len(rows), nlist * _SAMPLE_PER_LIST)
+        sample = np.sort(rng.choice(rows, sample_size, replace=False))
+        centroids = _kmeans(matrix[sample], nlist, seed=seed)
+
+        index = cls(centroids, np.full(len(matrix), -1, dtype=np.int32),
+                    store_id=store_id, trained_rows=len(rows))
+        index.update(rows, matrix[rows])
+        return index
+
+    def update(self, rows, vectors) -> None:
+        """Assign rows (new or re-embedded) to their nearest list."""
+        rows = np.asarray(rows, dtype=np.int64)
+        if not rows.size:
+            return
+        if rows.max() >= len(self.assignments):
+            grown = np.full(int(rows.max()) + 1, -1, dtype=np.int32)
+            grown[:len(self.assignments)] = self.assignments
+            self.assignments = grown
+        self.assignments[rows] = _nearest(vectors, self.centroids)
+        self._lists = None
+
+    def remove(self, rows) -> None:
+        """Drop rows (tombstones) from their lists."""
+        rows = np.asarray(rows, dtype=np.int64)
+        rows = rows[rows < len(self.assignments)]
+        self.assignments[rows] = -1
+        self._lists = None
+
+    def probe(self, query, nprobe: int):
+        """
+        Rows in the nprobe lists closest to a normalized query vector.
+
+        Returns:
+            Array of store row indices
+        """
+        if self._lists is None:
+            order = np.argsort(self.assignments, kind="stable")
+            bounds = np.searchsorted(self.assignments[order], np.arange(self.nlist + 1))
+            self._lists = (order, bounds)
+        order, bounds = self._lists
+
+        nprobe = max(1, min(nprobe, self.nlist))
+        scores = self.centroids @ np.asarray(query, dtype=np.float32)
+        nearest = np.argpartition(-scores, nprobe - 1)[:nprobe]
+        return np.concatenate([order[bounds[i]:bounds[i + 1]] for i in nearest])
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["IVFIndex"]:
+        """Load an index, or return None if it doesn't exist."""
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                return cls(data["centroids"], data["assignments"],
+                           store_id=int(data["store_id"]),
+                           trained_rows=int(data["trained_rows"]))
+        except FileNotFoundError:
+            return None
+
+    def save(self, path: Path) -> None:
+        """Write the index atomically."""
+        path = Path(path)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, centroids=self.centroids, assignments=self.assignments,
+                     store_id=np.uint64(self.store_id),
+                     trained_rows=np.int64(self.trained_rows))
+        os.replace(tmp_path, path)
@@ -0,0 +1,111 @@
+"""
+Persistent query cache for session search.
+
+Two least-recently-used tables in a small SQLite database next to the
+index: query text to query embedding (per model), and search arguments to
+results. Results are tagged with the index generation they were computed
+at; build_index bumps the generation whenever the index changes, so stale
+results are never served. The cache is disposable, so it trades
+durability for speed and its writes are best-effort.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+
+class QueryCache:
+    """LRU caches of query embeddings and search results."""
+
+    def __init__(self, path: Path, size: int):
+        self.path = Path(path)
+        self.size = size
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=0.1, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            PRAGMA synchronous = OFF;
+
+            CREATE TABLE IF NOT EXISTS query_embeddings (
+                model TEXT,
+                query TEXT,
+                vector BLOB,
+                used_at REAL,
+                PRIMARY KEY (model, query)
+            );
+
+            CREATE TABLE IF NOT EXISTS query_results (
+                key TEXT PRIMARY KEY,
+                generation INTEGER,
+                results TEXT,
+                used_at REAL
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_query_embeddings_used ON query_embeddings(used_at);
+            CREATE INDEX IF NOT EXISTS idx_query_results_used ON query_results(used_at);
+        """)
+
+    def embedding(self, model: str, query: str):
+        """Cached embedding of a query, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vector FROM query_embeddings WHERE model = ? AND query = ?",
+                (model, query)
+            ).fetchone()
+            if row is None:
+                return None
+            self._touch("query_embeddings", "model = ? AND query = ?", (model, query))
+        return np.frombuffer(row[0], dtype=np.float32)
+
+    def put_embedding(self, model: str, query: str, vector) -> None:
+        vector = np.asarray(vector, dtype=np.float32)
+        self._put("query_embeddings", "(model, query, vector, used_at) VALUES (?, ?, ?, ?)",
+                  (model, query, vector.tobytes(), time.time()))
+
+    def results(self, key: str, generation: int) -> Optional[list]:
+        """Cached results for a search key at this index generation, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT results FROM query_results WHERE key = ? AND generation = ?",
+                (key, generation)
+            ).fetchone()
+            if row is None:
+                return None
+            self._touch("query_results", "key = ?", (key,))
+        return json.loads(row[0])
+
+    def put_results(self, key: str, generation: int, results: list) -> None:
+        self._put("query_results", "(key, generation, results, used_at) VALUES (?, ?, ?, ?)",
+                  (key, generation, json.dumps(results), time.time()),
+                  stale=("generation != ?", (generation,)))
+
+    def _touch(self, table: str, where: str, params: tuple) -> None:
+        try:
+            self._conn.execute(f"UPDATE {table} SET used_at = ? WHERE {where}",
+                               (time.time(), *params))
+        except sqlite3.OperationalError:
+            pass  # locked by another writer; the entry just ages sooner
+
+    def _put(self, table: str, values: str, params: tuple, stale=None) -> None:
+        """Insert an entry and evict the least recently used beyond size."""
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                if stale is not None:
+                    self._conn.execute(f"DELETE FROM {table} WHERE {stale[0]}", stale[1])
+                self._conn.execute(f"INSERT OR REPLACE INTO {table} {values}", params)
+                self._conn.execute(f"""
+                    DELETE FROM {table} WHERE rowid IN (
+                        SELECT rowid FROM {table} ORDER BY used_at DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.size,))
+                self._conn.execute("COMMIT")
+            except sqlite3.OperationalError:
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
@@ -5,34 +5,194 @@ Claude Code Session History API
 Provides search, meta, and read operations for Claude Code session histories.
 """
 
+import bisect
+import functools
+import inspect
 import json
 import os
+import re
 import sqlite3
+import time
 from pathlib import Path
 from datetime import datetime
-from typing import Optional
-from collections import defaultdict
+from typing import Callable, Iterator, Optional
+from array import array
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from itertools import islice, repeat
 import hashlib
 
 # Lazy imports for heavy dependencies
-_model = None
 _np = None
 
+# Loaded embedder per embedder name
+_embedders = {}
+
+# Open embedding store per path, with the file stats it was opened at
+_store_cache = {}
+
+# Open query cache per path
+_query_caches = {}
+
+# JSON decoder per backend
+_decoders = {}
+
 CLAUDE_DIR = Path.home() / ".claude"
 PROJECTS_DIR = CLAUDE_DIR / "projects"
 INDEX_DIR = CLAUDE_DIR / "session-index"
 DB_PATH = INDEX_DIR / "sessions.db"
-EMBEDDINGS_PATH = INDEX_DIR / "embeddings.npy"
+EMBEDDINGS_PATH = INDEX_DIR / "embeddings.bin"
+SERVER_SOCKET = INDEX_DIR / "server.sock"
+QUERY_CACHE_PATH = INDEX_DIR / "query_cache.db"
+CHUNKS_PATH = INDEX_DIR / "chunks.bin"
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+# Embedding backend: "sentence-transformers", "onnx" (EMBEDDING_MODEL
+# exported to ONNX, run without torch) or "hashing" (NumPy feature
+# hashing, no model files)
+EMBEDDING_BACKEND = os.environ.get("CC_DEV_SESSIONS_EMBEDDER", "sentence-transformers")
+# Storage precision of the embedding matrix: "float32" or "float16"
+EMBEDDING_DTYPE = "float32"
+# Optional quantized mirror scanned first by search: None, "int8" or "float16"
+EMBEDDING_QUANTIZATION = None
+# Candidates per requested result that search rescores at full precision
+RESCORE_FACTOR = 4
 
+# Bytes read from each end of a file for the sampled content hash
+HASH_SAMPLE_BYTES = 65536
 
-def _get_model():
-    """Lazy load the sentence transformer model."""
-    global _model
-    if _model is None:
-        from sentence_transformers import SentenceTransformer
-        _model = SentenceTransformer(EMBEDDING_MODEL)
-    return _model
+# Keep an IVF index for approximate search (opt-in: faster searches of
+# large indexes, at some loss of recall)
+ANN_INDEX = False
+
+# Stores with fewer live rows than this get no IVF index even with ANN_INDEX
+ANN_MIN_ROWS = 50000
+
+# Inverted lists scanned per query by approximate search
+ANN_NPROBE = 8
+
+# Entries kept in each query cache table (0 disables caching)
+QUERY_CACHE_SIZE = 1000
+
+# Route search/meta/read/list_sessions to a running session server
+USE_SERVER = os.environ.get("CC_DEV_SESSIONS_SERVER", "1") != "0"
+
+# Decoder of session lines: None for the fastest installed, or "orjson",
+# "msgspec" or "json"
+JSON_BACKEND = None
+
+# Seconds to wait for the session server to accept a call before running
+# it in-process
+SERVER_TIMEOUT = 30.0
+
+# Settings that change what the served functions return. They are sent with
+# each server call, which runs in-process when the server's differ.
+SERVER_SETTINGS = ("PROJECTS_DIR", "EMBEDDINGS_PATH", "CHUNKS_PATH", "QUERY_CACHE_PATH",
+                   "EMBEDDING_BACKEND", "EMBEDDING_MODEL", "EMBEDDING_QUANTIZATION",
+                   "RESCORE_FACTOR", "ANN_INDEX", "ANN_NPROBE", "QUERY_CACHE_SIZE", "JSON_BACKEND",
+                   "CHUNK_EMBEDDINGS", "CHUNK_DEPTH", "MESSAGE_STORE", "RRF_K")
+
+# Called with the phase timings and counters of each build_index, search and
+# search_many call (see trace.py); calls run in-process while it is set
+TRACE_HOOK = None
+
+# Also embed windows of each session's user and assistant text (opt-in:
+# finds topics past the first prompt, at the cost of a much larger index)
+CHUNK_EMBEDDINGS = False
+
+# Also store every extracted message in sessions.db, so read() is served
+# without the session files (opt-in: the database grows by about the
+# displayed size of all sessions)
+MESSAGE_STORE = False
+
+# Characters of message content (and of each tool input value) kept in the
+# message store; None keeps what read() returns from the file
+MESSAGE_TEXT_CHARS = None
+
+# Characters of message text per chunk window
+CHUNK_CHARS = 1000
+
+# Chunks ranked per requested result before taking each session's best
+CHUNK_DEPTH = 8
+
+# Search modes: embeddings only, keyword (BM25) only, or both fused
+SEARCH_MODES = ("semantic", "keyword", "hybrid")
+
+# Rank offset of reciprocal rank fusion in hybrid search
+RRF_K = 60
+
+# Share of tombstoned rows above which build_index compacts the store
+COMPACT_TOMBSTONE_RATIO = 0.25
+
+# Sentences per model.encode batch when embedding sessions
+ENCODE_BATCH_SIZE = 64
+
+# Model processes encoding embeddings in syncs of at least
+# _ENCODE_POOL_MIN_FILES changed files (0 or 1 encodes in this process;
+# the pool pays off on many-core machines, at a model load per process)
+ENCODE_WORKERS = 0
+
+# Below this many changed files, build_index parses in-process
+_PARALLEL_MIN_FILES = 8
+
+# Below this many changed files, build_index encodes in-process
+_ENCODE_POOL_MIN_FILES = 1000
+
+# Sentences per model.encode batch, and chunks embedded per store write
+_CHUNK_ENCODE_BATCH = 256
+_CHUNK_WRITE_BATCH = 4096
+
+# Results taken from each ranking before hybrid fusion
+_HYBRID_DEPTH = 50
+
+# Scores held in memory at once when ranking many queries together
+_SCORE_BLOCK_ELEMENTS = 1 << 25
+
+# Parsed sessions written to the database per executemany batch
+_WRITE_BATCH_SIZE = 500
+
+# Type codes of messages in the per-session message index
+_MESSAGE_TYPE_CODES = {
+    "user": 1,
+    "assistant": 2,
+    "summary": 3,
+    "thinking": 4,
+    "tool_use": 5,
+    "tool_result": 6,
+}
+
+# Columns added after the original schema, applied to existing databases
+_SESSION_COLUMN_MIGRATIONS = {
+    "file_size": "INTEGER",
+    "file_mtime_ns": "INTEGER",
+    "file_inode": "INTEGER",
+    "parsed_offset": "INTEGER",
+    "parsed_digest": "TEXT",
+    "extracted_messages": "INTEGER",
+    "stored_messages": "INTEGER",
+}
+
+# Columns recording what produced each vector, added to existing databases
+_EMBEDDING_COLUMN_MIGRATIONS = {
+    "text_digest": "TEXT",
+    "model": "TEXT",
+}
+
+
+def _get_embedder():
+    """Lazy load the embedder of EMBEDDING_BACKEND and EMBEDDING_MODEL."""
+    name = _embedder_name()
+    embedder = _embedders.get(name)
+    if embedder is None:
+        from cc_dev.sessions.embedders import get_embedder
+        embedder = _embedders[name] = get_embedder(EMBEDDING_BACKEND, EMBEDDING_MODEL)
+    return embedder
+
+
+def _embedder_name() -> str:
+    """Name recorded with vectors of the configured embedder, without loading it."""
+    from cc_dev.sessions.embedders import embedder_name
+    return embedder_name(EMBEDDING_BACKEND, EMBEDDING_MODEL)
 
 
 def _get_numpy():
@@ -44,6 +204,180 @@ def _get_numpy():
     return _np
 
 
+def _get_loads():
+    """JSON decoder of session lines for JSON_BACKEND."""
+    return _loads_for(JSON_BACKEND)
+
+
+def _loads_for(backend: Optional[str]):
+    """JSON decoder of session lines for a JSON_BACKEND value."""
+    loads = _decoders.get(backend)
+    if loads is None:
+        from cc_dev.sessions.decode import get_loads
+        loads = _decoders[backend] = get_loads(backend)
+    return loads
+
+
+def _server_settings() -> dict:
+    """Current values of SERVER_SETTINGS, as sent to and compared by the server."""
+    module = globals()
+    return {name: str(module[name]) if isinstance(module[name], Path) else module[name]
+            for name in SERVER_SETTINGS}
+
+
+def _served(func):
+    """
+    Route calls to the session server when one is listening.
+
+    Calls run in-process when USE_SERVER is off, they are traced
+    (TRACE_HOOK or CC_DEV_SESSIONS_PROFILE is set), no socket exists, the
+    server doesn't accept the call within SERVER_TIMEOUT, serves another
+    index or runs with other SERVER_SETTINGS, or the arguments aren't
+    JSON-serializable. Errors raised by the server are reproduced by
+    re-running the call in-process. Once accepted, a call waits for the
+    server however long it takes, as it would in-process.
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        from cc_dev.sessions.trace import profiling
+
+        if USE_SERVER and TRACE_HOOK is None and not profiling() and SERVER_SOCKET.exists():
+            from cc_dev.sessions.server import ServerError, call
+
+            params = signature.bind(*args, **kwargs).arguments
+            try:
+                return call(SERVER_SOCKET, func.__name__, params, index=str(DB_PATH),
+                            settings=_server_settings(), timeout=SERVER_TIMEOUT)
+            except (OSError, ValueError, TypeError, ServerError):
+                pass
+        return func(*args, **kwargs)
+
+    return wrapper
+
+
+def _traced(func):
+    """Trace calls, passing each trace to TRACE_HOOK; see trace.py."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        from cc_dev.sessions.trace import traced
+
+        with traced(func.__name__, TRACE_HOOK):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def _load_embeddings(path: Optional[Path] = None):
+    """
+    Open an embedding store, reusing the mapping while its files are unchanged.
+
+    Args:
+        path: Store to open (default: EMBEDDINGS_PATH)
+
+    Returns:
+        EmbeddingStore, or None if no store has been written yet
+    """
+    from cc_dev.sessions.store import EmbeddingStore, ids_path
+
+    path = path or EMBEDDINGS_PATH
+    for attempt in range(2):
+        try:
+            st = path.stat()
+            ids_st = ids_path(path).stat()
+        except FileNotFoundError:
+            return None
+
+        key = (st.st_ino, st.st_mtime_ns, st.st_size, ids_st.st_ino, ids_st.st_mtime_ns)
+        cached = _store_cache.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        try:
+            store = EmbeddingStore.open(path)
+        except ValueError:
+            # The store and its sidecars are replaced one after the other;
+            # a reader can land in between once
+            if attempt:
+                raise
+            continue
+        _store_cache[path] = (key, store)
+        return store
+
+
+def _load_quantized(store):
+    """Open the quantized mirror of a store, or None if it has no current one."""
+    from cc_dev.sessions.store import quantized_path
+
+    mirror = _load_embeddings(quantized_path(store.path))
+    if mirror is None or mirror.store_id != store.store_id or mirror.rows != store.rows:
+        return None
+    return mirror
+
+
+def _get_query_cache():
+    """Open the query cache, or None when caching is off or unavailable."""
+    if QUERY_CACHE_SIZE <= 0:
+        return None
+    cache = _query_caches.get(QUERY_CACHE_PATH)
+    if cache is None:
+        from cc_dev.sessions.cache import QueryCache
+
+        try:
+            cache = QueryCache(QUERY_CACHE_PATH, QUERY_CACHE_SIZE)
+        except sqlite3.Error:
+            return None
+        _query_caches[QUERY_CACHE_PATH] = cache
+    cache.size = QUERY_CACHE_SIZE
+    return cache
+
+
+def _db() -> sqlite3.Connection:
+    """This thread's shared read connection to DB_PATH; don't close it."""
+    from cc_dev.sessions.db import connection
+    return connection(DB_PATH)
+
+
+def _index_generation() -> int:
+    """Counter bumped by build_index whenever the index changes."""
+    try:
+        row = _db().execute("SELECT value FROM index_state WHERE key = 'generation'").fetchone()
+    except sqlite3.OperationalError:
+        row = None  # built before generations were tracked
+    return row[0] if row else 0
+
+
+def _index_embedder() -> Optional[str]:
+    """Name of the embedder that produced the index's vectors, if recorded."""
+    try:
+        row = _db().execute("SELECT value FROM index_state WHERE key = 'embedder'").fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    return row[0] if row else None
+
+
+def _check_embedder() -> None:
+    """
+    Make sure query vectors will be comparable with the index's.
+
+    Raises:
+        ValueError: The index was embedded by another embedder
+    """
+    embedder = _index_embedder()
+    if embedder is not None and embedder != _embedder_name():
+        raise ValueError(f"The index was embedded with {embedder}, not {_embedder_name()}; "
+                         "run sync() to re-embed it")
+
+
+def _bump_generation(conn: sqlite3.Connection):
+    conn.execute("""
+        INSERT INTO index_state (key, value) VALUES ('generation', 1)
+        ON CONFLICT(key) DO UPDATE SET value = value + 1
+    """)
+    conn.commit()
+
+
 def _init_db(conn: sqlite3.Connection):
     """Initialize database schema."""
     conn.executescript("""
@@ -66,58 +400,191 @@ def _init_db(conn: sqlite3.Connection):
             first_user_message TEXT,
             file_path TEXT,
             file_hash TEXT,
-            indexed_at TEXT
+            indexed_at TEXT,
+            file_size INTEGER,
+            file_mtime_ns INTEGER,
+            file_inode INTEGER,
+            parsed_offset INTEGER,
+            parsed_digest TEXT,
+            extracted_messages INTEGER,
+            stored_messages INTEGER
         );
 
         CREATE TABLE IF NOT EXISTS embeddings_meta (
             id INTEGER PRIMARY KEY,
             session_id TEXT,
             text TEXT,
+            text_digest TEXT,
+            model TEXT,
             FOREIGN KEY (session_id) REFERENCES sessions(session_id)
         );
 
+        CREATE VIRTUAL TABLE IF NOT EXISTS sessions_fts USING fts5(
+            session_id UNINDEXED,
+            content
+        );
+
+        CREATE TABLE IF NOT EXISTS chunks (
+            session_id TEXT,
+            chunk_no INTEGER,
+            position INTEGER,
+            text TEXT,
+            model TEXT,
+            PRIMARY KEY (session_id, chunk_no)
+        );
+
+        CREATE TABLE IF NOT EXISTS message_index (
+            session_id TEXT PRIMARY KEY,
+            line_offsets BLOB,
+            type_codes BLOB
+        );
+
+        CREATE TABLE IF NOT EXISTS messages (
+            session_id TEXT,
+            position INTEGER,
+            type TEXT,
+            timestamp TEXT,
+            tool_name TEXT,
+            tool_use_id TEXT,
+            content TEXT,
+            input_json TEXT,
+            PRIMARY KEY (session_id, position)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS index_state (
+            key TEXT PRIMARY KEY,
+            value INTEGER
+        );
+
         CREATE INDEX IF NOT EXISTS idx_sessions_project ON sessions(project_path);
         CREATE INDEX IF NOT EXISTS idx_sessions_start ON sessions(start_time);
+        CREATE INDEX IF NOT EXISTS idx_sessions_file ON sessions(file_path);
         CREATE INDEX IF NOT EXISTS idx_embeddings_session ON embeddings_meta(session_id);
+        CREATE INDEX IF NOT EXISTS idx_messages_type ON messages(session_id, type, position);
+        CREATE INDEX IF NOT EXISTS idx_messages_tool ON messages(session_id, tool_name, position);
     """)
+
+    added = set()
+    for table, migrations in (("sessions", _SESSION_COLUMN_MIGRATIONS),
+                              ("embeddings_meta", _EMBEDDING_COLUMN_MIGRATIONS)):
+        existing_columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for column, column_type in migrations.items():
+            if column not in existing_columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+                added.add((table, column))
+
+    # Vectors stored before models were recorded came from the configured
+    # sentence-transformers model, whose embedder is named after it
+    if ("embeddings_meta", "model") in added:
+        conn.executemany(
+            "UPDATE embeddings_meta SET text_digest = ?, model = ? WHERE id = ?",
+            [(_text_digest(text), EMBEDDING_MODEL, row_id)
+             for row_id, text in conn.execute("SELECT id, text FROM embeddings_meta").fetchall()]
+        )
     conn.commit()
 
 
-def _parse_session_file(file_path: Path) -> dict:
-    """Parse a session JSONL file and extract metadata."""
+def _parse_session_file(file_path: Path, start: int = 0,
+                        previous: Optional[dict] = None,
+                        store_messages: bool = False,
+                        text_chars: Optional[int] = None,
+                        loads=None, sample_bytes: Optional[int] = None) -> dict:
+    """
+    Parse a session JSONL file and extract metadata.
+
+    Session files only grow by appended lines. When previous holds the
+    indexed row from a parse that stopped at byte start, only the new tail
+    is read and its aggregates are merged into the previous ones.
+
+    Messages are numbered the way read() returns them unfiltered, so the
+    position of each user and assistant text (returned in "texts") is a
+    valid read() offset. "line_offsets" and "type_codes" give the byte
+    offset of the line holding each parsed message and its type code.
+    With store_messages, "messages" holds the message store rows of the
+    parsed messages, their content cut to text_chars. loads and
+    sample_bytes default to the decoder of JSON_BACKEND and to
+    HASH_SAMPLE_BYTES.
+    """
+    # (position, text) of user and assistant text in the parsed lines
+    texts = []
+
+    # Message store rows of the parsed lines
     messages = []
-    summaries = []
-    tools_used = defaultdict(int)
-    first_user_message = None
-    start_time = None
-    end_time = None
-    git_branch = None
-    project_path = None
-
-    counts = {
-        "user": 0,
-        "assistant": 0,
-        "tool_use": 0,
-        "tool_result": 0,
-        "thinking": 0,
-        "summary": 0,
-    }
 
-    with open(file_path, 'r') as f:
-        for line in f:
-            line = line.strip()
+    # Message index entries of the parsed lines
+    line_offsets = array("Q")
+    type_codes = bytearray()
+
+    if previous is not None:
+        first_position = previous["extracted_messages"]
+        summaries = json.loads(previous["summaries_json"])
+        tools_used = defaultdict(int, json.loads(previous["tools_json"]))
+        first_user_message = previous["first_user_message"]
+        start_time = previous["start_time"]
+        end_time = previous["end_time"]
+        git_branch = previous["git_branch"]
+        project_path = previous["project_path"]
+        counts = {
+            "user": previous["user_count"],
+            "assistant": previous["assistant_count"],
+            "tool_use": previous["tool_use_count"],
+            "tool_result": previous["tool_result_count"],
+            "thinking": previous["thinking_count"],
+            "summary": previous["summary_count"],
+        }
+    else:
+        start = 0
+        first_position = 0
+        summaries = []
+        tools_used = defaultdict(int)
+        first_user_message = None
+        start_time = None
+        end_time = None
+        git_branch = None
+        project_path = None
+        counts = {
+            "user": 0,
+            "assistant": 0,
+            "tool_use": 0,
+            "tool_result": 0,
+            "thinking": 0,
+            "summary": 0,
+        }
+
+    if loads is None:
+        loads = _get_loads()
+    parsed_offset = start
+
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        for raw_line in f:
+            line_start = parsed_offset
+            line_end = parsed_offset + len(raw_line)
+            line = raw_line.strip()
             if not line:
+                parsed_offset = line_end
                 continue
             try:
-                msg = json.loads(line)
-            except json.JSONDecodeError:
+                msg = loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                # An unterminated last line may still be mid-write; leave it
+                # for the next sync instead of skipping past it.
+                if raw_line.endswith(b"\n"):
+                    parsed_offset = line_end
                 continue
+            parsed_offset = line_end
+
+            if store_messages:
+                for message in _line_messages(msg):
+                    messages.append(_message_row(first_position + len(messages),
+                                                 message, text_chars))
 
             msg_type = msg.get("type")
 
             if msg_type == "summary":
                 summaries.append(msg.get("summary", ""))
                 counts["summary"] += 1
+                type_codes.append(_MESSAGE_TYPE_CODES["summary"])
 
             elif msg_type == "user":
                 counts["user"] += 1
@@ -136,14 +603,21 @@ def _parse_session_file(file_path: Path) -> dict:
                 # Extract user text (not tool results)
                 content = msg.get("message", {}).get("content")
                 if isinstance(content, str):
+                    texts.append((first_position + len(type_codes), content))
+                    type_codes.append(_MESSAGE_TYPE_CODES["user"])
                     if first_user_message is None:
                         first_user_message = content[:500]
                 elif isinstance(content, list):
                     for block in content:
                         if block.get("type") == "tool_result":
                             counts["tool_result"] += 1
-                        elif block.get("type") == "text" and first_user_message is None:
-                            first_user_message = block.get("text", "")[:500]
+                            type_codes.append(_MESSAGE_TYPE_CODES["tool_result"])
+                        elif block.get("type") == "text":
+                            texts.append((first_position + len(type_codes),
+                                          block.get("text", "")))
+                            type_codes.append(_MESSAGE_TYPE_CODES["user"])
+                            if first_user_message is None:
+                                first_user_message = block.get("text", "")[:500]
 
             elif msg_type == "assistant":
                 counts["assistant"] += 1
@@ -155,8 +629,17 @@ def _parse_session_file(file_path: Path) -> dict:
                             counts["tool_use"] += 1
                             tool_name = block.get("name", "unknown")
                             tools_used[tool_name] += 1
+                            type_codes.append(_MESSAGE_TYPE_CODES["tool_use"])
                         elif block_type == "thinking":
                             counts["thinking"] += 1
+                            type_codes.append(_MESSAGE_TYPE_CODES["thinking"])
+                        elif block_type == "text":
+                            texts.append((first_position + len(type_codes),
+                                          block.get("text", "")))
+                            type_codes.append(_MESSAGE_TYPE_CODES["assistant"])
+
+            # Every message extracted from this line starts at line_start
+            line_offsets.extend(repeat(line_start, len(type_codes) - len(line_offsets)))
 
     session_id = file_path.stem
 
@@ -178,222 +661,1810 @@ def _parse_session_file(file_path: Path) -> dict:
         "summaries_json": json.dumps(summaries),
         "first_user_message": first_user_message,
         "file_path": str(file_path),
+        "parsed_offset": parsed_offset,
+        "parsed_digest": _file_hash(file_path, sampled=True, length=parsed_offset,
+                                    sample_bytes=sample_bytes),
+        "extracted_messages": first_position + len(type_codes),
         "summaries": summaries,
+        "texts": [(position, text) for position, text in texts if text],
+        "line_offsets": line_offsets,
+        "type_codes": bytes(type_codes),
+        "messages": messages,
     }
 
 
-def _file_hash(file_path: Path) -> str:
-    """Calculate MD5 hash of file for change detection."""
+def _file_fingerprint(file_path: Path) -> tuple:
+    """Return (size, mtime_ns, inode) for stat-based change detection."""
+    st = file_path.stat()
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+def _hashed_bytes(size: int, sampled: bool, sample_bytes: Optional[int] = None) -> int:
+    """Bytes _file_hash reads from a file of this size."""
+    if sample_bytes is None:
+        sample_bytes = HASH_SAMPLE_BYTES
+    return min(size, 2 * sample_bytes) if sampled else size
+
+
+def _file_hash(file_path: Path, sampled: bool = False,
+               length: Optional[int] = None,
+               sample_bytes: Optional[int] = None) -> str:
+    """
+    Calculate MD5 hash of file for change detection.
+
+    With sampled=True only the first and last sample_bytes (default
+    HASH_SAMPLE_BYTES) are hashed, together with the file size. Session
+    files are append-only, so any real change moves the size or the tail;
+    this avoids reading large files whole. With length set, only the first
+    length bytes of the file are considered.
+    """
+    if sample_bytes is None:
+        sample_bytes = HASH_SAMPLE_BYTES
     hasher = hashlib.md5()
     with open(file_path, 'rb') as f:
-        for chunk in iter(lambda: f.read(65536), b''):
-            hasher.update(chunk)
+        size = os.fstat(f.fileno()).st_size
+        if length is not None:
+            size = min(size, length)
+        if sampled:
+            hasher.update(str(size).encode())
+            hasher.update(f.read(min(size, sample_bytes)))
+            if size > 2 * sample_bytes:
+                f.seek(size - sample_bytes)
+            hasher.update(f.read(max(0, min(size - f.tell(), sample_bytes))))
+        else:
+            remaining = size
+            while remaining > 0:
+                chunk = f.read(min(65536, remaining))
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                remaining -= len(chunk)
     return hasher.hexdigest()
 
 
-def build_index(force: bool = False, verbose: bool = False) -> dict:
+def _embed_text(metadata: dict) -> str:
+    """Build the text embedded for a session: summaries plus first prompt."""
+    embed_text_parts = []
+    if metadata["summaries"]:
+        embed_text_parts.extend(metadata["summaries"])
+    if metadata["first_user_message"]:
+        embed_text_parts.append(metadata["first_user_message"])
+    return " ".join(embed_text_parts)[:1000] if embed_text_parts else ""
+
+
+def _text_digest(text: str) -> str:
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+def _all_embedding_texts(conn: sqlite3.Connection) -> list:
+    """All (session_id, embed_text) pairs recorded in the index."""
+    return conn.execute(
+        "SELECT session_id, text FROM embeddings_meta ORDER BY id"
+    ).fetchall()
+
+
+def _unembedded_texts(conn: sqlite3.Connection) -> list:
     """
-    Build or update the session index.
+    (session_id, embed_text) pairs without a vector from the configured embedder.
 
-    Args:
-        force: Rebuild entire index even if files haven't changed
-        verbose: Print progress information
+    An embedding text's model is cleared whenever the text changes and set
+    once its vector is stored, so these are the new and edited texts plus
+    any embedded by another model.
+    """
+    return conn.execute(
+        "SELECT session_id, text FROM embeddings_meta WHERE model IS NOT ? ORDER BY id",
+        (_embedder_name(),)
+    ).fetchall()
+
+
+def _update_quantized(store, changed_rows: list) -> bool:
+    """
+    Bring the quantized mirror of the store in line with it.
+
+    The mirror shares the store's id and row numbers. It is rebuilt when the
+    store was rewritten, the quantization mode changed, or changed rows fall
+    outside the int8 scale it was fitted with; otherwise only the changed
+    rows are copied over. With EMBEDDING_QUANTIZATION unset, any
+    mirror is removed.
 
     Returns:
-        Dict with indexing statistics
+        True if a mirror exists after the update
     """
-    INDEX_DIR.mkdir(parents=True, exist_ok=True)
+    from cc_dev.sessions.store import EmbeddingStore, quantized_path, sidecar_paths
+
+    path = quantized_path(store.path)
+    if EMBEDDING_QUANTIZATION is None:
+        for stale in (path, *sidecar_paths(path)):
+            stale.unlink(missing_ok=True)
+        return False
+
+    mirror = EmbeddingStore.open(path, writable=True)
+    if mirror is not None:
+        copied = sorted(set(changed_rows) | set(range(mirror.rows, store.rows)))
+    if (mirror is None or mirror.store_id != store.store_id
+            or mirror.dtype != EMBEDDING_QUANTIZATION or mirror.rows > store.rows
+            or not mirror.fits(store.matrix[copied])):
+        EmbeddingStore.create(path, store.matrix, store.session_ids, store.attributes,
+                              dtype=EMBEDDING_QUANTIZATION, store_id=store.store_id)
+    else:
+        mirror.mirror(store, copied)
+    return True
+
 
-    conn = sqlite3.connect(DB_PATH)
-    _init_db(conn)
+def _update_ann(store, changed_rows: list) -> Optional[str]:
+    """
+    Build or refresh the IVF index of a store, with ANN_INDEX set and the
+    store large enough to need one.
 
-    # Get existing indexed files
-    existing = {}
-    if not force:
-        cursor = conn.execute("SELECT file_path, file_hash FROM sessions")
-        existing = {row[0]: row[1] for row in cursor.fetchall()}
+    The index is retrained when the store was rewritten (row numbers
+    changed) or has grown well past the rows it was trained on; otherwise
+    only the changed rows are reassigned or dropped.
 
-    # Find all session files
-    session_files = list(PROJECTS_DIR.glob("*/*.jsonl"))
+    Returns:
+        "trained", "updated", or None when ANN_INDEX is off or the store is
+        below ANN_MIN_ROWS
+    """
+    from cc_dev.sessions.ann import IVFIndex, ann_path
 
-    stats = {"total": len(session_files), "indexed": 0, "skipped": 0, "errors": 0}
-    sessions_to_embed = []
+    np = _get_numpy()
+    path = ann_path(store.path)
+    live_rows = store.rows - store.tombstones
+    if not ANN_INDEX or live_rows < ANN_MIN_ROWS:
+        path.unlink(missing_ok=True)
+        return None
 
-    for file_path in session_files:
-        file_path_str = str(file_path)
-        current_hash = _file_hash(file_path)
+    index = IVFIndex.load(path)
+    if (index is None or index.store_id != store.store_id
+            or live_rows > 4 * index.trained_rows):
+        IVFIndex.train(store.matrix, store.live, store_id=store.store_id).save(path)
+        return "trained"
 
-        # Skip if unchanged
-        if file_path_str in existing and existing[file_path_str] == current_hash:
-            stats["skipped"] += 1
-            continue
+    rows = sorted(row for row in set(changed_rows) if store.session_ids[row] is not None)
+    index.update(rows, store.matrix[rows])
+    assigned = index.assignments[:store.rows] >= 0
+    index.remove(np.flatnonzero(assigned & ~store.live[:len(assigned)]))
+    index.save(path)
+    return "updated"
+
+
+def _load_ann(store):
+    """
+    Open the IVF index of a store, or None if it has none (or a stale one)
+    or ANN_INDEX is off.
+    """
+    from cc_dev.sessions.ann import IVFIndex, ann_path
+
+    if not ANN_INDEX:
+        return None
+    path = ann_path(store.path)
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
 
+    key = (st.st_ino, st.st_mtime_ns, st.st_size)
+    cached = _store_cache.get(path)
+    if cached is not None and cached[0] == key:
+        index = cached[1]
+    else:
+        index = IVFIndex.load(path)
+        _store_cache[path] = (key, index)
+    if index is None or index.store_id != store.store_id:
+        return None
+    return index
+
+
+def _session_attributes(conn: sqlite3.Connection, session_ids: list,
+                        known: dict) -> list:
+    """
+    Filter attributes (project, branch, start time) stored with each embedding.
+
+    Sessions parsed in this sync are taken from known; others are read from
+    the sessions table.
+    """
+    found = dict(known)
+    missing = [sid for sid in session_ids if sid not in found]
+    if missing:
+        query = "SELECT session_id, project_name, git_branch, start_time FROM sessions"
+        if len(missing) <= 500:
+            query += f" WHERE session_id IN ({', '.join('?' * len(missing))})"
+            cursor = conn.execute(query, missing)
+        else:
+            cursor = conn.execute(query)
+        for row in cursor:
+            found.setdefault(row[0], tuple(row[1:]))
+    return [found.get(sid, (None, None, None)) for sid in session_ids]
+
+
+def _encode_texts(texts: list, batch_size: int = 32, pool: Optional[dict] = None):
+    """
+    Embed texts with the configured embedder as a float32 matrix.
+
+    Rows are L2-normalized, so cosine similarity against the store is a
+    plain dot product and no norms are computed at query time. Texts are
+    encoded shortest first, so each batch holds texts of similar length
+    and pads little. With a pool from _start_encode_pool, batches are
+    spread over its processes.
+    """
+    np = _get_numpy()
+    embedder = _get_embedder()
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    ordered = [texts[i] for i in order]
+    if pool is not None:
+        encoded = embedder.encode(ordered, batch_size, pool=pool)
+    else:
+        encoded = embedder.encode(ordered, batch_size)
+    encoded = np.asarray(encoded, dtype=np.float32)
+
+    embeddings = np.empty_like(encoded)
+    embeddings[order] = encoded
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-10)
+
+
+def _start_encode_pool() -> Optional[dict]:
+    """
+    ENCODE_WORKERS model processes for bulk encoding, if configured.
+
+    Returns None when encoding runs in this process: ENCODE_WORKERS is
+    below 2, or the embedder can't encode in multiple processes.
+    """
+    if ENCODE_WORKERS < 2:
+        return None
+    embedder = _get_embedder()
+    if not hasattr(embedder, "start_pool"):
+        return None
+    return embedder.start_pool(ENCODE_WORKERS)
+
+
+def _stop_encode_pool(pool: Optional[dict]) -> None:
+    if pool is not None:
+        _get_embedder().stop_pool(pool)
+
+
+def _query_embeddings(queries: list, cache=None):
+    """
+    Normalized embeddings of search queries, one row each.
+
+    Cached queries are looked up; the rest are encoded in one batch.
+    """
+    from cc_dev.sessions.trace import phase
+
+    np = _get_numpy()
+    embeddings = [None] * len(queries)
+    if cache is not None:
+        embeddings = [cache.embedding(_embedder_name(), query) for query in queries]
+
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        with phase("query_embedding"):
+            encoded = _encode_texts([queries[i] for i in missing])
+        for i, embedding in zip(missing, encoded):
+            embeddings[i] = embedding
+            if cache is not None:
+                cache.put_embedding(_embedder_name(), queries[i], embedding)
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+def _index_session_file(file_path: Path, previous: Optional[dict],
+                        sampled_hash: bool, store_messages: bool = False,
+                        text_chars: Optional[int] = None,
+                        json_backend: Optional[str] = None,
+                        sample_bytes: Optional[int] = None) -> tuple:
+    """
+    Hash and parse one changed session file for build_index.
+
+    Runs in worker processes, which may not see settings the caller
+    changed (spawned workers re-import this module), so it only depends on
+    its arguments: store_messages, text_chars, json_backend and
+    sample_bytes carry MESSAGE_STORE, MESSAGE_TEXT_CHARS, JSON_BACKEND and
+    HASH_SAMPLE_BYTES.
+
+    Returns:
+        (status, file_path, payload, work) where status is "unchanged"
+        (payload is the new stat fingerprint), "indexed" or "appended"
+        (payload is (metadata, embed_text, texts, message_index, messages)
+        with the positioned user and assistant text, the message index
+        entries and the message store rows of the parsed lines), or "error"
+        (payload is the message), and work is (hash seconds, parse seconds,
+        bytes read)
+    """
+    started = time.perf_counter()
+    hashed = None
+    bytes_read = 0
+    loads = _loads_for(json_backend)
+    try:
+        fingerprint = _file_fingerprint(file_path)
+        parsed_offset = previous["parsed_offset"] if previous is not None else None
+
+        # A file that grew past its intact parsed prefix only had lines
+        # appended: parse the tail without hashing the whole file
+        if (parsed_offset and fingerprint[0] > parsed_offset and
+                previous["extracted_messages"] is not None and
+                _file_hash(file_path, sampled=True, length=parsed_offset,
+                           sample_bytes=sample_bytes) == previous["parsed_digest"]):
+            bytes_read += _hashed_bytes(parsed_offset, True, sample_bytes)
+            # Without sampled_hash there is no full hash of the grown file;
+            # a later change that keeps its size is then reparsed in full
+            current_hash = None
+            if sampled_hash:
+                current_hash = _file_hash(file_path, sampled=True, sample_bytes=sample_bytes)
+                bytes_read += _hashed_bytes(fingerprint[0], True, sample_bytes)
+            hashed = time.perf_counter()
+
+            # Appended messages can only extend a complete stored copy
+            append_messages = store_messages and (
+                previous["stored_messages"] == previous["extracted_messages"])
+            metadata = _parse_session_file(file_path, parsed_offset, previous,
+                                           append_messages, text_chars,
+                                           loads, sample_bytes)
+            metadata["stored_messages"] = (
+                metadata["extracted_messages"] if append_messages else None)
+            bytes_read += fingerprint[0] - parsed_offset
+            status = "appended"
+        else:
+            # Stat changed but content may not have (touch, copy, restore)
+            current_hash = _file_hash(file_path, sampled=sampled_hash,
+                                      sample_bytes=sample_bytes)
+            bytes_read += _hashed_bytes(fingerprint[0], sampled_hash, sample_bytes)
+            if previous is not None and current_hash == previous["file_hash"]:
+                return ("unchanged", file_path, fingerprint,
+                        (time.perf_counter() - started, 0.0, bytes_read))
+            hashed = time.perf_counter()
+
+            metadata = _parse_session_file(file_path, store_messages=store_messages,
+                                           text_chars=text_chars, loads=loads,
+                                           sample_bytes=sample_bytes)
+            metadata["stored_messages"] = (
+                metadata["extracted_messages"] if store_messages else None)
+            bytes_read += fingerprint[0]
+            status = "indexed"
+        metadata["file_hash"] = current_hash
+        metadata["indexed_at"] = datetime.now().isoformat()
+        metadata["file_size"], metadata["file_mtime_ns"], metadata["file_inode"] = fingerprint
+
+        embed_text = _embed_text(metadata)
+
+        # Remove what isn't stored in the sessions table
+        del metadata["summaries"]
+        texts = metadata.pop("texts")
+        message_index = (metadata.pop("line_offsets").tobytes(), metadata.pop("type_codes"))
+        messages = metadata.pop("messages")
+
+        work = (hashed - started, time.perf_counter() - hashed, bytes_read)
+        return (status, file_path, (metadata, embed_text, texts, message_index, messages), work)
+
+    except Exception as e:
+        finished = time.perf_counter()
+        work = ((hashed or finished) - started, finished - (hashed or finished), bytes_read)
+        return ("error", file_path, str(e), work)
+
+
+def _text_rowid(session_id: str) -> int:
+    """Stable rowid of a session in the keyword index."""
+    return int.from_bytes(hashlib.md5(session_id.encode()).digest()[:8], "big") >> 1
+
+
+def _remove_sessions(conn: sqlite3.Connection, session_ids: list) -> list:
+    """
+    Delete sessions from every table of the index.
+
+    Returns:
+        Ids of their chunks, to tombstone in the chunk store
+    """
+    keys = [(session_id,) for session_id in session_ids]
+    chunk_ids = [_chunk_id(session_id, chunk_no) for key in keys
+                 for session_id, chunk_no in conn.execute(
+                     "SELECT session_id, chunk_no FROM chunks WHERE session_id = ?", key)]
+    for table in ("sessions", "embeddings_meta", "chunks", "message_index", "messages"):
+        conn.executemany(f"DELETE FROM {table} WHERE session_id = ?", keys)
+    conn.executemany("DELETE FROM sessions_fts WHERE rowid = ?",
+                     [(_text_rowid(session_id),) for session_id in session_ids])
+    return chunk_ids
+
+
+def _write_text_index(conn: sqlite3.Connection, sessions: list):
+    """
+    Update the keyword index.
+
+    Each session is one document, so its BM25 score is the same however
+    many syncs its text arrived in; appended text is added to the
+    session's document.
+
+    Args:
+        sessions: (session_id, texts, appended) tuples; appended texts are
+            added to the session's indexed text, otherwise they replace it
+    """
+    replaced = []
+    for session_id, texts, appended in sessions:
+        rowid = _text_rowid(session_id)
+        text = "\n".join(text for _, text in texts)
+        if appended:
+            if not text:
+                continue
+            row = conn.execute("SELECT content FROM sessions_fts WHERE rowid = ?",
+                               (rowid,)).fetchone()
+            if row and row[0]:
+                text = row[0] + "\n" + text
+        replaced.append((rowid, session_id, text))
+
+    conn.executemany("DELETE FROM sessions_fts WHERE rowid = ?",
+                     [(rowid,) for rowid, _, text in replaced if not text])
+    conn.executemany(
+        "INSERT OR REPLACE INTO sessions_fts (rowid, session_id, content) VALUES (?, ?, ?)",
+        [entry for entry in replaced if entry[2]]
+    )
+
+
+def _write_message_index(conn: sqlite3.Connection, sessions: list):
+    """
+    Store the message index of parsed sessions.
+
+    Args:
+        sessions: (session_id, (line_offsets, type_codes), appended) tuples;
+            appended entries extend the session's index, otherwise they
+            replace it
+    """
+    rows = []
+    for session_id, (line_offsets, type_codes), appended in sessions:
+        if appended:
+            row = conn.execute(
+                "SELECT line_offsets, type_codes FROM message_index WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()
+            if row is None:
+                continue  # left for the backfill
+            line_offsets = row[0] + line_offsets
+            type_codes = row[1] + type_codes
+        rows.append((session_id, line_offsets, type_codes))
+    conn.executemany(
+        "INSERT OR REPLACE INTO message_index (session_id, line_offsets, type_codes) VALUES (?, ?, ?)",
+        rows
+    )
+
+
+def _backfill_parses(conn: sqlite3.Connection, condition: str, **parse_args) -> Iterator:
+    """
+    Parse indexed session files again for a backfill.
+
+    Files changed since the last sync are skipped: the next sync reparses
+    them anyway. Each parse is recorded like a sync's, so reads of the
+    backfilled session and later appends start from it.
+
+    Args:
+        condition: SQL condition on the sessions table selecting the sessions
+        parse_args: Passed on to _parse_session_file
+
+    Yields:
+        (session_id, metadata) per parsed file
+    """
+    rows = conn.execute(f"""
+        SELECT session_id, file_path, file_size, file_mtime_ns, file_inode
+        FROM sessions WHERE {condition}
+    """).fetchall()
+    for session_id, file_path, *indexed in rows:
         try:
-            metadata = _parse_session_file(file_path)
-            metadata["file_hash"] = current_hash
-            metadata["indexed_at"] = datetime.now().isoformat()
-
-            # Prepare embedding text
-            embed_text_parts = []
-            if metadata["summaries"]:
-                embed_text_parts.extend(metadata["summaries"])
-            if metadata["first_user_message"]:
-                embed_text_parts.append(metadata["first_user_message"])
-            embed_text = " ".join(embed_text_parts)[:1000] if embed_text_parts else ""
-
-            # Remove summaries list (not stored in DB)
-            del metadata["summaries"]
-
-            # Upsert session
-            conn.execute("""
-                INSERT OR REPLACE INTO sessions
-                (session_id, project_path, project_name, start_time, end_time,
-                 git_branch, message_count, user_count, assistant_count,
-                 tool_use_count, tool_result_count, thinking_count, summary_count,
-                 tools_json, summaries_json, first_user_message, file_path,
-                 file_hash, indexed_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, tuple(metadata.values()))
-
-            # Store embedding text
-            conn.execute("DELETE FROM embeddings_meta WHERE session_id = ?",
-                        (metadata["session_id"],))
-            if embed_text:
-                conn.execute(
-                    "INSERT INTO embeddings_meta (session_id, text) VALUES (?, ?)",
-                    (metadata["session_id"], embed_text)
-                )
-                sessions_to_embed.append((metadata["session_id"], embed_text))
+            if _file_fingerprint(Path(file_path)) != tuple(indexed):
+                continue
+            metadata = _parse_session_file(Path(file_path), **parse_args)
+        except OSError:
+            continue
+        conn.execute(
+            "UPDATE sessions SET parsed_offset = ?, parsed_digest = ?, extracted_messages = ? "
+            "WHERE session_id = ?",
+            (metadata["parsed_offset"], metadata["parsed_digest"],
+             metadata["extracted_messages"], session_id))
+        yield session_id, metadata
+
+
+def _backfill_message_index(conn: sqlite3.Connection) -> int:
+    """Index the messages of sessions indexed without a message index."""
+    sessions = [
+        (session_id, (metadata["line_offsets"].tobytes(), metadata["type_codes"]), False)
+        for session_id, metadata in _backfill_parses(
+            conn, "session_id NOT IN (SELECT session_id FROM message_index)")
+    ]
+    _write_message_index(conn, sessions)
+    return len(sessions)
+
+
+def _message_row(position: int, message: dict, text_chars: Optional[int]) -> tuple:
+    """Message store row of a message as read() returns it."""
+    content = message.get("content")
+    tool_input = message.get("input")
+    if text_chars is not None:
+        if isinstance(content, str):
+            content = content[:text_chars]
+        if isinstance(tool_input, dict):
+            tool_input = {key: value[:text_chars] if isinstance(value, str) else value
+                          for key, value in tool_input.items()}
+    return (position, message["type"], message.get("timestamp"), message.get("tool_name"),
+            message.get("tool_use_id"), content,
+            json.dumps(tool_input) if message["type"] == "tool_use" else None)
+
+
+def _stored_message(row: tuple) -> dict:
+    """Message of a message store row, in the form read() returns it."""
+    message_type, timestamp, tool_name, tool_use_id, content, input_json = row
+    if message_type == "tool_use":
+        return {"type": message_type, "tool_name": tool_name, "tool_use_id": tool_use_id,
+                "input": json.loads(input_json)}
+    if message_type == "tool_result":
+        return {"type": message_type, "timestamp": timestamp, "tool_use_id": tool_use_id,
+                "content": content}
+    if message_type == "user":
+        return {"type": message_type, "timestamp": timestamp, "content": content}
+    return {"type": message_type, "content": content}
+
+
+def _write_messages(conn: sqlite3.Connection, sessions: list):
+    """
+    Update the message store.
 
-            stats["indexed"] += 1
-            if verbose:
-                print(f"Indexed: {metadata['session_id']}")
+    Args:
+        sessions: (session_id, rows, appended) tuples; appended rows are
+            added to the session's stored messages, otherwise they
+            replace them
+    """
+    conn.executemany("DELETE FROM messages WHERE session_id = ?",
+                     [(session_id,) for session_id, _, appended in sessions if not appended])
+    conn.executemany(
+        "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [(session_id, *row) for session_id, rows, _ in sessions for row in rows]
+    )
 
-        except Exception as e:
-            stats["errors"] += 1
-            if verbose:
-                print(f"Error indexing {file_path}: {e}")
 
+def _backfill_message_store(conn: sqlite3.Connection) -> int:
+    """Store the messages of sessions indexed without them."""
+    stored = 0
+    for session_id, metadata in _backfill_parses(
+            conn, "stored_messages IS NULL OR extracted_messages IS NULL "
+                  "OR stored_messages != extracted_messages",
+            store_messages=True, text_chars=MESSAGE_TEXT_CHARS):
+        _write_messages(conn, [(session_id, metadata["messages"], False)])
+        conn.execute("UPDATE sessions SET stored_messages = ? WHERE session_id = ?",
+                     (len(metadata["messages"]), session_id))
+        stored += 1
+    return stored
+
+
+def _remove_message_store(conn: sqlite3.Connection) -> bool:
+    """Drop the stored messages after the message store is turned off."""
+    if conn.execute("SELECT 1 FROM messages LIMIT 1").fetchone() is None:
+        return False
+    conn.execute("DELETE FROM messages")
+    conn.execute("UPDATE sessions SET stored_messages = NULL")
     conn.commit()
+    return True
 
-    # Generate embeddings for new sessions
-    if sessions_to_embed:
-        if verbose:
-            print(f"Generating embeddings for {len(sessions_to_embed)} sessions...")
 
-        model = _get_model()
-        np = _get_numpy()
+def _backfill_text_index(conn: sqlite3.Connection, file_paths: list) -> int:
+    """Add already indexed session files to the keyword index."""
+    sessions = []
+    for file_path in file_paths:
+        try:
+            metadata = _parse_session_file(Path(file_path))
+        except OSError:
+            continue
+        sessions.append((metadata["session_id"], metadata["texts"], False))
+    _write_text_index(conn, sessions)
+    return len(sessions)
+
 
-        texts = [t[1] for t in sessions_to_embed]
-        new_embeddings = model.encode(texts, show_progress_bar=verbose)
+def _chunk_id(session_id: str, chunk_no: int) -> str:
+    """Id of a chunk in the chunk store."""
+    return f"{session_id}#{chunk_no}"
 
-        # Load existing embeddings and merge
-        if EMBEDDINGS_PATH.exists() and not force:
-            existing_data = np.load(EMBEDDINGS_PATH, allow_pickle=True).item()
-            existing_embeddings = existing_data.get("embeddings", np.array([]))
-            existing_ids = existing_data.get("session_ids", [])
-        else:
-            existing_embeddings = np.array([])
-            existing_ids = []
 
-        # Create mapping of session_id -> index for existing
-        id_to_idx = {sid: idx for idx, sid in enumerate(existing_ids)}
+def _split_chunk_id(chunk_id: str) -> tuple:
+    session_id, _, chunk_no = chunk_id.rpartition("#")
+    return session_id, int(chunk_no)
 
-        # Update or append embeddings
-        new_ids = [t[0] for t in sessions_to_embed]
 
-        if len(existing_embeddings) > 0:
-            # Update existing, append new
-            all_embeddings = list(existing_embeddings)
-            all_ids = list(existing_ids)
+def _chunk_texts(texts: list) -> list:
+    """
+    Group consecutive message texts into windows of about CHUNK_CHARS.
+
+    Messages longer than a window are split across several.
+
+    Returns:
+        (position, text) per chunk, position being that of its first message
+    """
+    chunks = []
+    parts = []
+    size = 0
+    position = None
+    for message_position, text in texts:
+        for start in range(0, len(text), CHUNK_CHARS):
+            piece = text[start:start + CHUNK_CHARS]
+            if parts and size + len(piece) > CHUNK_CHARS:
+                chunks.append((position, "\n".join(parts)))
+                parts, size = [], 0
+            if not parts:
+                position = message_position
+            parts.append(piece)
+            size += len(piece) + 1
+    if parts:
+        chunks.append((position, "\n".join(parts)))
+    return chunks
+
+
+def _write_chunks(conn: sqlite3.Connection, sessions: list) -> tuple:
+    """
+    Store the chunks of parsed sessions.
+
+    Args:
+        sessions: (session_id, texts, appended) tuples; chunks of appended
+            texts are numbered after the session's existing ones, otherwise
+            they replace them
+
+    Chunks keep the model of their vector while their text is unchanged;
+    new and changed ones have none until embedded.
+
+    Returns:
+        Ids of chunks that no longer exist
+    """
+    stale_ids = []
+    rows = []
+    for session_id, texts, appended in sessions:
+        last = conn.execute("SELECT MAX(chunk_no) FROM chunks WHERE session_id = ?",
+                            (session_id,)).fetchone()[0]
+        chunks = _chunk_texts(texts)
+        first = 0
+        previous = {}
+        if appended:
+            first = 0 if last is None else last + 1
+        elif last is not None:
+            previous = {chunk_no: (text, model) for chunk_no, text, model in conn.execute(
+                "SELECT chunk_no, text, model FROM chunks WHERE session_id = ?", (session_id,))}
+            conn.execute("DELETE FROM chunks WHERE session_id = ?", (session_id,))
+            stale_ids.extend(_chunk_id(session_id, chunk_no)
+                             for chunk_no in range(len(chunks), last + 1))
+        for chunk_no, (position, text) in enumerate(chunks, first):
+            previous_text, model = previous.get(chunk_no, (None, None))
+            rows.append((session_id, chunk_no, position, text,
+                         model if previous_text == text else None))
+
+    conn.executemany(
+        "INSERT OR REPLACE INTO chunks (session_id, chunk_no, position, text, model) "
+        "VALUES (?, ?, ?, ?, ?)",
+        rows
+    )
+    return stale_ids
+
+
+def _needs_compaction(store) -> bool:
+    """
+    Whether a store should be rewritten: tombstones make up a large share
+    of it, or its dtype differs from EMBEDDING_DTYPE.
+    """
+    return (store.tombstones > store.rows * COMPACT_TOMBSTONE_RATIO
+            or store.dtype != EMBEDDING_DTYPE)
 
-            for sid, emb in zip(new_ids, new_embeddings):
-                if sid in id_to_idx:
-                    all_embeddings[id_to_idx[sid]] = emb
-                else:
-                    all_embeddings.append(emb)
-                    all_ids.append(sid)
 
-            final_embeddings = np.array(all_embeddings)
-            final_ids = all_ids
+def _update_chunk_store(conn: sqlite3.Connection, stale_ids: list,
+                        attributes: dict, force: bool = False,
+                        verbose: bool = False) -> dict:
+    """
+    Embed new and changed chunks and tombstone stale ones in the chunk store.
+
+    Chunks without a vector from the configured embedder are embedded. Without a
+    chunk store (first sync with CHUNK_EMBEDDINGS on, or force), sessions
+    that were never chunked are chunked first and every chunk is embedded.
+    Chunks are read back from the chunks table and embedded in batches, so
+    memory use doesn't grow with the number of chunks.
+
+    Returns:
+        Chunk statistics for build_index
+    """
+    from cc_dev.sessions.store import EmbeddingStore
+
+    stats = {}
+    store = None if force else EmbeddingStore.open(CHUNKS_PATH, writable=True)
+    if store is None:
+        unchunked = [row[0] for row in conn.execute(
+            "SELECT file_path FROM sessions WHERE session_id NOT IN (SELECT session_id FROM chunks)")]
+        for start in range(0, len(unchunked), _WRITE_BATCH_SIZE):
+            sessions = []
+            for file_path in unchunked[start:start + _WRITE_BATCH_SIZE]:
+                try:
+                    metadata = _parse_session_file(Path(file_path))
+                except OSError:
+                    continue
+                sessions.append((metadata["session_id"], metadata["texts"], False))
+            _write_chunks(conn, sessions)
+        conn.commit()
+        new_ids = [_chunk_id(*row) for row in conn.execute(
+            "SELECT session_id, chunk_no FROM chunks ORDER BY session_id, chunk_no")]
+        stale_ids = []
+    else:
+        new_ids = [_chunk_id(*row) for row in conn.execute(
+            "SELECT session_id, chunk_no FROM chunks WHERE model IS NOT ? "
+            "ORDER BY session_id, chunk_no", (_embedder_name(),))]
+
+    changed_rows = []
+    if store is not None and stale_ids:
+        changed_rows.extend(row for row in store.rows_of(stale_ids) if row is not None)
+        stats["chunks_removed"] = store.delete(stale_ids)
+
+    if verbose and new_ids:
+        print(f"Generating embeddings for {len(new_ids)} chunks...")
+
+    for start in range(0, len(new_ids), _CHUNK_WRITE_BATCH):
+        ids = new_ids[start:start + _CHUNK_WRITE_BATCH]
+        keys = [_split_chunk_id(chunk_id) for chunk_id in ids]
+        texts = [conn.execute("SELECT text FROM chunks WHERE session_id = ? AND chunk_no = ?",
+                              key).fetchone()[0] for key in keys]
+        embeddings = _encode_texts(texts, batch_size=_CHUNK_ENCODE_BATCH)
+
+        if store is not None and store.dim != embeddings.shape[1]:
+            # The embedding size changed with the model; re-embed every chunk
+            return _update_chunk_store(conn, [], attributes, force=True, verbose=verbose)
+
+        session_ids = [session_id for session_id, _ in keys]
+        unique_ids = list(dict.fromkeys(session_ids))
+        found = dict(zip(unique_ids, _session_attributes(conn, unique_ids, attributes)))
+        chunk_attributes = [found[session_id] for session_id in session_ids]
+        if store is None:
+            store = EmbeddingStore.create(CHUNKS_PATH, embeddings, ids, chunk_attributes,
+                                          dtype=EMBEDDING_DTYPE)
         else:
-            final_embeddings = new_embeddings
-            final_ids = new_ids
+            store.upsert(ids, embeddings, chunk_attributes)
+            changed_rows.extend(store.rows_of(ids))
+        conn.executemany("UPDATE chunks SET model = ? WHERE session_id = ? AND chunk_no = ?",
+                         [(_embedder_name(), *key) for key in keys])
+        conn.commit()
+    if new_ids:
+        stats["chunks_generated"] = len(new_ids)
+
+    # Chunks kept by reparsed sessions get the sessions' current attributes
+    if store is not None and attributes:
+        parsed_ids = list(attributes)
+        kept_ids, kept_attributes = [], []
+        for start in range(0, len(parsed_ids), _WRITE_BATCH_SIZE):
+            batch = parsed_ids[start:start + _WRITE_BATCH_SIZE]
+            for session_id, chunk_no in conn.execute(
+                    "SELECT session_id, chunk_no FROM chunks "
+                    f"WHERE session_id IN ({', '.join('?' * len(batch))})", batch):
+                kept_ids.append(_chunk_id(session_id, chunk_no))
+                kept_attributes.append(attributes[session_id])
+        store.set_attributes(kept_ids, kept_attributes)
+
+    if store is not None:
+        if _needs_compaction(store):
+            store = store.compact(dtype=EMBEDDING_DTYPE)
+            stats["chunks_compacted"] = True
+        _update_quantized(store, changed_rows)
+        _update_ann(store, changed_rows)
+    return stats
+
+
+def _remove_chunk_store(conn: sqlite3.Connection) -> int:
+    """
+    Delete the chunk store and chunks once CHUNK_EMBEDDINGS is turned off.
+
+    Returns:
+        Number of chunks removed
+    """
+    from cc_dev.sessions.ann import ann_path
+    from cc_dev.sessions.store import quantized_path, sidecar_paths
+
+    if not CHUNKS_PATH.exists():
+        return 0
+    for path in (CHUNKS_PATH, quantized_path(CHUNKS_PATH)):
+        for stale in (path, *sidecar_paths(path)):
+            stale.unlink(missing_ok=True)
+    ann_path(CHUNKS_PATH).unlink(missing_ok=True)
+    removed = conn.execute("DELETE FROM chunks").rowcount
+    conn.commit()
+    return removed
+
+
+def _write_sessions(conn: sqlite3.Connection, parsed: list, touched: list,
+                    stale_chunks: Optional[list] = None) -> list:
+    """
+    Bulk upsert parsed sessions and refresh fingerprints of unchanged ones.
+
+    With stale_chunks, a list, sessions are also chunked and the ids of
+    chunks that no longer exist are added to it.
+
+    Returns:
+        (session_id, embed_text) of the sessions whose embedding text
+        changed, so their vectors are out of date
+    """
+    rows = []
+    if parsed:
+        columns = list(parsed[0][0])
+        placeholders = ", ".join("?" * len(columns))
+        conn.executemany(
+            f"INSERT OR REPLACE INTO sessions ({', '.join(columns)}) VALUES ({placeholders})",
+            [tuple(metadata[c] for c in columns) for metadata, *_ in parsed]
+        )
+
+        # Store embedding text; a vector stays current while its text is unchanged
+        session_ids = [metadata["session_id"] for metadata, *_ in parsed]
+        embedded = {
+            session_id: (digest, model) for session_id, digest, model in conn.execute(
+                "SELECT session_id, text_digest, model FROM embeddings_meta "
+                f"WHERE session_id IN ({', '.join('?' * len(session_ids))})",
+                session_ids)
+        }
+        conn.executemany("DELETE FROM embeddings_meta WHERE session_id = ?",
+                         [(session_id,) for session_id in session_ids])
+        for metadata, embed_text, *_ in parsed:
+            if embed_text:
+                digest = _text_digest(embed_text)
+                previous_digest, model = embedded.get(metadata["session_id"], (None, None))
+                rows.append((metadata["session_id"], embed_text, digest,
+                             model if previous_digest == digest else None))
+        conn.executemany(
+            "INSERT INTO embeddings_meta (session_id, text, text_digest, model) VALUES (?, ?, ?, ?)",
+            rows
+        )
+
+        _write_text_index(conn, [(metadata["session_id"], texts, appended)
+                                 for metadata, _, texts, appended, *_ in parsed])
+        _write_message_index(conn, [(metadata["session_id"], message_index, appended)
+                                    for metadata, _, _, appended, message_index, _ in parsed])
+        _write_messages(conn, [(metadata["session_id"], messages, appended)
+                               for metadata, *_, appended, _, messages in parsed
+                               if metadata["stored_messages"] is not None])
+
+        if stale_chunks is not None:
+            stale_chunks.extend(_write_chunks(
+                conn, [(metadata["session_id"], texts, appended)
+                       for metadata, _, texts, appended, *_ in parsed]))
+
+    if touched:
+        conn.executemany("""
+            UPDATE sessions SET file_size = ?, file_mtime_ns = ?, file_inode = ?
+            WHERE file_path = ?
+        """, touched)
+
+    return [(session_id, embed_text) for session_id, embed_text, _, model in rows
+            if model is None]
+
+
+def _submit_written(pipeline, submitted: set, store, parsed: list, unembedded: list) -> None:
+    """
+    Queue the embedding texts of sessions just written for encoding.
+
+    Those are the texts that changed, or all of them when there is no
+    embedding store to keep vectors in.
+    """
+    if store is None:
+        unembedded = [(metadata["session_id"], embed_text)
+                      for metadata, embed_text, *_ in parsed if embed_text]
+    pipeline.submit(unembedded)
+    submitted.update(session_id for session_id, _ in unembedded)
+
+
+@_traced
+def build_index(force: bool = False, verbose: bool = False,
+                sampled_hash: bool = False,
+                workers: Optional[int] = None,
+                paths: Optional[list] = None,
+                trace: Optional[Callable[[dict], None]] = None) -> dict:
+    """
+    Build or update the session index.
+
+    Files whose size, mtime and inode match the index are skipped without
+    being read. Files that grew past the part parsed last time, with that
+    part unchanged, have just their new tail read and parsed. Otherwise the
+    content hash decides whether to reparse. Sessions whose file was
+    deleted are removed from the index, unless the message store holds all
+    their messages (counted as "missing"). Hashing and parsing run in a
+    process pool; results are written to the database in batches from this
+    process.
+
+    Args:
+        force: Rebuild entire index even if files haven't changed
+        verbose: Print progress information
+        sampled_hash: Hash only the head and tail of changed files instead
+            of their full content
+        workers: Number of parser processes (default: CPU count, 1 to
+            parse in-process)
+        paths: Check only these session files instead of every file under
+            PROJECTS_DIR (missing ones are ignored)
+        trace: Called with the phase timings and counters of this call, as
+            TRACE_HOOK is for every call
+
+    Returns:
+        Dict with indexing statistics, including the seconds spent in each
+        phase ("timings"), the bytes of session files read and the database
+        rows written
+    """
+    from cc_dev.sessions.db import writer
+    from cc_dev.sessions.trace import current
+
+    if force and paths is not None:
+        raise ValueError("force rebuilds every session and can't be limited to paths")
+
+    tracer = current()
+
+    with tracer.phase("discovery"):
+        INDEX_DIR.mkdir(parents=True, exist_ok=True)
 
-        np.save(EMBEDDINGS_PATH, {"embeddings": final_embeddings, "session_ids": final_ids})
-        stats["embeddings_generated"] = len(sessions_to_embed)
+        conn = writer(DB_PATH)
+        has_text_index = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'sessions_fts'").fetchone() is not None
+        _init_db(conn)
 
+        # Find the session files to check
+        if paths is None:
+            session_files = list(PROJECTS_DIR.glob("*/*.jsonl"))
+        else:
+            session_files = [Path(path) for path in dict.fromkeys(map(str, paths))
+                             if os.path.isfile(path)]
+
+        # Get existing indexed files
+        existing = {}
+        if not force:
+            conn.row_factory = sqlite3.Row
+            if paths is None:
+                cursor = conn.execute("SELECT * FROM sessions")
+                existing = {row["file_path"]: dict(row) for row in cursor.fetchall()}
+            else:
+                names = [str(path) for path in session_files]
+                for start in range(0, len(names), _WRITE_BATCH_SIZE):
+                    batch = names[start:start + _WRITE_BATCH_SIZE]
+                    cursor = conn.execute(
+                        f"SELECT * FROM sessions WHERE file_path IN ({', '.join('?' * len(batch))})",
+                        batch)
+                    existing.update((row["file_path"], dict(row)) for row in cursor.fetchall())
+            conn.row_factory = None
+
+    stats = {"total": len(session_files), "indexed": 0, "appended": 0,
+             "skipped": 0, "errors": 0}
+    changes_before = conn.total_changes
+    sessions_without_text = []
+    attributes = {}
+
+    # Sessions whose file is gone leave the index; their vectors are
+    # tombstoned along with those of sessions that lost their text. Those
+    # the message store holds in full stay, so they can still be read.
+    deleted_chunks = []
+    if paths is None:
+        with tracer.phase("discovery"):
+            found = set(map(str, session_files))
+            deleted = []
+            missing = 0
+            for session_id, file_path, stored in conn.execute("""
+                SELECT session_id, file_path,
+                       stored_messages IS NOT NULL AND stored_messages = extracted_messages
+                FROM sessions
+            """):
+                if file_path in found:
+                    continue
+                if stored:
+                    missing += 1
+                else:
+                    deleted.append(session_id)
+            if missing:
+                stats["missing"] = missing
+            if deleted:
+                deleted_chunks = _remove_sessions(conn, deleted)
+                conn.commit()
+                sessions_without_text.extend(deleted)
+                stats["deleted"] = len(deleted)
+
+    # Skip files whose stat data is unchanged
+    changed_files = []
+    changed_previous = []
+    with tracer.phase("stat"):
+        for file_path in session_files:
+            previous = existing.get(str(file_path))
+            try:
+                fingerprint = _file_fingerprint(file_path)
+            except OSError as e:
+                stats["errors"] += 1
+                if verbose:
+                    print(f"Error indexing {file_path}: {e}")
+                continue
+            if previous is not None and fingerprint == (
+                    previous["file_size"], previous["file_mtime_ns"], previous["file_inode"]):
+                stats["skipped"] += 1
+                continue
+            changed_files.append(file_path)
+            changed_previous.append(previous)
+
+    from cc_dev.sessions.encode import EncodePipeline
+    from cc_dev.sessions.store import EmbeddingStore
+
+    # With no embedding store yet (new index, or the legacy pickled
+    # embeddings.npy), embed every session that has embedding text.
+    # Otherwise only texts that changed or came from another model: a
+    # reparsed session whose text is unchanged keeps its vector.
+    store = None if force else EmbeddingStore.open(EMBEDDINGS_PATH, writable=True)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(changed_files))
+
+    executor = None
+    if workers > 1 and len(changed_files) >= _PARALLEL_MIN_FILES:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(
+            _index_session_file, changed_files, changed_previous,
+            repeat(sampled_hash, len(changed_files)),
+            repeat(MESSAGE_STORE, len(changed_files)),
+            repeat(MESSAGE_TEXT_CHARS, len(changed_files)),
+            repeat(JSON_BACKEND, len(changed_files)),
+            repeat(HASH_SAMPLE_BYTES, len(changed_files)),
+            chunksize=max(1, len(changed_files) // (workers * 8))
+        )
+    else:
+        results = map(_index_session_file, changed_files, changed_previous,
+                      repeat(sampled_hash, len(changed_files)),
+                      repeat(MESSAGE_STORE, len(changed_files)),
+                      repeat(MESSAGE_TEXT_CHARS, len(changed_files)),
+                      repeat(JSON_BACKEND, len(changed_files)),
+                      repeat(HASH_SAMPLE_BYTES, len(changed_files)))
+
+    # Sessions are embedded on a background thread as they are written,
+    # while later files are still being parsed. It starts after the parser
+    # processes, which are forked.
+    pool = _start_encode_pool() if len(changed_files) >= _ENCODE_POOL_MIN_FILES else None
+    pipeline = EncodePipeline(functools.partial(
+        _encode_texts, batch_size=ENCODE_BATCH_SIZE, pool=pool))
+    submitted = set()
+    texts_parsed = 0
+
+    parsed = []
+    touched = []
+    reparsed = set()
+    stale_chunks = deleted_chunks if CHUNK_EMBEDDINGS else None
+    try:
+        for status, file_path, payload, work in tracer.iterate("parse_wait", results):
+            # Hashing and parsing time is summed over parser processes
+            tracer.add_time("hashing", work[0])
+            tracer.add_time("parsing", work[1])
+            tracer.count("bytes_read", work[2])
+
+            if status == "error":
+                stats["errors"] += 1
+                if verbose:
+                    print(f"Error indexing {file_path}: {payload}")
+                continue
+
+            if status == "unchanged":
+                touched.append((*payload, str(file_path)))
+                stats["skipped"] += 1
+            else:
+                metadata, embed_text, texts, message_index, messages = payload
+                parsed.append((metadata, embed_text, texts, status == "appended",
+                               message_index, messages))
+                reparsed.add(metadata["file_path"])
+                attributes[metadata["session_id"]] = (
+                    metadata["project_name"], metadata["git_branch"], metadata["start_time"])
+                if embed_text:
+                    texts_parsed += 1
+                else:
+                    sessions_without_text.append(metadata["session_id"])
+                stats["indexed"] += 1
+                if status == "appended":
+                    stats["appended"] += 1
+                if verbose:
+                    print(f"Indexed: {metadata['session_id']}")
+
+            if len(parsed) + len(touched) >= _WRITE_BATCH_SIZE:
+                with tracer.phase("db_write"):
+                    _submit_written(pipeline, submitted, store, parsed,
+                                    _write_sessions(conn, parsed, touched, stale_chunks))
+                parsed, touched = [], []
+
+        with tracer.phase("db_write"):
+            _submit_written(pipeline, submitted, store,
+                            parsed, _write_sessions(conn, parsed, touched, stale_chunks))
+            conn.commit()
+
+        if store is not None and len(submitted) < texts_parsed:
+            stats["embeddings_reused"] = texts_parsed - len(submitted)
+
+        # Sessions that weren't reparsed but still need a vector: all of
+        # them without a store, else those embedded by another model
+        if not force:
+            pipeline.submit(row for row in (_unembedded_texts(conn) if store is not None
+                                            else _all_embedding_texts(conn))
+                            if row[0] not in submitted)
+
+        with tracer.phase("embedding_wait"):
+            new_ids, new_embeddings = pipeline.finish()
+        if (new_embeddings is not None and store is not None
+                and store.dim != new_embeddings.shape[1]):
+            # The embedding size changed with the model; re-embed everything
+            new_ids, texts = map(list, zip(*_all_embedding_texts(conn)))
+            with tracer.phase("embedding"):
+                new_embeddings = _encode_texts(texts, ENCODE_BATCH_SIZE, pool)
+            store = None
+    finally:
+        pipeline.close()
+        if executor is not None:
+            executor.shutdown()
+        _stop_encode_pool(pool)
+    # Encoding overlapped parsing on the encoder thread
+    tracer.add_time("embedding", pipeline.seconds)
+
+    with tracer.phase("backfill"):
+        # Sessions indexed before the keyword index existed still need their text
+        if not has_text_index and not force:
+            backfill = [path for (path,) in conn.execute("SELECT file_path FROM sessions")
+                        if path not in reparsed]
+            if backfill:
+                stats["text_indexed"] = _backfill_text_index(conn, backfill)
+                conn.commit()
+
+        # Sessions indexed before the message index existed
+        backfilled = _backfill_message_index(conn)
+        if backfilled:
+            stats["messages_indexed"] = backfilled
+            conn.commit()
+
+        # Sessions indexed before the message store was turned on
+        if MESSAGE_STORE:
+            backfilled = _backfill_message_store(conn)
+            if backfilled:
+                stats["messages_stored"] = backfilled
+                conn.commit()
+        elif _remove_message_store(conn):
+            stats["messages_removed"] = True
+
+    with tracer.phase("store_write"):
+        # Store rows written or tombstoned by this sync
+        changed_rows = []
+
+        if store is not None and sessions_without_text:
+            changed_rows.extend(row for row in store.rows_of(sessions_without_text)
+                                if row is not None)
+            stats["embeddings_removed"] = store.delete(sessions_without_text)
+
+        # Store embeddings of new and changed sessions
+        if new_ids:
+            if verbose:
+                print(f"Embedded {len(new_ids)} sessions ({pipeline.rate:.0f}/s)")
+
+            new_attributes = _session_attributes(conn, new_ids, attributes)
+            if store is None:
+                store = EmbeddingStore.create(EMBEDDINGS_PATH, new_embeddings, new_ids,
+                                              new_attributes, dtype=EMBEDDING_DTYPE)
+            else:
+                # Overwrite rows of re-embedded sessions in place, append the rest
+                store.upsert(new_ids, new_embeddings, new_attributes)
+                changed_rows.extend(store.rows_of(new_ids))
+            (INDEX_DIR / "embeddings.npy").unlink(missing_ok=True)
+            conn.executemany("UPDATE embeddings_meta SET model = ? WHERE session_id = ?",
+                             [(_embedder_name(), session_id) for session_id in new_ids])
+            conn.commit()
+            stats["embeddings_generated"] = len(new_ids)
+            if pipeline.texts:
+                stats["encode_rate"] = round(pipeline.rate, 1)
+
+        # Reparsed sessions that kept their vector can still have new filter
+        # attributes (e.g. a first prompt now gives the project and branch)
+        if store is not None and attributes:
+            store.set_attributes(list(attributes), list(attributes.values()))
+
+        # Reclaim tombstoned rows once they make up a large share of the store
+        if store is not None and _needs_compaction(store):
+            store = store.compact(dtype=EMBEDDING_DTYPE)
+            stats["embeddings_compacted"] = True
+
+        # Keep the quantized mirror and approximate-search index in step
+        if store is not None:
+            if _update_quantized(store, changed_rows):
+                stats["quantized"] = EMBEDDING_QUANTIZATION
+            ann_status = _update_ann(store, changed_rows)
+            if ann_status:
+                stats["ann"] = ann_status
+
+    with tracer.phase("chunks"):
+        # Message-window embeddings, when enabled
+        if CHUNK_EMBEDDINGS:
+            stats.update(_update_chunk_store(conn, stale_chunks, attributes, force, verbose))
+        else:
+            removed = _remove_chunk_store(conn)
+            if removed:
+                stats["chunks_removed"] = removed
+
+    # Every stored vector now comes from the configured embedder
+    if store is not None:
+        conn.execute("""
+            INSERT INTO index_state (key, value) VALUES ('embedder', ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        """, (_embedder_name(),))
+        conn.commit()
+
+    # Invalidate cached search results
+    if stats["indexed"] or any(key in stats for key in (
+            "embeddings_generated", "embeddings_removed", "embeddings_compacted",
+            "deleted", "text_indexed", "chunks_generated", "chunks_removed",
+            "chunks_compacted")):
+        _bump_generation(conn)
+
+    tracer.count("rows_touched", conn.total_changes - changes_before)
+    stats["bytes_read"] = tracer.counters.get("bytes_read", 0)
+    stats["rows_touched"] = tracer.counters["rows_touched"]
+    stats["timings"] = tracer.timings()
     conn.close()
+    if trace is not None:
+        trace(tracer.as_dict())
     return stats
 
 
-def search(query: str, limit: int = 10, project: Optional[str] = None) -> list[dict]:
+def _filter_rows(store, project: Optional[str] = None, branch: Optional[str] = None,
+                 since=None, until=None):
     """
-    Semantic search across sessions.
+    Boolean mask of store rows matching the search filters.
+
+    Returns:
+        Mask array, or None when no filter is set
+    """
+    from cc_dev.sessions.store import timestamp_seconds
+
+    np = _get_numpy()
+    masks = []
+
+    if project:
+        codes, values = store.codes("project")
+        wanted = [code for code, value in enumerate(values)
+                  if project.lower() in value.lower()]
+        masks.append(np.isin(codes, wanted))
+
+    if branch:
+        codes, values = store.codes("branch")
+        masks.append(np.isin(codes, [code for code, value in enumerate(values)
+                                     if value == branch]))
+
+    if since is not None or until is not None:
+        seconds = store.timestamps("start_time")
+        with np.errstate(invalid="ignore"):
+            if since is not None:
+                masks.append(seconds >= timestamp_seconds(since))
+            if until is not None:
+                masks.append(seconds <= timestamp_seconds(until))
+
+    if not masks:
+        return None
+    mask = masks[0]
+    for other in masks[1:]:
+        mask = mask & other
+    return mask
+
+
+@_served
+@_traced
+def search(query: str, limit: int = 10, project: Optional[str] = None,
+           branch: Optional[str] = None, since=None, until=None,
+           exact: Optional[bool] = None, nprobe: Optional[int] = None,
+           mode: str = "semantic") -> list[dict]:
+    """
+    Semantic, keyword or hybrid search across sessions.
+
+    Semantic search compares the query embedding with each session's
+    summaries and first message, and with CHUNK_EMBEDDINGS also with
+    windows of its conversation, scoring each session by its best match.
+    Keyword search ranks sessions by BM25 over
+    all user and assistant text, so exact identifiers (error codes,
+    function names, ticket ids) are findable. Hybrid search fuses both
+    rankings with reciprocal rank fusion.
+
+    Filters are applied before ranking, so filtered searches only score
+    matching sessions and still return up to limit results. With ANN_INDEX
+    set, large indexes (ANN_MIN_ROWS sessions or more) are searched
+    approximately through an IVF index, and a quantized mirror (EMBEDDING_QUANTIZATION) is scanned
+    first with only RESCORE_FACTOR * limit candidates rescored at full
+    precision, unless exact=True. Results are cached per index generation,
+    so a repeated search costs one lookup until the next change to the index.
 
     Args:
         query: Search query string
         limit: Maximum results to return
-        project: Optional project name filter
+        project: Optional project name filter (partial match)
+        branch: Optional git branch filter (exact match)
+        since: Only sessions starting at or after this ISO date/datetime
+        until: Only sessions starting at or before this ISO date/datetime
+        exact: Force brute-force, full-precision scoring (True), or use the
+            IVF index and quantized mirror when they exist (False or None)
+        nprobe: IVF lists scanned per query (default ANN_NPROBE); higher
+            trades latency for recall
+        mode: "semantic", "keyword" or "hybrid"
 
     Returns:
-        List of matching sessions with scores
+        List of matching sessions with scores (cosine similarity, negated
+        BM25 rank, or fused score in 0-1 for hybrid). With CHUNK_EMBEDDINGS,
+        "offset" is the read() offset of the best-matching chunk (0 when the
+        session matched as a whole), else None; read() accepts either.
     """
-    if not DB_PATH.exists() or not EMBEDDINGS_PATH.exists():
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode {mode!r}, expected one of {SEARCH_MODES}")
+    if not DB_PATH.exists():
+        return []
+
+    cache = _get_query_cache()
+    if cache is None:
+        return _search(query, limit, project, branch, since, until, exact, nprobe, mode)
+
+    generation = _index_generation()
+    key = _search_key("search", query, limit, project, branch, since, until, exact,
+                      nprobe or ANN_NPROBE, mode)
+    results = cache.results(key, generation)
+    if results is None:
+        results = _search(query, limit, project, branch, since, until, exact, nprobe,
+                          mode, cache)
+        cache.put_results(key, generation, results)
+    return results
+
+
+def _search_key(*args) -> str:
+    """Query cache key for a search call and the settings it depends on."""
+    return json.dumps([*args, _embedder_name(), EMBEDDING_QUANTIZATION, ANN_INDEX,
+                       CHUNK_EMBEDDINGS], default=str)
+
+
+def _search(query: str, limit: int, project: Optional[str], branch: Optional[str],
+            since, until, exact: Optional[bool], nprobe: Optional[int],
+            mode: str, cache=None) -> list[dict]:
+    """Uncached search; see search()."""
+    if limit <= 0:
         return []
 
-    model = _get_model()
+    from cc_dev.sessions.trace import phase
+
+    depth = max(limit, _HYBRID_DEPTH) if mode == "hybrid" else limit
+    rankings = []
+    if mode != "keyword":
+        with phase("semantic_ranking"):
+            rankings.append(_semantic_ranking(query, depth, project, branch, since, until,
+                                              exact, nprobe, cache))
+    if mode != "semantic":
+        with phase("keyword_ranking"):
+            rankings.append(_keyword_ranking(query, depth, project, branch, since, until))
+
+    if len(rankings) == 1:
+        ranked = rankings[0]
+    else:
+        with phase("fusion"):
+            ranked = _fuse_rankings(rankings, limit)
+    with phase("hydration"):
+        return _hydrate([ranked])[0]
+
+
+def _semantic_ranking(query: str, k: int, project: Optional[str], branch: Optional[str],
+                      since, until, exact: Optional[bool], nprobe: Optional[int],
+                      cache=None) -> list:
+    """
+    Sessions closest to the query embedding.
+
+    With CHUNK_EMBEDDINGS, a session scores the best of its session vector
+    and its message-window chunks (max-sim), and its offset is the read()
+    offset of its best-matching chunk, or 0 when none of its chunks ranked.
+
+    Returns:
+        (session_id, cosine similarity, offset or None) triples, best first
+    """
+    # Load embeddings (memory-mapped, nothing is copied)
+    store = _load_embeddings()
+    if store is None or not store.rows:
+        return []
+
+    # Query vectors are only comparable with ones from the same embedder
+    _check_embedder()
+
+    # Generate query embedding; stored rows are already normalized
+    query_embedding = _query_embeddings([query], cache)[0]
+
+    top_rows, top_scores = _store_ranking(store, query_embedding, k, project, branch,
+                                          since, until, exact, nprobe)
+    ranking = [(store.session_ids[row], score, None)
+               for row, score in zip(top_rows, top_scores)]
+
+    if CHUNK_EMBEDDINGS:
+        chunk_ranking = _chunk_ranking(query_embedding, k, project, branch, since, until,
+                                       exact, nprobe)
+        # Sessions matched by their own vector (summaries and first prompt)
+        # and none of their ranked chunks point at the start
+        ranking = [(session_id, score, 0 if offset is None else offset)
+                   for session_id, score, offset in _merge_max([ranking, chunk_ranking], k)]
+    return ranking
+
+
+def _store_ranking(store, query_embedding, k: int, project: Optional[str],
+                   branch: Optional[str], since, until, exact: Optional[bool],
+                   nprobe: Optional[int]) -> tuple:
+    """
+    Top k live rows of a store for a query under the filters.
+
+    Returns:
+        (rows, scores) arrays, best first
+    """
     np = _get_numpy()
 
-    # Generate query embedding
-    query_embedding = model.encode([query])[0]
+    # Restrict scoring to rows that pass the filters
+    mask, candidate_rows = _candidates(store, project, branch, since, until)
+    if candidate_rows is not None and not candidate_rows.size:
+        return candidate_rows, np.empty(0, dtype=np.float32)
+
+    # Approximate search: only score rows in the lists nearest the query,
+    # unless the filter alone already leaves fewer rows than that
+    ann = None if exact else _load_ann(store)
+    if ann is not None:
+        probed = ann.probe(query_embedding, nprobe or ANN_NPROBE)
+        if candidate_rows is None or candidate_rows.size > probed.size:
+            probed = probed[store.live[probed] if mask is None else mask[probed]]
+            if probed.size >= k:
+                candidate_rows = np.sort(probed)
+
+    # Quantized first pass over a candidate pool, rescored at full precision
+    quantized = None if exact else _load_quantized(store)
+    if quantized is not None:
+        pool_rows, _ = _top_rows(quantized, query_embedding, k * RESCORE_FACTOR,
+                                 candidate_rows, mask)
+        return _top_rows(store, query_embedding, k, pool_rows)
+    return _top_rows(store, query_embedding, k, candidate_rows, mask)
+
+
+def _chunk_ranking(query_embedding, k: int, project: Optional[str], branch: Optional[str],
+                   since, until, exact: Optional[bool], nprobe: Optional[int]) -> list:
+    """
+    Sessions ranked by their best-matching chunk (max-sim).
 
-    # Load embeddings
-    data = np.load(EMBEDDINGS_PATH, allow_pickle=True).item()
-    embeddings = data["embeddings"]
-    session_ids = data["session_ids"]
+    Returns:
+        (session_id, cosine similarity, offset) triples, best first, offset
+        being the read() offset of the chunk's first message
+    """
+    chunks = _load_embeddings(CHUNKS_PATH)
+    if chunks is None or not chunks.rows:
+        return []
 
-    # Compute cosine similarities
-    norms = np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query_embedding)
-    similarities = np.dot(embeddings, query_embedding) / (norms + 1e-10)
+    top_rows, top_scores = _store_ranking(chunks, query_embedding, k * CHUNK_DEPTH,
+                                          project, branch, since, until, exact, nprobe)
+
+    # Chunks come best first, so a session's first chunk is its best
+    best = {}
+    for row, score in zip(top_rows, top_scores):
+        session_id, chunk_no = _split_chunk_id(chunks.session_ids[row])
+        if session_id not in best:
+            best[session_id] = (score, chunk_no)
+            if len(best) >= k:
+                break
+
+    conn = _db()
+    ranking = []
+    for session_id, (score, chunk_no) in best.items():
+        row = conn.execute("SELECT position FROM chunks WHERE session_id = ? AND chunk_no = ?",
+                           (session_id, chunk_no)).fetchone()
+        ranking.append((session_id, score, row[0] if row else None))
+    return ranking
+
+
+def _merge_max(rankings: list, k: int) -> list:
+    """Merge rankings on the same score scale, keeping each session's best."""
+    scores = {}
+    offsets = {}
+    for ranking in rankings:
+        for session_id, score, offset in ranking:
+            scores[session_id] = max(score, scores.get(session_id, score))
+            if offset is not None:
+                offsets.setdefault(session_id, offset)
+    top = sorted(scores.items(), key=lambda item: -item[1])[:k]
+    return [(session_id, score, offsets.get(session_id)) for session_id, score in top]
+
+
+def _fts_query(query: str) -> Optional[str]:
+    """
+    FTS5 expression matching any term of a free-text query.
 
-    # Get top results
-    top_indices = np.argsort(similarities)[::-1][:limit * 2]  # Get more for filtering
+    Each whitespace-separated term is quoted as a phrase, so identifiers
+    such as ERR_CONN_RESET or auth.py match as written and FTS5 syntax in
+    the query is never interpreted.
+    """
+    terms = [term for term in query.split() if re.search(r"\w", term)]
+    if not terms:
+        return None
+    return " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
 
-    # Fetch session details
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
 
-    results = []
-    for idx in top_indices:
-        if len(results) >= limit:
-            break
+def _keyword_ranking(query: str, k: int, project: Optional[str], branch: Optional[str],
+                     since, until) -> list:
+    """
+    Sessions whose user or assistant text matches the query, by BM25.
 
-        session_id = session_ids[idx]
-        score = float(similarities[idx])
+    Returns:
+        (session_id, negated BM25 rank, None) triples, best first
+    """
+    from cc_dev.sessions.store import timestamp_seconds
 
-        cursor = conn.execute(
-            "SELECT * FROM sessions WHERE session_id = ?",
-            (session_id,)
-        )
-        row = cursor.fetchone()
-        if row:
-            if project and project.lower() not in (row["project_name"] or "").lower():
-                continue
-            results.append({
-                "session_id": row["session_id"],
-                "project": row["project_name"],
-                "score": round(score, 3),
-                "summary": json.loads(row["summaries_json"])[0] if row["summaries_json"] != "[]" else None,
-                "first_message": row["first_user_message"][:200] if row["first_user_message"] else None,
-                "start_time": row["start_time"],
-                "message_count": row["message_count"],
-            })
+    match = _fts_query(query)
+    if match is None:
+        return []
 
-    conn.close()
+    sql = """
+        SELECT sessions_fts.session_id, rank, s.start_time
+        FROM sessions_fts JOIN sessions s ON s.session_id = sessions_fts.session_id
+        WHERE sessions_fts MATCH ?
+    """
+    params = [match]
+    if project:
+        sql += " AND s.project_name LIKE ?"
+        params.append(f"%{project}%")
+    if branch:
+        sql += " AND s.git_branch = ?"
+        params.append(branch)
+    sql += " ORDER BY rank"
+
+    low = timestamp_seconds(since) if since is not None else None
+    high = timestamp_seconds(until) if until is not None else None
+
+    ranking = []
+    try:
+        for session_id, rank, start_time in _db().execute(sql, params):
+            if low is not None or high is not None:
+                if not start_time:
+                    continue
+                seconds = timestamp_seconds(start_time)
+                if (low is not None and seconds < low) or (high is not None and seconds > high):
+                    continue
+            ranking.append((session_id, -rank, None))
+            if len(ranking) >= k:
+                break
+    except sqlite3.OperationalError:
+        ranking = []  # built before the keyword index existed; sync to add it
+    return ranking
+
+
+def _fuse_rankings(rankings: list, limit: int) -> list:
+    """
+    Reciprocal rank fusion of several rankings.
+
+    Each session scores the sum of 1 / (RRF_K + rank) over the rankings it
+    appears in, scaled so that ranking first in all of them scores 1.
+
+    Returns:
+        (session_id, fused score, offset) triples, best first
+    """
+    fused = defaultdict(float)
+    offsets = {}
+    for ranking in rankings:
+        for rank, (session_id, _, offset) in enumerate(ranking, 1):
+            fused[session_id] += 1 / (RRF_K + rank)
+            if offset is not None:
+                offsets.setdefault(session_id, offset)
+
+    best = len(rankings) / (RRF_K + 1)
+    top = sorted(fused.items(), key=lambda item: -item[1])[:limit]
+    return [(session_id, score / best, offsets.get(session_id)) for session_id, score in top]
+
+
+@_served
+@_traced
+def search_many(queries: list, limit: int = 10, project: Optional[str] = None,
+                branch: Optional[str] = None, since=None, until=None,
+                exact: Optional[bool] = None) -> list[list[dict]]:
+    """
+    Semantic search for many queries at once.
+
+    All queries are encoded in one batch and scored against the embedding
+    matrix with one matrix product per block of queries, instead of paying
+    search()'s per-call overhead for each. Every candidate row is scored:
+    the IVF index only pays off one query at a time. A quantized mirror is
+    still scanned first unless exact=True. Results are cached like search().
+
+    Args:
+        queries: Search query strings
+        limit: Maximum results per query
+        project: Optional project name filter (partial match)
+        branch: Optional git branch filter (exact match)
+        since: Only sessions starting at or after this ISO date/datetime
+        until: Only sessions starting at or before this ISO date/datetime
+        exact: Score at full precision only, skipping a quantized mirror
+
+    Returns:
+        One list of matching sessions per query, in query order
+    """
+    queries = list(queries)
+    if not DB_PATH.exists():
+        return [[] for _ in queries]
+
+    cache = _get_query_cache()
+    results = [None] * len(queries)
+    if cache is not None:
+        generation = _index_generation()
+        keys = [_search_key("search_many", query, limit, project, branch, since, until, exact)
+                for query in queries]
+        results = [cache.results(key, generation) for key in keys]
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        computed = _search_many([queries[i] for i in missing], limit, project, branch,
+                                since, until, exact, cache)
+        for i, result in zip(missing, computed):
+            results[i] = result
+            if cache is not None:
+                cache.put_results(keys[i], generation, result)
     return results
 
 
+def _search_many(queries: list, limit: int, project: Optional[str],
+                 branch: Optional[str], since, until, exact: Optional[bool],
+                 cache=None) -> list[list[dict]]:
+    """Uncached batch search; see search_many()."""
+    from cc_dev.sessions.trace import phase
+
+    store = _load_embeddings()
+    if store is None or not store.rows or limit <= 0:
+        return [[] for _ in queries]
+
+    _check_embedder()
+
+    mask, candidate_rows = _candidates(store, project, branch, since, until)
+    if candidate_rows is not None and not candidate_rows.size:
+        return [[] for _ in queries]
+
+    query_embeddings = _query_embeddings(queries, cache)
+
+    with phase("semantic_ranking"):
+        quantized = None if exact else _load_quantized(store)
+        if quantized is not None:
+            pools = _top_rows_many(quantized, query_embeddings, limit * RESCORE_FACTOR,
+                                   candidate_rows, mask)
+            ranked = [_top_rows(store, query_embedding, limit, pool_rows)
+                      for query_embedding, (pool_rows, _) in zip(query_embeddings, pools)]
+        else:
+            ranked = _top_rows_many(store, query_embeddings, limit, candidate_rows, mask)
+
+    with phase("hydration"):
+        return _hydrate([[(store.session_ids[row], score, None)
+                          for row, score in zip(rows, scores)] for rows, scores in ranked])
+
+
+def _candidates(store, project: Optional[str], branch: Optional[str],
+                since, until) -> tuple:
+    """
+    Rows search may return under the filters.
+
+    Returns:
+        (mask, candidate_rows): (None, None) without filters, otherwise the
+        mask of live matching rows and their sorted indices
+    """
+    mask = _filter_rows(store, project, branch, since, until)
+    if mask is None:
+        return None, None
+    mask = mask & store.live
+    return mask, _get_numpy().flatnonzero(mask)
+
+
+def _hydrate(ranked: list) -> list[list[dict]]:
+    """
+    Turn ranked sessions into search results.
+
+    Args:
+        ranked: List of (session_id, score, offset) triples per query
+
+    Returns:
+        One list of result dicts per query
+    """
+    from cc_dev.sessions.trace import count
+
+    # Fetch session details for all queries in one query
+    rows = _fetch_sessions(_db(), list({session_id for ranking in ranked
+                                        for session_id, _, _ in ranking}))
+    count("rows_hydrated", len(rows))
+
+    all_results = []
+    for ranking in ranked:
+        results = []
+        for session_id, score, offset in ranking:
+            row = rows.get(session_id)
+            if row:
+                results.append({
+                    "session_id": row["session_id"],
+                    "project": row["project_name"],
+                    "score": round(float(score), 3),
+                    "summary": json.loads(row["summaries_json"])[0] if row["summaries_json"] != "[]" else None,
+                    "first_message": row["first_user_message"][:200] if row["first_user_message"] else None,
+                    "start_time": row["start_time"],
+                    "message_count": row["message_count"],
+                    "offset": offset,
+                })
+        all_results.append(results)
+
+    return all_results
+
+
+def _similarities(store, query_embeddings, candidate_rows=None, mask=None):
+    """
+    Scores of candidate rows for one query vector or a matrix of them.
+
+    Small candidate sets (selective filters, IVF probes) are gathered and
+    scored alone; otherwise everything is scored and excluded rows get -inf.
+    """
+    from cc_dev.sessions.trace import count
+
+    np = _get_numpy()
+
+    queries = 1 if query_embeddings.ndim == 1 else len(query_embeddings)
+    if candidate_rows is not None and candidate_rows.size <= store.rows // 2:
+        count("rows_scored", queries * candidate_rows.size)
+        return store.dot(query_embeddings, candidate_rows)
+
+    count("rows_scored", queries * store.rows)
+
+    similarities = store.dot(query_embeddings)
+    excluded = ~store.live if mask is None else ~mask
+    if excluded.any():
+        similarities[..., excluded] = -np.inf
+    if candidate_rows is not None:
+        similarities = similarities[..., candidate_rows]
+    return similarities
+
+
+def _top_rows(store, query_embedding, k: int, candidate_rows=None, mask=None) -> tuple:
+    """
+    Highest-scoring store rows for a query, best first.
+
+    Args:
+        store: Embedding store (or its quantized mirror) to score
+        query_embedding: Normalized query vector
+        k: Number of rows to return
+        candidate_rows: Optional sorted row indices to restrict scoring to
+        mask: Optional boolean mask of allowed rows (tombstones are always
+            excluded)
+
+    Returns:
+        (rows, scores) arrays
+    """
+    similarities = _similarities(store, query_embedding, candidate_rows, mask)
+    return _rank(similarities, k, candidate_rows)
+
+
+def _top_rows_many(store, query_embeddings, k: int, candidate_rows=None,
+                   mask=None) -> list:
+    """
+    Highest-scoring store rows for each of many queries; see _top_rows.
+
+    Queries are scored in blocks, one matrix product per block, sized so
+    that a block's scores stay within _SCORE_BLOCK_ELEMENTS.
+
+    Returns:
+        (rows, scores) per query
+    """
+    step = max(1, _SCORE_BLOCK_ELEMENTS // max(store.rows, 1))
+    ranked = []
+    for start in range(0, len(query_embeddings), step):
+        similarities = _similarities(store, query_embeddings[start:start + step],
+                                     candidate_rows, mask)
+        ranked.extend(_rank(scores, k, candidate_rows) for scores in similarities)
+    return ranked
+
+
+def _rank(similarities, k: int, candidate_rows=None) -> tuple:
+    """Top k of one query's scores as (rows, scores), dropping -inf."""
+    np = _get_numpy()
+
+    # Top candidates without sorting the whole corpus
+    k = min(k, len(similarities))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    top = np.argpartition(-similarities, k - 1)[:k]
+    top = top[np.argsort(-similarities[top])]
+    top = top[similarities[top] > -np.inf]
+    rows = top if candidate_rows is None else candidate_rows[top]
+    return rows, similarities[top]
+
+
+def _fetch_sessions(conn: sqlite3.Connection, session_ids: list) -> dict:
+    """Fetch session rows by id with a single IN query."""
+    if not session_ids:
+        return {}
+    placeholders = ", ".join("?" * len(session_ids))
+    cursor = conn.execute(
+        f"SELECT * FROM sessions WHERE session_id IN ({placeholders})",
+        session_ids
+    )
+    return {row["session_id"]: row for row in cursor.fetchall()}
+
+
+@_served
 def meta(session_id: str) -> Optional[dict]:
     """
     Get metadata for a session without loading messages.
@@ -407,12 +2478,8 @@ def meta(session_id: str) -> Optional[dict]:
     if not DB_PATH.exists():
         return None
 
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-
-    cursor = conn.execute("SELECT * FROM sessions WHERE session_id = ?", (session_id,))
+    cursor = _db().execute("SELECT * FROM sessions WHERE session_id = ?", (session_id,))
     row = cursor.fetchone()
-    conn.close()
 
     if not row:
         return None
@@ -438,112 +2505,319 @@ def meta(session_id: str) -> Optional[dict]:
     }
 
 
-def _extract_messages(file_path: str, types: Optional[list] = None,
-                      tools: Optional[list] = None,
-                      first: Optional[int] = None,
-                      last: Optional[int] = None,
-                      offset: int = 0,
-                      limit: Optional[int] = None) -> list[dict]:
-    """Extract and filter messages from a session file."""
+def _line_messages(msg: dict) -> list[dict]:
+    """All messages extracted from one session line, in read() order."""
+    messages = []
+    msg_type = msg.get("type")
+
+    if msg_type == "summary":
+        messages.append({
+            "type": "summary",
+            "content": msg.get("summary"),
+        })
+
+    elif msg_type == "user":
+        timestamp = msg.get("timestamp")
+        content = msg.get("message", {}).get("content")
+
+        if isinstance(content, str):
+            messages.append({
+                "type": "user",
+                "timestamp": timestamp,
+                "content": content,
+            })
+        elif isinstance(content, list):
+            for block in content:
+                if block.get("type") == "tool_result":
+                    result_content = block.get("content", "")
+                    messages.append({
+                        "type": "tool_result",
+                        "timestamp": timestamp,
+                        "tool_use_id": block.get("tool_use_id"),
+                        "content": result_content[:2000] if isinstance(result_content, str) else str(result_content)[:2000],
+                    })
+                elif block.get("type") == "text":
+                    messages.append({
+                        "type": "user",
+                        "timestamp": timestamp,
+                        "content": block.get("text"),
+                    })
+
+    elif msg_type == "assistant":
+        content = msg.get("message", {}).get("content", [])
+        if isinstance(content, list):
+            for block in content:
+                block_type = block.get("type")
+
+                if block_type == "text":
+                    messages.append({
+                        "type": "assistant",
+                        "content": block.get("text"),
+                    })
+                elif block_type == "thinking":
+                    messages.append({
+                        "type": "thinking",
+                        "content": block.get("thinking"),
+                    })
+                elif block_type == "tool_use":
+                    messages.append({
+                        "type": "tool_use",
+                        "tool_name": block.get("name"),
+                        "tool_use_id": block.get("id"),
+                        "input": block.get("input"),
+                    })
+
+    return messages
 
-    all_types = types or ["user", "assistant", "summary", "thinking", "tool_use", "tool_result"]
 
-    messages = []
+def _message_matches(message: dict, types: Optional[list], tools: Optional[list]) -> bool:
+    if types and message["type"] not in types:
+        return False
+    return tools is None or message["type"] != "tool_use" or message["tool_name"] in tools
 
-    with open(file_path, 'r') as f:
+
+def _select(messages: list, first: Optional[int], last: Optional[int],
+            offset: int, limit: Optional[int]) -> list:
+    """Apply read()'s positional filters."""
+    if first is not None:
+        return messages[:first]
+    if last is not None:
+        return messages[-last:]
+    if offset > 0:
+        messages = messages[offset:]
+    if limit is not None:
+        messages = messages[:limit]
+    return messages
+
+
+def _select_stream(messages: Iterator[dict], first: Optional[int], last: Optional[int],
+                   offset: int, limit: Optional[int]) -> list:
+    """
+    Apply read()'s positional filters to a message stream.
+
+    Stops consuming the stream once first or offset + limit messages are
+    taken, and keeps at most last messages in memory.
+    """
+    if first is not None:
+        if first >= 0:
+            return list(islice(messages, first))
+    elif last is not None:
+        if last > 0:
+            return list(deque(messages, maxlen=last))
+    elif limit is None or limit >= 0:
+        start = max(offset, 0)
+        return list(islice(messages, start, None if limit is None else start + limit))
+    # Negative counts slice from the end, and last=0 keeps everything
+    return _select(list(messages), first, last, offset, limit)
+
+
+def _iter_file_messages(file_path: str, types: Optional[list] = None,
+                        tools: Optional[list] = None, start: int = 0) -> Iterator[dict]:
+    """Lazily extract and filter messages from a session file, from byte start on."""
+    from cc_dev.sessions.decode import prefilter
+
+    loads = _get_loads()
+    may_match = prefilter(types, tools)
+    with open(file_path, 'rb') as f:
+        f.seek(start)
         for line in f:
             line = line.strip()
-            if not line:
+            if not line or (may_match is not None and not may_match(line)):
                 continue
             try:
-                msg = json.loads(line)
-            except json.JSONDecodeError:
+                msg = loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError):
                 continue
+            for message in _line_messages(msg):
+                if _message_matches(message, types, tools):
+                    yield message
 
-            msg_type = msg.get("type")
 
-            if msg_type == "summary" and "summary" in all_types:
-                messages.append({
-                    "type": "summary",
-                    "content": msg.get("summary"),
-                })
+def _extract_messages(file_path: str, types: Optional[list] = None,
+                      tools: Optional[list] = None,
+                      first: Optional[int] = None,
+                      last: Optional[int] = None,
+                      offset: int = 0,
+                      limit: Optional[int] = None,
+                      start: int = 0) -> list[dict]:
+    """Extract and filter messages from a session file, from byte start on."""
+    with closing(_iter_file_messages(file_path, types, tools, start)) as messages:
+        return _select_stream(messages, first, last, offset, limit)
 
-            elif msg_type == "user":
-                timestamp = msg.get("timestamp")
-                content = msg.get("message", {}).get("content")
 
-                if isinstance(content, str):
-                    if "user" in all_types:
-                        messages.append({
-                            "type": "user",
-                            "timestamp": timestamp,
-                            "content": content,
-                        })
-                elif isinstance(content, list):
-                    for block in content:
-                        if block.get("type") == "tool_result" and "tool_result" in all_types:
-                            tool_use_id = block.get("tool_use_id")
-                            result_content = block.get("content", "")
-                            if tools is None or True:  # Can't filter tool_result by name easily
-                                messages.append({
-                                    "type": "tool_result",
-                                    "timestamp": timestamp,
-                                    "tool_use_id": tool_use_id,
-                                    "content": result_content[:2000] if isinstance(result_content, str) else str(result_content)[:2000],
-                                })
-                        elif block.get("type") == "text" and "user" in all_types:
-                            messages.append({
-                                "type": "user",
-                                "timestamp": timestamp,
-                                "content": block.get("text"),
-                            })
+def _appended_messages(row: sqlite3.Row, types: Optional[list],
+                       tools: Optional[list]) -> Optional[list]:
+    """
+    Filtered messages appended to a session file since it was indexed.
 
-            elif msg_type == "assistant":
-                content = msg.get("message", {}).get("content", [])
-                if isinstance(content, list):
-                    for block in content:
-                        block_type = block.get("type")
+    Returns:
+        The messages (none when the file is unchanged), or None when the
+        file was rewritten or can't be read
+    """
+    try:
+        fingerprint = _file_fingerprint(Path(row["file_path"]))
+    except OSError:
+        return None
+    if fingerprint == (row["file_size"], row["file_mtime_ns"], row["file_inode"]):
+        return []
+    # Session files only grow; anything else needs a full scan
+    if fingerprint[2] != row["file_inode"] or fingerprint[0] < row["parsed_offset"]:
+        return None
+    return _extract_messages(row["file_path"], types, tools, start=row["parsed_offset"])
 
-                        if block_type == "text" and "assistant" in all_types:
-                            messages.append({
-                                "type": "assistant",
-                                "content": block.get("text"),
-                            })
-                        elif block_type == "thinking" and "thinking" in all_types:
-                            messages.append({
-                                "type": "thinking",
-                                "content": block.get("thinking"),
-                            })
-                        elif block_type == "tool_use" and "tool_use" in all_types:
-                            tool_name = block.get("name")
-                            if tools is None or tool_name in tools:
-                                messages.append({
-                                    "type": "tool_use",
-                                    "tool_name": tool_name,
-                                    "tool_use_id": block.get("id"),
-                                    "input": block.get("input"),
-                                })
-
-    # Apply positional filters
-    if first is not None:
-        messages = messages[:first]
-    elif last is not None:
-        messages = messages[-last:]
-    else:
-        if offset > 0:
-            messages = messages[offset:]
-        if limit is not None:
-            messages = messages[:limit]
 
-    return messages
+def _has_stored_messages(row: sqlite3.Row) -> bool:
+    """Whether the message store holds all indexed messages of a session."""
+    if "stored_messages" not in row.keys():
+        return False  # built before the message store existed
+    return row["stored_messages"] is not None and row["stored_messages"] == row["extracted_messages"]
+
+
+def _stored_query(session_id: str, types: Optional[list],
+                  tools: Optional[list]) -> tuple:
+    """Unordered query of a session's stored messages matching read() filters."""
+    query = """
+        SELECT type, timestamp, tool_name, tool_use_id, content, input_json
+        FROM messages WHERE session_id = ?
+    """
+    params = [session_id]
+    if types:
+        names = [name for name in _MESSAGE_TYPE_CODES if name in types]
+        query += f" AND type IN ({', '.join('?' * len(names))})"
+        params.extend(names)
+    if tools is not None:
+        query += f" AND (type != 'tool_use' OR tool_name IN ({', '.join('?' * len(tools))}))"
+        params.extend(tools)
+    return query, params
+
+
+def _read_stored(row: sqlite3.Row, session_id: str,
+                 types: Optional[list], tools: Optional[list],
+                 first: Optional[int], last: Optional[int],
+                 offset: int, limit: Optional[int]) -> Optional[list]:
+    """
+    Read messages from the message store.
+
+    Filters run as SQL on the store's type and tool indexes. Messages
+    appended to the session file since the last sync are scanned; a
+    missing file is served from the store alone.
+
+    Returns:
+        The messages, or None when the session file was rewritten since
+    """
+    tail = []
+    if Path(row["file_path"]).exists():
+        tail = _appended_messages(row, types, tools)
+        if tail is None:
+            return None
+
+    query, params = _stored_query(session_id, types, tools)
+
+    # Push positional filters into the query when the tail doesn't take part
+    order, window = "ASC", None
+    if not tail:
+        if first is not None:
+            if first >= 0:
+                window = (first, 0)
+        elif last is not None:
+            if last > 0:
+                order, window = "DESC", (last, 0)
+        elif limit is None or limit >= 0:
+            window = (-1 if limit is None else limit, max(offset, 0))
+
+    query += f" ORDER BY position {order}"
+    if window is not None:
+        query += " LIMIT ? OFFSET ?"
+        params.extend(window)
+
+    messages = [_stored_message(message) for message in _db().execute(query, params)]
+
+    if order == "DESC":
+        return messages[::-1]
+    if window is not None:
+        return messages
+    return _select(messages + tail, first, last, offset, limit)
+
+
+def _read_indexed(row: sqlite3.Row, types: Optional[list], tools: Optional[list],
+                  first: Optional[int], last: Optional[int],
+                  offset: int, limit: Optional[int]) -> Optional[list]:
+    """
+    Read messages through the session's message index.
+
+    The index gives the byte offset of the line holding each message and
+    the message type, so type and positional filters are resolved without
+    touching the file, and only the lines of the selected messages are
+    decoded. Lines appended since the last sync are scanned.
+
+    Returns:
+        The messages, or None when the index can't serve the read
+    """
+    codes = row["type_codes"]
+    line_offsets = array("Q")
+    line_offsets.frombytes(row["line_offsets"])
+    if len(codes) != len(line_offsets) or len(codes) != row["extracted_messages"]:
+        return None
 
+    file_path = row["file_path"]
+    tail = _appended_messages(row, types, tools)
+    if tail is None:
+        return None
 
+    # Positions of the indexed messages of the requested types, followed by
+    # the already decoded and filtered messages of the tail
+    if types:
+        wanted = {code for name, code in _MESSAGE_TYPE_CODES.items() if name in types}
+        candidates = [position for position, code in enumerate(codes) if code in wanted]
+    else:
+        candidates = range(len(codes))
+    if tail:
+        candidates = [*candidates, *tail]
+
+    loads = _get_loads()
+    lines = {}
+
+    with open(file_path, "rb") as f:
+        def resolve(candidate):
+            if isinstance(candidate, dict):
+                return candidate
+            line_offset = line_offsets[candidate]
+            line_messages = lines.get(line_offset)
+            if line_messages is None:
+                f.seek(line_offset)
+                line_messages = lines[line_offset] = _line_messages(loads(f.readline()))
+            message = line_messages[candidate - bisect.bisect_left(line_offsets, line_offset)]
+            if _MESSAGE_TYPE_CODES[message["type"]] != codes[candidate]:
+                raise ValueError("message index is out of date")
+            return message
+
+        try:
+            if tools is None:
+                return [resolve(c) for c in _select(candidates, first, last, offset, limit)]
+
+            # Tool filters need the tool name, so candidates are decoded in
+            # order until enough of them match
+            def matching(candidates):
+                for candidate in candidates:
+                    message = resolve(candidate)
+                    if _message_matches(message, types, tools):
+                        yield message
+
+            if first is None and last:
+                return list(islice(matching(reversed(candidates)), last))[::-1]
+            return _select_stream(matching(candidates), first, last, offset, limit)
+        except (IndexError, KeyError, ValueError, AttributeError):
+            # ValueError covers undecodable lines; the file was rewritten
+            return None
+
+
+@_served
 def read(session_id: str,
          types: Optional[list] = None,
          tools: Optional[list] = None,
          first: Optional[int] = None,
          last: Optional[int] = None,
-         offset: int = 0,
+         offset: Optional[int] = 0,
          limit: Optional[int] = None) -> list[dict]:
     """
     Read messages from a session with filtering.
@@ -554,7 +2828,8 @@ def read(session_id: str,
         tools: Filter tool_use by tool names: Write, Edit, Bash, Read, etc.
         first: Return only first N messages
         last: Return only last N messages
-        offset: Skip first N messages (incompatible with first/last)
+        offset: Skip first N messages (incompatible with first/last; None
+            skips none)
         limit: Maximum messages to return (incompatible with first/last)
 
     Returns:
@@ -562,25 +2837,86 @@ def read(session_id: str,
     """
     if not DB_PATH.exists():
         return []
-
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.execute(
-        "SELECT file_path FROM sessions WHERE session_id = ?",
-        (session_id,)
-    )
-    row = cursor.fetchone()
-    conn.close()
+    if offset is None:
+        offset = 0
+
+    conn = _db()
+    try:
+        row = conn.execute("""
+            SELECT s.file_path, s.file_size, s.file_mtime_ns, s.file_inode,
+                   s.parsed_offset, s.extracted_messages, s.stored_messages,
+                   m.line_offsets, m.type_codes
+            FROM sessions s LEFT JOIN message_index m ON m.session_id = s.session_id
+            WHERE s.session_id = ?
+        """, (session_id,)).fetchone()
+    except sqlite3.OperationalError:
+        # Built before the message index existed
+        row = conn.execute(
+            "SELECT file_path, NULL AS type_codes FROM sessions WHERE session_id = ?",
+            (session_id,)
+        ).fetchone()
 
     if not row:
         return []
 
-    file_path = row[0]
+    if _has_stored_messages(row):
+        messages = _read_stored(row, session_id, types, tools, first, last, offset, limit)
+        if messages is not None:
+            return messages
+
+    file_path = row["file_path"]
     if not Path(file_path).exists():
         return []
 
+    if row["type_codes"] is not None:
+        messages = _read_indexed(row, types, tools, first, last, offset, limit)
+        if messages is not None:
+            return messages
+
     return _extract_messages(file_path, types, tools, first, last, offset, limit)
 
 
+def iter_messages(session_id: str,
+                  types: Optional[list] = None,
+                  tools: Optional[list] = None) -> Iterator[dict]:
+    """
+    Lazily iterate over the messages of a session.
+
+    Messages are decoded one line at a time, so memory use doesn't grow
+    with the session and the file is only read as far as the caller
+    iterates. When the file is gone, messages come from the message store
+    if it holds the session. Always runs in-process.
+
+    Args:
+        session_id: The session UUID
+        types: Filter by message types: user, assistant, summary, thinking, tool_use, tool_result
+        tools: Filter tool_use by tool names: Write, Edit, Bash, Read, etc.
+
+    Yields:
+        Messages in the same form and order as read()
+    """
+    if not DB_PATH.exists():
+        return
+
+    conn = _db()
+    row = conn.execute(
+        "SELECT * FROM sessions WHERE session_id = ?",
+        (session_id,)
+    ).fetchone()
+    if not row:
+        return
+
+    if not Path(row["file_path"]).exists():
+        if _has_stored_messages(row):
+            query, params = _stored_query(session_id, types, tools)
+            for message in conn.execute(query + " ORDER BY position", params):
+                yield _stored_message(message)
+        return
+
+    yield from _iter_file_messages(row["file_path"], types, tools)
+
+
+@_served
 def list_sessions(project: Optional[str] = None,
                   limit: int = 20,
                   order_by: str = "start_time") -> list[dict]:
@@ -598,9 +2934,6 @@ def list_sessions(project: Optional[str] = None,
     if not DB_PATH.exists():
         return []
 
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-
     query = "SELECT * FROM sessions"
     params = []
 
@@ -611,9 +2944,8 @@ def list_sessions(project: Optional[str] = None,
     query += f" ORDER BY {order_by} DESC LIMIT ?"
     params.append(limit)
 
-    cursor = conn.execute(query, params)
+    cursor = _db().execute(query, params)
     rows = cursor.fetchall()
-    conn.close()
 
     return [{
         "session_id": row["session_id"],
@@ -0,0 +1,80 @@
+"""
+Connections to the session index database.
+
+Reads used to open and close a connection per call. connection() keeps one
+per thread and database instead, so SQLite's page cache and Python's
+prepared statements carry over from call to call. build_index writes
+through writer(), which keeps the database in WAL mode: a running sync
+appends to the write-ahead log while readers go on seeing the last
+committed state, so reads never wait for it.
+"""
+
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+# Prepared statements kept per connection
+STATEMENT_CACHE_SIZE = 256
+
+# Bytes of the database file each connection reads through a memory map
+MMAP_SIZE = 256 << 20
+
+# Page cache per connection, in KiB
+CACHE_KIB = 16384
+
+# Seconds a writer waits for another writer (a concurrent sync) to commit
+WRITER_TIMEOUT = 60.0
+
+_local = threading.local()
+
+
+def connection(path: Path) -> sqlite3.Connection:
+    """
+    Read-only connection to a database for the calling thread.
+
+    Opened on first use and reused afterwards, or reopened if the file at
+    path was replaced. Rows are sqlite3.Row. Callers must not close it.
+
+    Raises:
+        FileNotFoundError: The database doesn't exist
+    """
+    st = os.stat(path)
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    key = os.fspath(path)
+    cached = connections.get(key)
+    if cached is not None:
+        if cached[0] == (st.st_dev, st.st_ino):
+            return cached[1]
+        cached[1].close()
+
+    conn = sqlite3.connect(path, cached_statements=STATEMENT_CACHE_SIZE)
+    conn.row_factory = sqlite3.Row
+    _tune(conn)
+    conn.execute("PRAGMA query_only = ON")
+    connections[key] = ((st.st_dev, st.st_ino), conn)
+    return conn
+
+
+def writer(path: Path) -> sqlite3.Connection:
+    """
+    New connection for updating a database, which it switches to WAL mode.
+
+    The caller owns and closes it.
+    """
+    conn = sqlite3.connect(path, timeout=WRITER_TIMEOUT,
+                           cached_statements=STATEMENT_CACHE_SIZE)
+    conn.execute("PRAGMA journal_mode = WAL")
+    # In WAL mode NORMAL only syncs at checkpoints: a power loss can drop
+    # the last commits, never corrupt the database
+    conn.execute("PRAGMA synchronous = NORMAL")
+    _tune(conn)
+    return conn
+
+
+def _tune(conn: sqlite3.Connection) -> None:
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_KIB}")
@@ -0,0 +1,121 @@
+"""
+JSON decoding of session lines.
+
+Session files are JSON lines, and decoding them is most of the cost of
+indexing and reading a session. get_loads() returns the fastest installed
+decoder (orjson, then msgspec, then the standard library). Lines a fast
+decoder rejects are retried with the standard library, so every backend
+accepts the same lines and raises the same errors.
+
+prefilter() builds a cheap byte-level test that rejects lines which can't
+hold any of the wanted messages, so they are skipped without decoding.
+Scanning a line for a token costs a fraction of decoding it, so the test
+is only built when the wanted messages are a subset of the line types.
+"""
+
+import json
+from typing import Callable, Optional
+
+BACKENDS = ("orjson", "msgspec", "json")
+
+# Quoted tokens found in every line holding a message of each type: the
+# content block type, where there is one, and the line's own "type" value.
+# The rarest token comes first, so most lines are rejected after one scan.
+_MESSAGE_TOKENS = {
+    "summary": (b'"summary"',),
+    "user": (b'"user"',),
+    "tool_result": (b'"tool_result"', b'"user"'),
+    "assistant": (b'"assistant"', b'"text"'),
+    "thinking": (b'"thinking"', b'"assistant"'),
+    "tool_use": (b'"tool_use"', b'"assistant"'),
+}
+
+
+def available_backends() -> list[str]:
+    """Names of the installed backends, fastest first."""
+    available = []
+    for backend in BACKENDS:
+        try:
+            get_loads(backend)
+        except ImportError:
+            continue
+        available.append(backend)
+    return available
+
+
+def get_loads(backend: Optional[str] = None) -> Callable:
+    """
+    Decoder of one JSON document from bytes or str.
+
+    Args:
+        backend: orjson, msgspec or json (default: fastest installed)
+
+    Raises:
+        ValueError: Unknown backend
+        ImportError: The requested backend isn't installed
+    """
+    if backend is None:
+        for candidate in BACKENDS:
+            try:
+                return get_loads(candidate)
+            except ImportError:
+                continue
+
+    if backend == "json":
+        return json.loads
+    if backend == "orjson":
+        import orjson
+        return _with_fallback(orjson.loads, orjson.JSONDecodeError)
+    if backend == "msgspec":
+        import msgspec
+        return _with_fallback(msgspec.json.Decoder().decode, msgspec.DecodeError)
+    raise ValueError(f"Unknown JSON backend {backend!r}; expected one of {BACKENDS}")
+
+
+def _with_fallback(loads: Callable, errors) -> Callable:
+    """Wrap a fast decoder to retry rejected documents with the standard library."""
+    def decode(data):
+        try:
+            return loads(data)
+        except errors:
+            # Invalid JSON raises json's own error here; documents only the
+            # fast decoder rejects (e.g. integers past 64 bits) still decode
+            return json.loads(data)
+
+    return decode
+
+
+def prefilter(types: Optional[list] = None,
+              tools: Optional[list] = None) -> Optional[Callable[[bytes], bool]]:
+    """
+    Byte-level test for lines that may hold matching messages.
+
+    A line passing the test still has to be decoded and filtered; a line
+    failing it holds no message of the given types (and tool names) and
+    can be skipped.
+
+    Args:
+        types: Message types as in read() (default: all)
+        tools: Tool names the tool_use messages must have
+
+    Returns:
+        The test, or None when every message line may match
+    """
+    if not types and tools is None:
+        return None
+
+    alternatives = []
+    for name, tokens in _MESSAGE_TOKENS.items():
+        if types and name not in types:
+            continue
+        # Narrow by tool name, unless a name could be written escaped
+        if (name == "tool_use" and tools is not None and
+                all(isinstance(tool, str) and tool.isascii() for tool in tools)):
+            alternatives.extend((json.dumps(tool).encode(), *tokens) for tool in tools)
+            continue
+        alternatives.append(tokens)
+
+    def accept(line: bytes) -> bool:
+        return any(all(token in line for token in tokens) for tokens in alternatives)
+
+    return accept
@@ -0,0 +1,206 @@
+"""
+Embedding backends.
+
+An Embedder turns texts into vectors. Three backends implement it:
+
+- sentence-transformers: the reference backend, which loads torch
+- onnx: the same models exported to ONNX, run with onnxruntime and
+  tokenizers, without torch
+- hashing: signed feature hashing of words and word pairs in NumPy, with
+  no model files at all, for environments that can't download a model
+
+Vectors of different backends (or models) aren't comparable. Each has a
+name, recorded with every vector in the index, so build_index re-embeds
+whatever another embedder produced.
+"""
+
+import json
+import math
+import re
+import zlib
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Protocol
+
+import numpy as np
+
+BACKENDS = ("sentence-transformers", "onnx", "hashing")
+
+# Vector size of the hashing backend
+HASHING_DIM = 1024
+
+# Tokens kept per text by the onnx backend when the model doesn't say
+_DEFAULT_MAX_TOKENS = 256
+
+_WORD = re.compile(r"\w+")
+
+
+class Embedder(Protocol):
+    """Embeds texts as rows of a float32 matrix."""
+
+    # Identity of the vectors: equal names mean comparable vectors
+    name: str
+
+    def encode(self, texts: list[str], batch_size: int = 32) -> np.ndarray:
+        ...
+
+
+def embedder_name(backend: str, model: str) -> str:
+    """
+    Name of the embedder a backend and model give, without loading it.
+
+    sentence-transformers embedders are named after the model alone, as
+    every vector was before there were other backends.
+
+    Raises:
+        ValueError: Unknown backend
+    """
+    if backend == "sentence-transformers":
+        return model
+    if backend == "onnx":
+        return f"onnx:{model}"
+    if backend == "hashing":
+        return f"hashing:{HASHING_DIM}"
+    raise ValueError(f"Unknown embedding backend {backend!r}; expected one of {BACKENDS}")
+
+
+def get_embedder(backend: str, model: str) -> Embedder:
+    """
+    Load the embedder of a backend.
+
+    Args:
+        backend: sentence-transformers, onnx or hashing
+        model: Model name or local directory (ignored by hashing)
+
+    Raises:
+        ValueError: Unknown backend
+        ImportError: The backend's packages aren't installed
+    """
+    if backend == "sentence-transformers":
+        return SentenceTransformerEmbedder(model)
+    if backend == "onnx":
+        return OnnxEmbedder(model)
+    if backend == "hashing":
+        return HashingEmbedder(HASHING_DIM)
+    raise ValueError(f"Unknown embedding backend {backend!r}; expected one of {BACKENDS}")
+
+
+class SentenceTransformerEmbedder:
+    """A sentence-transformers model."""
+
+    def __init__(self, model: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.name = embedder_name("sentence-transformers", model)
+        self.model = SentenceTransformer(model)
+
+    def encode(self, texts: list[str], batch_size: int = 32,
+               pool: Optional[dict] = None) -> np.ndarray:
+        """Embed texts, spread over the processes of a pool from start_pool if given."""
+        if pool is not None:
+            return self.model.encode_multi_process(texts, pool, batch_size=batch_size)
+        return self.model.encode(texts, batch_size=batch_size, show_progress_bar=False)
+
+    def start_pool(self, workers: int) -> dict:
+        """Start worker processes that each load the model on the CPU."""
+        return self.model.start_multi_process_pool(["cpu"] * workers)
+
+    def stop_pool(self, pool: dict) -> None:
+        self.model.stop_multi_process_pool(pool)
+
+
+class OnnxEmbedder:
+    """
+    A sentence-transformers model exported to ONNX.
+
+    Mean-pools the token embeddings like the sentence-transformers models
+    this loads. The model is a local directory, or a Hugging Face model
+    (bare names are looked up under sentence-transformers/) that ships
+    onnx/model.onnx and tokenizer.json.
+    """
+
+    def __init__(self, model: str):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.name = embedder_name("onnx", model)
+        directory = _model_directory(model)
+        onnx_path = directory / "onnx" / "model.onnx"
+        if not onnx_path.exists():
+            onnx_path = directory / "model.onnx"
+
+        max_tokens = _DEFAULT_MAX_TOKENS
+        config = directory / "sentence_bert_config.json"
+        if config.exists():
+            max_tokens = json.loads(config.read_text()).get("max_seq_length", max_tokens)
+
+        self._tokenizer = Tokenizer.from_file(str(directory / "tokenizer.json"))
+        self._tokenizer.enable_truncation(max_length=max_tokens)
+        self._tokenizer.enable_padding()
+        self._session = onnxruntime.InferenceSession(
+            str(onnx_path), providers=["CPUExecutionProvider"])
+        self._inputs = {node.name for node in self._session.get_inputs()}
+
+    def encode(self, texts: list[str], batch_size: int = 32) -> np.ndarray:
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            encodings = self._tokenizer.encode_batch(texts[start:start + batch_size])
+            ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+            mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+            feeds = {"input_ids": ids, "attention_mask": mask}
+            if "token_type_ids" in self._inputs:
+                feeds["token_type_ids"] = np.zeros_like(ids)
+            tokens = self._session.run(None, feeds)[0]
+
+            weights = mask[:, :, None].astype(np.float32)
+            batches.append((tokens * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9))
+        if not batches:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.concatenate(batches).astype(np.float32, copy=False)
+
+
+def _model_directory(model: str) -> Path:
+    """Local directory of an ONNX model, downloading it if it's a model name."""
+    if Path(model).is_dir():
+        return Path(model)
+    from huggingface_hub import snapshot_download
+
+    repo_id = model if "/" in model else f"sentence-transformers/{model}"
+    return Path(snapshot_download(repo_id, allow_patterns=[
+        "onnx/model.onnx", "tokenizer.json", "sentence_bert_config.json"]))
+
+
+class HashingEmbedder:
+    """
+    Feature hashing of words and adjacent word pairs.
+
+    Each feature adds a sublinear term frequency, 1 + log(count), to one of
+    HASHING_DIM slots, with a sign from the hash so that collisions cancel
+    out on average. There is no IDF weighting, as it would change every
+    vector whenever the corpus grows.
+    """
+
+    def __init__(self, dim: int = HASHING_DIM):
+        self.dim = dim
+        self.name = f"hashing:{dim}"
+
+    def encode(self, texts: list[str], batch_size: int = 32) -> np.ndarray:
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = _WORD.findall(text.lower())
+            counts = Counter(words)
+            counts.update(map(" ".join, zip(words, words[1:])))
+            if not counts:
+                continue
+            slots, weights = zip(*(_hash_feature(feature, self.dim) for feature in counts))
+            np.add.at(embeddings[row], list(slots), np.multiply(
+                weights, [1 + math.log(count) for count in counts.values()]))
+        return embeddings
+
+
+@lru_cache(maxsize=1 << 18)
+def _hash_feature(feature: str, dim: int) -> tuple[int, int]:
+    """Slot and sign of a feature, the same in every process."""
+    digest = zlib.crc32(feature.encode())
+    return digest % dim, 1 if digest & 0x80000000 else -1
@@ -0,0 +1,128 @@
+"""
+Embedding stage of build_index.
+
+Sessions used to be embedded in one model.encode call once every changed
+file was parsed and written, so a cold build parsed and then encoded with
+the other stage idle. EncodePipeline encodes on a background thread
+instead: build_index submits the texts of each batch it writes and goes on
+parsing while earlier batches are encoded (the model releases the GIL
+while it computes). Whatever has been submitted when the encoder becomes
+free is taken as one window, up to WINDOW_TEXTS texts, so the encoder is
+never waiting while there is work queued.
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+
+# Most texts encoded in one call
+WINDOW_TEXTS = 4096
+
+_DONE = object()
+
+
+class EncodePipeline:
+    """Encodes submitted (key, text) pairs on a background thread."""
+
+    def __init__(self, encode: Callable[[list], np.ndarray], window: int = WINDOW_TEXTS):
+        """
+        Args:
+            encode: Embeds a list of texts as a matrix with a row per text
+            window: Most texts passed to encode at once
+        """
+        self._encode = encode
+        self._window = window
+        self._queue = queue.SimpleQueue()
+        self._keys = []
+        self._embeddings = []
+        self._error = None
+        self._closed = False
+        # Texts encoded, and seconds spent in encode
+        self.texts = 0
+        self.seconds = 0.0
+        self._thread = threading.Thread(target=self._run, name="encode", daemon=True)
+        self._thread.start()
+
+    def submit(self, items: Iterable[tuple]) -> None:
+        """Queue (key, text) pairs for encoding."""
+        items = list(items)
+        if items:
+            self._queue.put(items)
+
+    def _run(self):
+        pending = []
+        done = False
+        while not done:
+            items = self._queue.get()
+            while True:
+                if items is _DONE:
+                    done = True
+                    break
+                pending.extend(items)
+                if len(pending) >= self._window:
+                    break
+                try:
+                    items = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            while pending and (done or len(pending) >= self._window or self._queue.empty()):
+                window, pending = pending[:self._window], pending[self._window:]
+                if self._error is not None or self._closed:
+                    continue  # drain the queue so finish() returns
+                try:
+                    start = time.perf_counter()
+                    embeddings = self._encode([text for _, text in window])
+                    self.seconds += time.perf_counter() - start
+                except BaseException as e:
+                    self._error = e
+                    continue
+                self._keys.extend(key for key, _ in window)
+                self._embeddings.append(embeddings)
+                self.texts += len(window)
+
+    def finish(self) -> tuple[list, Optional[np.ndarray]]:
+        """
+        Wait for every submitted text to be encoded.
+
+        Returns:
+            (keys, embeddings): each key once, with the embedding of the text
+            submitted last for it, or ([], None) if nothing was submitted
+
+        Raises:
+            The error encoding failed with
+        """
+        self._queue.put(_DONE)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        if not self._keys:
+            return [], None
+
+        embeddings = np.concatenate(self._embeddings)
+        last = {key: i for i, key in enumerate(self._keys)}
+        if len(last) == len(self._keys):
+            return self._keys, embeddings
+        rows = sorted(last.values())
+        return [self._keys[i] for i in rows], embeddings[rows]
+
+    def close(self) -> None:
+        """
+        Stop the encoder thread, dropping texts not encoded yet.
+
+        Does nothing once finish() returned. Call it when finish() may not
+        be reached, so a failed build_index doesn't leave the thread
+        waiting for texts forever.
+        """
+        if self._thread.is_alive():
+            self._closed = True
+            self._queue.put(_DONE)
+            self._thread.join()
+
+    @property
+    def rate(self) -> float:
+        """Texts encoded per second of encoding."""
+        return self.texts / self.seconds if self.seconds else 0.0
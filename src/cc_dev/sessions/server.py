@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Warm session server.
+
+A fresh process pays for loading the embedding model and opening the index
+on every search. The server keeps both loaded in one long-lived process and
+answers requests on a Unix domain socket, one JSON object per line:
+
+    {"method": "search", "params": {"query": "..."}, "index": "/path/sessions.db",
+     "settings": {"EMBEDDING_BACKEND": "...", ...}}
+    {"result": [...]}  or  {"error": "...", "type": "ValueError"}
+
+search, search_many, meta, read and list_sessions route to a running server
+on their own (see core._served) and run in-process when none is listening,
+or when the server's index or core.SERVER_SETTINGS differ from the caller's.
+Requests run concurrently on a pool of WORKERS threads.
+
+Usage:
+    python -m cc_dev.sessions.server          # serve until interrupted
+    python -m cc_dev.sessions.server --status
+    python -m cc_dev.sessions.server --stop
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from cc_dev.sessions import core
+
+# Threads running requests, so a long search_many doesn't hold up the rest
+# (they mostly wait on SQLite, NumPy or the model, which release the GIL)
+WORKERS = 8
+
+
+class ServerError(Exception):
+    """The server answered a request with an error."""
+
+
+def call(socket_path: Path, method: str, params: Optional[dict] = None,
+         index: Optional[str] = None, settings: Optional[dict] = None,
+         timeout: Optional[float] = None, reply_timeout: Optional[float] = None):
+    """
+    Send one request to a session server and return its result.
+
+    Args:
+        socket_path: Path of the server socket
+        method: search, search_many, meta, read, list_sessions, ping or shutdown
+        params: Keyword arguments for the method
+        index: Database path the caller expects the server to serve
+        settings: core.SERVER_SETTINGS values the caller expects the server
+            to run with
+        timeout: Seconds to wait for connecting
+        reply_timeout: Seconds to wait for the reply (default: as long as
+            the request takes)
+
+    Raises:
+        OSError: The server can't be reached or timed out (TimeoutError)
+        ServerError: The request failed on the server
+    """
+    request = json.dumps({"method": method, "params": params or {}, "index": index,
+                          "settings": settings})
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(str(socket_path))
+        sock.settimeout(reply_timeout)
+        sock.sendall(request.encode() + b"\n")
+        with sock.makefile("rb") as reader:
+            line = reader.readline()
+
+    if not line:
+        raise ServerError("connection closed without a reply")
+    response = json.loads(line)
+    if "error" in response:
+        raise ServerError(f"{response.get('type', 'Error')}: {response['error']}")
+    return response["result"]
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Answer JSON-lines requests until the client disconnects."""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                response = {"result": self.server.dispatch(json.loads(line))}
+            except Exception as e:
+                response = {"error": str(e), "type": type(e).__name__}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+class SessionServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server running the session API in-process."""
+
+    daemon_threads = True
+
+    # The unwrapped API functions, so requests never route back to the server
+    methods = {
+        name: getattr(core, name).__wrapped__
+        for name in ("search", "search_many", "meta", "read", "list_sessions")
+    }
+
+    def __init__(self, socket_path: Path, bind_and_activate: bool = True):
+        super().__init__(str(socket_path), _Handler, bind_and_activate)
+        # Client threads, one per call, only do the socket I/O. Requests run
+        # on a pool of long-lived workers, each keeping its SQLite
+        # connection (and page cache) for the server's life instead of
+        # each call opening one.
+        self.worker = ThreadPoolExecutor(max_workers=WORKERS,
+                                         thread_name_prefix="session-server")
+
+    def server_close(self):
+        super().server_close()
+        self.worker.shutdown(wait=False, cancel_futures=True)
+
+    def dispatch(self, request: dict):
+        method = request.get("method")
+        index = request.get("index")
+        if index is not None and index != str(core.DB_PATH):
+            raise ValueError(f"serving {core.DB_PATH}, not {index}")
+        settings = request.get("settings")
+        if settings is not None:
+            served = core._server_settings()
+            for name, value in settings.items():
+                if served.get(name) != value:
+                    raise ValueError(f"serving with {name} = {served.get(name)!r}, not {value!r}")
+
+        if method == "ping":
+            return {"pid": os.getpid(), "index": str(core.DB_PATH)}
+        if method == "shutdown":
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return True
+        if method not in self.methods:
+            raise ValueError(f"unknown method: {method}")
+
+        return self.worker.submit(self.methods[method], **request.get("params", {})).result()
+
+
+def _warm_up():
+    """Load the model, the embedding store and the worker's SQLite connection."""
+    core._get_embedder()
+    core._load_embeddings()
+    try:
+        core._db()
+    except FileNotFoundError:
+        pass  # not indexed yet
+
+
+def _terminate(signum, frame):
+    raise SystemExit(0)
+
+
+def serve(socket_path: Optional[Path] = None, verbose: bool = False) -> None:
+    """
+    Load the model and index, then serve requests until stopped.
+
+    Args:
+        socket_path: Socket to listen on (default: core.SERVER_SOCKET)
+        verbose: Print when the server is ready
+
+    Raises:
+        RuntimeError: A server is already listening on the socket
+    """
+    socket_path = Path(socket_path or core.SERVER_SOCKET)
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+
+    if socket_path.exists():
+        try:
+            call(socket_path, "ping", timeout=1.0, reply_timeout=1.0)
+        except (OSError, ValueError, ServerError):
+            socket_path.unlink()  # left behind by a server that died
+        else:
+            raise RuntimeError(f"A session server is already listening on {socket_path}")
+
+    # Warm up on the worker before creating the socket, so calls made
+    # meanwhile run in-process rather than wait
+    server = SessionServer(socket_path, bind_and_activate=False)
+    try:
+        server.worker.submit(_warm_up).result()
+        server.server_bind()
+        server.server_activate()
+    except BaseException:
+        server.server_close()
+        raise
+    os.chmod(socket_path, 0o600)
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, _terminate)
+    if verbose:
+        print(f"Serving {core.DB_PATH} on {socket_path}", flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        socket_path.unlink(missing_ok=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm session search server")
+    parser.add_argument("--socket", type=Path, help="Socket path (default: %(default)s)",
+                        default=core.SERVER_SOCKET)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--status", action="store_true", help="Report whether a server is running")
+    group.add_argument("--stop", action="store_true", help="Stop a running server")
+    args = parser.parse_args()
+
+    if args.status or args.stop:
+        try:
+            info = call(args.socket, "ping", timeout=5.0, reply_timeout=5.0)
+        except (OSError, ValueError, ServerError):
+            print("No session server running")
+            sys.exit(1)
+        if args.stop:
+            call(args.socket, "shutdown", timeout=5.0, reply_timeout=5.0)
+            print(f"Stopped session server (pid {info['pid']})")
+        else:
+            print(f"Session server running (pid {info['pid']}) for {info['index']}")
+        return
+
+    try:
+        serve(args.socket, verbose=True)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,724 @@
+"""
+On-disk embedding store for the session index.
+
+The matrix is a raw, contiguous float32, float16 or int8 array behind a
+fixed-size header, so readers can np.memmap it without unpickling or
+copying. int8 stores are scalar-quantized with a per-dimension scale that
+is kept between the header and the matrix.
+
+Everything else about a row lives in binary sidecars next to the matrix,
+which are memory-mapped the same way, so opening a store reads nothing but
+headers:
+- .ids: a fixed-size record per row with the session id's place in .str,
+  and the row's filter attributes (project and branch as dictionary codes,
+  start time as epoch seconds), so searches can restrict scoring to
+  matching rows without touching SQLite
+- .str: the session id strings, appended as rows are added
+- .idx: a hash of every row's session id with its row, sorted by hash, for
+  row lookups by binary search
+- .values: the text of each project and branch code, one per line
+
+Rows are stable slots. Updates overwrite a row in place, new sessions are
+appended into spare capacity, and deleted sessions leave a tombstone (an
+empty id) until compact() rewrites the store.
+"""
+
+import hashlib
+import os
+import struct
+from collections.abc import Sequence
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+HEADER_SIZE = 64
+DTYPES = {"float32": 1, "float16": 2, "int8": 3}
+
+# Per-row filter attributes, in tuple order
+ATTRIBUTES = ("project", "branch", "start_time")
+# Attributes stored as dictionary codes; the rest are timestamps
+CODED_ATTRIBUTES = ("project", "branch")
+
+_MAGIC = b"CCEMBED\x00"
+_VERSION = 1
+# magic, version, dtype code, dim, rows, capacity, store id
+_HEADER = struct.Struct("<8sHHIQQQ")
+_DTYPE_NAMES = {code: name for name, code in DTYPES.items()}
+_NO_ATTRIBUTES = (None,) * len(ATTRIBUTES)
+
+# Binary sidecars: magic, version, store id
+_SIDECAR_HEADER = struct.Struct("<8sHQ")
+_IDS_MAGIC = b"CCEMBIDS"
+_INDEX_MAGIC = b"CCEMBIDX"
+_STRINGS_MAGIC = b"CCEMBSTR"
+_SIDECAR_VERSION = 1
+
+# One .ids record per row: where its session id is in .str (length 0 for a
+# tombstone), and its filter attributes (code -1 / NaN when missing)
+_RECORD = np.dtype({"names": ["offset", "start_time", "length", "project", "branch"],
+                    "formats": ["<u8", "<f8", "<u4", "<i4", "<i4"]}, align=True)
+
+# Minimum number of rows added when an append outgrows the file
+_MIN_GROWTH = 1024
+
+# Rows converted to float32 at a time when scoring a float16 matrix
+_SCORE_BLOCK_ROWS = 65536
+
+
+def ids_path(path: Path) -> Path:
+    """Path of the per-row record sidecar for a store."""
+    return Path(path).with_suffix(".ids")
+
+
+def sidecar_paths(path: Path) -> tuple:
+    """Paths of all sidecars of a store."""
+    path = Path(path)
+    return (ids_path(path), path.with_suffix(".idx"), path.with_suffix(".str"),
+            path.with_suffix(".values"))
+
+
+def quantized_path(path: Path) -> Path:
+    """Path of the quantized mirror of a store."""
+    path = Path(path)
+    return path.with_name(f"{path.stem}-quantized{path.suffix}")
+
+
+def _data_offset(dtype: str, dim: int) -> int:
+    """Byte offset of the matrix: after the header and, for int8, the scale."""
+    if dtype != "int8":
+        return HEADER_SIZE
+    return HEADER_SIZE + -(-dim * 4 // HEADER_SIZE) * HEADER_SIZE
+
+
+def timestamp_seconds(value) -> float:
+    """Convert an ISO-8601 string or datetime to epoch seconds (naive = UTC)."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _seconds(value) -> float:
+    """Stored form of a timestamp attribute: epoch seconds, NaN when missing."""
+    if value is None:
+        return np.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return timestamp_seconds(value)
+    except ValueError:
+        return np.nan
+
+
+def _key(session_id: str) -> int:
+    """64-bit hash of a session id, as kept in .idx."""
+    return int.from_bytes(hashlib.blake2b(session_id.encode(), digest_size=8).digest(), "little")
+
+
+def _quantize(matrix, scale):
+    """Scalar-quantize float rows to int8 with a per-dimension scale."""
+    return np.clip(np.rint(np.asarray(matrix, dtype=np.float32) / scale),
+                   -127, 127).astype(np.int8)
+
+
+def _clean(value) -> str:
+    return str(value).replace("\t", " ").replace("\n", " ")
+
+
+def _normalized(attributes) -> tuple:
+    """Attribute tuple as stored: cleaned strings, start time as epoch seconds."""
+    attributes = tuple(attributes) + _NO_ATTRIBUTES[len(attributes):]
+    normalized = []
+    for attribute, value in zip(ATTRIBUTES, attributes):
+        if attribute in CODED_ATTRIBUTES:
+            normalized.append(None if value is None else _clean(value))
+        else:
+            seconds = _seconds(value)
+            normalized.append(None if np.isnan(seconds) else seconds)
+    return tuple(normalized)
+
+
+def _write_sidecar(path: Path, magic: bytes, store_id: int, *arrays) -> None:
+    """Write a binary sidecar: its header, then the arrays back to back."""
+    with open(path, "wb") as f:
+        f.write(_SIDECAR_HEADER.pack(magic, _SIDECAR_VERSION, store_id).ljust(HEADER_SIZE, b"\0"))
+        for array in arrays:
+            np.ascontiguousarray(array).tofile(f)
+
+
+def _check_sidecar(path: Path, magic: bytes, store_id: int) -> int:
+    """
+    Validate a binary sidecar's header.
+
+    Returns:
+        Size of the data after the header, in bytes
+    """
+    with open(path, "rb") as f:
+        header = f.read(HEADER_SIZE)
+        size = os.fstat(f.fileno()).st_size
+    if len(header) < HEADER_SIZE:
+        raise ValueError(f"Truncated embedding store sidecar: {path}")
+    found_magic, version, found_id = _SIDECAR_HEADER.unpack_from(header)
+    if found_magic != magic or version != _SIDECAR_VERSION:
+        raise ValueError(f"Not an embedding store sidecar: {path}")
+    if found_id != store_id:
+        raise ValueError(f"Sidecar does not belong to embedding store: {path}")
+    return size - HEADER_SIZE
+
+
+def _map_array(path: Path, dtype, count: int, offset: int = HEADER_SIZE,
+               writable: bool = False):
+    """Memory-map count items of a sidecar (mmap can't map zero bytes)."""
+    if not count:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r+" if writable else "r",
+                     offset=offset, shape=(count,))
+
+
+def _read_values(path: Path, store_id: int) -> dict:
+    """Read the code -> value lists of the dictionary-coded attributes."""
+    values = {attribute: [] for attribute in CODED_ATTRIBUTES}
+    with open(path, "r") as f:
+        if f.readline().strip() != f"{store_id:016x}":
+            raise ValueError(f"Sidecar does not belong to embedding store: {path}")
+        for line in f:
+            attribute, _, value = line.rstrip("\n").partition("\t")
+            values[attribute].append(value)
+    return values
+
+
+def _build_sidecars(session_ids, attributes, capacity: int) -> tuple:
+    """
+    Encode rows into sidecar arrays.
+
+    Returns:
+        (records, keys, key_rows, strings, values)
+    """
+    session_ids = list(session_ids)
+    rows = len(session_ids)
+    records = np.zeros(capacity, dtype=_RECORD)
+    records["project"] = records["branch"] = -1
+    records["start_time"] = np.nan
+
+    encoded = [b"" if session_id is None else session_id.encode() for session_id in session_ids]
+    lengths = np.fromiter(map(len, encoded), dtype=np.uint64, count=rows)
+    records["length"][:rows] = lengths
+    records["offset"][:rows] = np.cumsum(lengths) - lengths
+
+    # Encode column by column, each distinct value once
+    values = {attribute: [] for attribute in CODED_ATTRIBUTES}
+    columns = zip(*(tuple(attrs) + _NO_ATTRIBUTES[len(attrs):] for attrs in attributes or ()))
+    for attribute, column in zip(ATTRIBUTES, columns):
+        stored = {None: -1 if attribute in values else np.nan}
+        lookup = {}
+        for value in column:
+            if value in stored:
+                continue
+            if attribute not in values:
+                stored[value] = _seconds(value)
+                continue
+            cleaned = _clean(value)
+            if cleaned not in lookup:
+                lookup[cleaned] = len(values[attribute])
+                values[attribute].append(cleaned)
+            stored[value] = lookup[cleaned]
+        records[attribute][:rows] = [stored[value] for value in column]
+
+    live = [row for row, session_id in enumerate(session_ids) if session_id is not None]
+    keys = np.fromiter((_key(session_ids[row]) for row in live), dtype=np.uint64, count=len(live))
+    order = np.argsort(keys, kind="stable")
+    return (records, keys[order], np.asarray(live, dtype=np.uint64)[order],
+            np.frombuffer(b"".join(encoded), dtype=np.uint8), values)
+
+
+def _write_values(path: Path, store_id: int, values: dict) -> None:
+    with open(path, "w") as f:
+        f.write(f"{store_id:016x}\n")
+        f.writelines(f"{attribute}\t{value}\n"
+                     for attribute in CODED_ATTRIBUTES for value in values[attribute])
+
+
+def _tmp(path: Path) -> Path:
+    return path.with_name(path.name + ".tmp")
+
+
+def _write_sidecars(path: Path, store_id: int, sidecars: tuple) -> None:
+    """Write built sidecar arrays next to a store, replacing .ids last."""
+    records, keys, key_rows, strings, values = sidecars
+    records_path, index_path, strings_path, values_path = sidecar_paths(path)
+    _write_sidecar(_tmp(index_path), _INDEX_MAGIC, store_id, keys, key_rows)
+    _write_sidecar(_tmp(strings_path), _STRINGS_MAGIC, store_id, strings)
+    _write_values(_tmp(values_path), store_id, values)
+    _write_sidecar(_tmp(records_path), _IDS_MAGIC, store_id, records)
+    for sidecar in (index_path, strings_path, values_path, records_path):
+        os.replace(_tmp(sidecar), sidecar)
+
+
+class _SessionIds(Sequence):
+    """Session id of each row of a store, None for tombstones."""
+
+    def __init__(self, store: "EmbeddingStore"):
+        self._store = store
+
+    def __len__(self) -> int:
+        return self._store.rows
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(len(self))[row]]
+        return self._store._session_id(range(len(self))[row])
+
+
+class _Attributes(Sequence):
+    """Filter attribute tuple of each row of a store, start time as epoch seconds."""
+
+    def __init__(self, store: "EmbeddingStore"):
+        self._store = store
+
+    def __len__(self) -> int:
+        return self._store.rows
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(len(self))[row]]
+        return self._store._attributes(range(len(self))[row])
+
+
+class EmbeddingStore:
+    """A memory-mapped embedding matrix and the session id of each row."""
+
+    def __init__(self, path: Path, matrix, records, keys, key_rows, strings,
+                 values: dict, capacity: Optional[int] = None, store_id: int = 0,
+                 writable: bool = False, scale=None):
+        self.path = Path(path)
+        self.matrix = matrix
+        self.scale = scale
+        self.capacity = matrix.shape[0] if capacity is None else capacity
+        self.store_id = store_id
+        self.writable = writable
+        self.session_ids = _SessionIds(self)
+        self.attributes = _Attributes(self)
+        self._records = records
+        self._keys = keys
+        self._key_rows = key_rows
+        self._strings = strings
+        self._values = values
+        self._lookups = {attribute: {value: code for code, value in enumerate(values[attribute])}
+                         for attribute in CODED_ATTRIBUTES}
+        self._live = None
+
+    @property
+    def rows(self) -> int:
+        return self.matrix.shape[0]
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[1]
+
+    @property
+    def dtype(self) -> str:
+        return self.matrix.dtype.name
+
+    @property
+    def tombstones(self) -> int:
+        return self.rows - int(np.count_nonzero(self.live))
+
+    @property
+    def live(self):
+        """Boolean mask of rows that hold a session (not tombstoned)."""
+        if self._live is None:
+            self._live = self._records["length"][:self.rows] > 0
+        return self._live
+
+    def codes(self, attribute: str) -> tuple:
+        """
+        Dictionary codes of a string attribute.
+
+        Returns:
+            (codes, values): an int32 code per row, and the value of each
+            code. Rows without a value have code -1.
+        """
+        return self._records[attribute][:self.rows], self._values[attribute]
+
+    def timestamps(self, attribute: str = "start_time"):
+        """Epoch seconds per row for a timestamp attribute (NaN when missing)."""
+        return self._records[attribute][:self.rows]
+
+    def dot(self, vector, rows=None):
+        """
+        Inner product of rows with vector, as float32.
+
+        Quantized rows are scored without dequantizing the matrix: the scale
+        is folded into the query vector instead.
+
+        Args:
+            vector: Query vector, or a (queries, dim) matrix of query vectors
+                to score in one matrix product
+            rows: Optional row indices to score instead of the whole matrix
+
+        Returns:
+            Scores per row, or a (queries, rows) matrix for several queries
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        if self.scale is not None:
+            vector = vector * self.scale
+        operand = vector.T
+        if rows is not None:
+            return (self.matrix[rows].astype(np.float32, copy=False) @ operand).T
+        if self.matrix.dtype == np.float32:
+            return (self.matrix @ operand).T
+        scores = np.empty((self.rows,) + vector.shape[:-1], dtype=np.float32)
+        for start in range(0, self.rows, _SCORE_BLOCK_ROWS):
+            block = self.matrix[start:start + _SCORE_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ operand
+        return scores.T
+
+    def row_of(self, session_id: str) -> Optional[int]:
+        """Row holding a session's embedding, or None."""
+        return self.rows_of([session_id])[0]
+
+    def rows_of(self, session_ids: list) -> list:
+        """Row holding each session's embedding, or None; see row_of."""
+        if not session_ids:
+            return []
+        keys = np.fromiter(map(_key, session_ids), dtype=np.uint64, count=len(session_ids))
+        first = np.searchsorted(self._keys, keys, side="left").tolist()
+        last = np.searchsorted(self._keys, keys, side="right").tolist()
+        rows = []
+        for session_id, start, end in zip(session_ids, first, last):
+            # A session appended again after a delete has a later row
+            found = None
+            for row in self._key_rows[start:end].tolist():
+                if row < self.rows and self._session_id(row) == session_id:
+                    found = row if found is None else max(found, row)
+            rows.append(found)
+        return rows
+
+    def _session_id(self, row: int) -> Optional[str]:
+        record = self._records[row]
+        length = int(record["length"])
+        if not length:
+            return None
+        offset = int(record["offset"])
+        return self._strings[offset:offset + length].tobytes().decode()
+
+    def _attributes(self, row: int) -> tuple:
+        record = self._records[row]
+        attrs = []
+        for attribute in ATTRIBUTES:
+            value = record[attribute]
+            if attribute in self._values:
+                attrs.append(self._values[attribute][value] if value >= 0 else None)
+            else:
+                attrs.append(None if np.isnan(value) else float(value))
+        return tuple(attrs)
+
+    @classmethod
+    def open(cls, path: Path, writable: bool = False) -> Optional["EmbeddingStore"]:
+        """
+        Open a store, read-only unless writable is set.
+
+        Returns:
+            The store, or None if it doesn't exist
+
+        Raises:
+            ValueError: If the file is not a valid embedding store
+        """
+        path = Path(path)
+        try:
+            with open(path, "rb") as f:
+                header = f.read(HEADER_SIZE)
+        except FileNotFoundError:
+            return None
+
+        if len(header) < HEADER_SIZE:
+            raise ValueError(f"Truncated embedding store: {path}")
+        magic, version, dtype_code, dim, rows, capacity, store_id = _HEADER.unpack_from(header)
+        if magic != _MAGIC or version != _VERSION or dtype_code not in _DTYPE_NAMES:
+            raise ValueError(f"Not an embedding store: {path}")
+
+        dtype = _DTYPE_NAMES[dtype_code]
+        scale = None
+        if dtype == "int8":
+            scale = np.fromfile(path, dtype=np.float32, count=dim, offset=HEADER_SIZE)
+        if capacity:
+            matrix = np.memmap(path, dtype=dtype, mode="r+" if writable else "r",
+                               offset=_data_offset(dtype, dim), shape=(capacity, dim))[:rows]
+        else:
+            matrix = np.empty((0, dim), dtype=dtype)
+
+        records_path, index_path, strings_path, values_path = sidecar_paths(path)
+        size = _check_sidecar(records_path, _IDS_MAGIC, store_id)
+        if size < capacity * _RECORD.itemsize:
+            raise ValueError(f"Truncated embedding store sidecar: {records_path}")
+        records = _map_array(records_path, _RECORD, capacity, writable=writable)
+        entries = _check_sidecar(index_path, _INDEX_MAGIC, store_id) // 16
+        keys = _map_array(index_path, np.uint64, entries)
+        key_rows = _map_array(index_path, np.uint64, entries, HEADER_SIZE + entries * 8)
+        strings = _map_array(strings_path, np.uint8,
+                             _check_sidecar(strings_path, _STRINGS_MAGIC, store_id))
+        values = _read_values(values_path, store_id)
+        return cls(path, matrix, records, keys, key_rows, strings, values,
+                   capacity=capacity, store_id=store_id, writable=writable, scale=scale)
+
+    def upsert(self, session_ids: list, matrix,
+               attributes: Optional[list] = None) -> None:
+        """
+        Write embeddings for sessions in place.
+
+        Sessions that already have a row are overwritten; new sessions are
+        appended, growing the file when capacity runs out.
+
+        Args:
+            session_ids: Session id of each row of matrix
+            matrix: Embeddings to write
+            attributes: Optional filter attribute tuple per session
+        """
+        self._check_writable()
+        matrix = self._encode(matrix)
+
+        updated_rows, updated_source, appended = [], [], []
+        for i, row in enumerate(self.rows_of(session_ids)):
+            if row is None:
+                appended.append(i)
+            else:
+                updated_rows.append(row)
+                updated_source.append(i)
+
+        if updated_rows:
+            self.matrix[updated_rows] = matrix[updated_source]
+            if attributes is not None:
+                self._write_attributes(updated_rows, [attributes[i] for i in updated_source])
+
+        if appended:
+            start = self.rows
+            end = start + len(appended)
+            if end > self.capacity:
+                self._grow(max(end, self.capacity * 2, self.capacity + _MIN_GROWTH))
+            full = self._map(end)
+            full[start:end] = matrix[appended]
+            self._write_rows(range(start, end), [session_ids[i] for i in appended])
+            self._write_attributes(range(start, end),
+                                   [attributes[i] for i in appended] if attributes is not None
+                                   else [_NO_ATTRIBUTES] * len(appended))
+            self.matrix = full
+
+        self._flush()
+
+    def mirror(self, source: "EmbeddingStore", rows) -> None:
+        """
+        Copy rows from a store this one mirrors row for row.
+
+        Rows past the end of this store are always copied, so after upserts
+        and deletes on the source, passing the rows they touched brings the
+        mirror back in line.
+        """
+        self._check_writable()
+        rows = sorted(set(int(row) for row in rows) | set(range(self.rows, source.rows)))
+        if not rows:
+            return
+        end = max(self.rows, rows[-1] + 1)
+        if end > self.capacity:
+            self._grow(max(end, self.capacity * 2, self.capacity + _MIN_GROWTH))
+        if end > self.rows:
+            self.matrix = self._map(end)
+
+        self.matrix[rows] = self._encode(source.matrix[rows])
+        self._write_rows(rows, [source.session_ids[row] for row in rows])
+        self._write_attributes(rows, [source.attributes[row] for row in rows])
+        self._flush()
+
+    def set_attributes(self, session_ids: list, attributes: list) -> None:
+        """Update filter attributes of sessions that have a row, if changed."""
+        self._check_writable()
+        rows, values = [], []
+        for row, attrs in zip(self.rows_of(session_ids), attributes):
+            if row is not None and self._attributes(row) != _normalized(attrs):
+                rows.append(row)
+                values.append(attrs)
+        if rows:
+            self._write_attributes(rows, values)
+            self._flush()
+
+    def delete(self, session_ids: list) -> int:
+        """
+        Tombstone the rows of sessions.
+
+        Returns:
+            Number of rows tombstoned
+        """
+        self._check_writable()
+        rows = sorted(set(row for row in self.rows_of(session_ids) if row is not None))
+        if not rows:
+            return 0
+        self.matrix[rows] = 0
+        self._write_rows(rows, [None] * len(rows))
+        self._write_attributes(rows, [_NO_ATTRIBUTES] * len(rows))
+        self._flush()
+        return len(rows)
+
+    def compact(self, dtype: Optional[str] = None) -> "EmbeddingStore":
+        """
+        Rewrite the store without tombstoned rows.
+
+        Row numbers change, so the returned store replaces this one.
+        """
+        live = np.flatnonzero(self.live).tolist()
+        matrix = self.matrix[live]
+        if self.scale is not None:
+            matrix = matrix.astype(np.float32) * self.scale
+        return EmbeddingStore.create(self.path, matrix,
+                                     [self.session_ids[row] for row in live],
+                                     [self.attributes[row] for row in live],
+                                     dtype=dtype or self.dtype)
+
+    def _check_writable(self):
+        if not self.writable:
+            raise ValueError(f"Embedding store opened read-only: {self.path}")
+
+    def fits(self, matrix) -> bool:
+        """Whether matrix can be stored without clipping to the int8 scale."""
+        if self.scale is None:
+            return True
+        return bool(np.all(np.abs(matrix) <= self.scale * 127 * (1 + 1e-6)))
+
+    def _encode(self, matrix):
+        """Convert float embeddings to the storage dtype (quantizing int8)."""
+        if self.scale is None:
+            return np.asarray(matrix, dtype=self.matrix.dtype)
+        return _quantize(matrix, self.scale)
+
+    def _map(self, rows: int):
+        """Map the first rows rows of the file."""
+        return np.memmap(self.path, dtype=self.matrix.dtype, mode="r+",
+                         offset=_data_offset(self.dtype, self.dim),
+                         shape=(self.capacity, self.dim))[:rows]
+
+    def _grow(self, capacity: int):
+        """Extend the file and its .ids records to hold capacity rows."""
+        if isinstance(self.matrix, np.memmap):
+            self.matrix.flush()
+        with open(self.path, "r+b") as f:
+            f.truncate(_data_offset(self.dtype, self.dim)
+                       + capacity * self.dim * self.matrix.dtype.itemsize)
+        records_path = ids_path(self.path)
+        if isinstance(self._records, np.memmap):
+            self._records.flush()
+        with open(records_path, "r+b") as f:
+            f.truncate(HEADER_SIZE + capacity * _RECORD.itemsize)
+        self.capacity = capacity
+        self.matrix = self._map(self.rows)
+        self._records = _map_array(records_path, _RECORD, capacity, writable=True)
+
+    def _write_rows(self, rows, session_ids: list):
+        """Point rows at their session ids, storing ids new to a row."""
+        added_rows, added = [], []
+        for row, session_id in zip(rows, session_ids):
+            if session_id is None:
+                self._records["length"][row] = 0
+            elif row >= self.rows or self._session_id(row) != session_id:
+                added_rows.append(row)
+                added.append(session_id)
+        self._live = None
+        if not added:
+            return
+
+        _, index_path, strings_path, _ = sidecar_paths(self.path)
+        encoded = [session_id.encode() for session_id in added]
+        lengths = np.fromiter(map(len, encoded), dtype=np.uint64, count=len(encoded))
+        with open(strings_path, "ab") as f:
+            f.write(b"".join(encoded))
+        self._records["offset"][added_rows] = len(self._strings) + np.cumsum(lengths) - lengths
+        self._records["length"][added_rows] = lengths
+        self._strings = _map_array(strings_path, np.uint8,
+                                   len(self._strings) + int(lengths.sum()))
+
+        # Merge the new ids into the sorted index, and swap it in whole
+        keys = np.fromiter(map(_key, added), dtype=np.uint64, count=len(added))
+        order = np.argsort(keys, kind="stable")
+        at = np.searchsorted(self._keys, keys[order], side="right")
+        keys = np.insert(self._keys, at, keys[order])
+        key_rows = np.insert(self._key_rows, at, np.asarray(added_rows, dtype=np.uint64)[order])
+        _write_sidecar(_tmp(index_path), _INDEX_MAGIC, self.store_id, keys, key_rows)
+        os.replace(_tmp(index_path), index_path)
+        self._keys = _map_array(index_path, np.uint64, len(keys))
+        self._key_rows = _map_array(index_path, np.uint64, len(keys),
+                                    HEADER_SIZE + len(keys) * 8)
+
+    def _write_attributes(self, rows, attributes: list):
+        """Encode and store the filter attributes of rows."""
+        rows = list(rows)
+        columns = {attribute: [] for attribute in ATTRIBUTES}
+        new_values = []
+        for attrs in attributes:
+            for attribute, value in zip(ATTRIBUTES, _normalized(attrs)):
+                if attribute not in self._lookups:
+                    columns[attribute].append(np.nan if value is None else value)
+                elif value is None:
+                    columns[attribute].append(-1)
+                else:
+                    lookup = self._lookups[attribute]
+                    if value not in lookup:
+                        lookup[value] = len(self._values[attribute])
+                        self._values[attribute].append(value)
+                        new_values.append(f"{attribute}\t{value}\n")
+                    columns[attribute].append(lookup[value])
+        if new_values:
+            with open(sidecar_paths(self.path)[3], "a") as f:
+                f.writelines(new_values)
+        for attribute, column in columns.items():
+            self._records[attribute][rows] = column
+
+    def _flush(self):
+        """Flush row data, then publish the row count in the header."""
+        for array in (self.matrix, self._records):
+            if isinstance(array, np.memmap):
+                array.flush()
+        header = _HEADER.pack(_MAGIC, _VERSION, DTYPES[self.dtype], self.dim,
+                              self.rows, self.capacity, self.store_id)
+        with open(self.path, "r+b") as f:
+            f.write(header)
+
+    @classmethod
+    def create(cls, path: Path, matrix, session_ids: list,
+               attributes: Optional[list] = None,
+               dtype: str = "float32",
+               store_id: Optional[int] = None) -> "EmbeddingStore":
+        """
+        Write a new store, atomically replacing any existing one.
+
+        Args:
+            path: Store file path (the sidecars are written next to it)
+            matrix: 2-D array of embeddings, one row per session id
+            session_ids: Session id for each row
+            attributes: Optional filter attribute tuple for each row
+            dtype: Storage dtype, "float32", "float16" or "int8" (scalar
+                quantized with a per-dimension scale fitted to matrix)
+            store_id: Id to tag the store with (default: random). A mirror
+                shares the id of the store it mirrors.
+        """
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported embedding dtype: {dtype}")
+        path = Path(path)
+        matrix = np.asarray(matrix)
+        rows, dim = matrix.shape
+        if store_id is None:
+            store_id = int.from_bytes(os.urandom(8), "little")
+
+        with open(_tmp(path), "wb") as f:
+            header = _HEADER.pack(_MAGIC, _VERSION, DTYPES[dtype], dim, rows, rows, store_id)
+            f.write(header.ljust(HEADER_SIZE, b"\0"))
+            if dtype == "int8":
+                peak = np.abs(matrix).max(axis=0) if rows else np.ones(dim)
+                scale = (np.maximum(peak, 1e-8) / 127).astype(np.float32)
+                f.write(scale.tobytes().ljust(_data_offset(dtype, dim) - HEADER_SIZE, b"\0"))
+                _quantize(matrix, scale).tofile(f)
+            else:
+                np.ascontiguousarray(matrix, dtype=dtype).tofile(f)
+
+        _write_sidecars(path, store_id, _build_sidecars(session_ids, attributes, rows))
+        os.replace(_tmp(path), path)
+        return cls.open(path, writable=True)
@@ -0,0 +1,164 @@
+"""
+Timing of build_index and search.
+
+A Trace records how long each phase of a call took and counts what the
+call read or touched. build_index returns its trace in its stats; both
+operations pass theirs to core.TRACE_HOOK when one is set.
+
+With CC_DEV_SESSIONS_PROFILE set to a directory, each traced call is also
+profiled. It writes two files there:
+- a cProfile dump (<operation>-<time>-<pid>.prof), for pstats or snakeviz
+- its phases as a Chrome trace (<operation>-<time>-<pid>.json), which
+  chrome://tracing, Perfetto and speedscope show as a flame graph
+
+cProfile only sees the calling thread: parser processes and the encoder
+thread appear in the phases but not in the profile.
+"""
+
+import contextvars
+import cProfile
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional
+
+PROFILE_ENV = "CC_DEV_SESSIONS_PROFILE"
+
+_current = contextvars.ContextVar("trace", default=None)
+
+
+class Trace:
+    """Phase timings and counters of one operation."""
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self.started = time.perf_counter()
+        self.seconds = None
+        self.phases = {}
+        self.counters = {}
+        # (phase, start, end) of each timed block, for the Chrome trace
+        self.spans = []
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a block as (part of) a phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.phases[name] = self.phases.get(name, 0.0) + end - start
+            self.spans.append((name, start, end))
+
+    def iterate(self, name: str, iterable: Iterable) -> Iterator:
+        """Yield from an iterable, timing each wait for an item as the phase."""
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def add_time(self, name: str, seconds: float) -> None:
+        """Add time spent outside this thread (worker processes, the encoder) to a phase."""
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def timings(self) -> dict:
+        """Seconds per phase, and in total so far."""
+        total = self.seconds if self.seconds is not None else time.perf_counter() - self.started
+        return {**{name: round(seconds, 6) for name, seconds in self.phases.items()},
+                "total": round(total, 6)}
+
+    def as_dict(self) -> dict:
+        return {"operation": self.operation, "timings": self.timings(), **self.counters}
+
+    def chrome_trace(self) -> dict:
+        """The timed blocks in Chrome trace event format."""
+        pid = os.getpid()
+        events = [{"name": self.operation, "ph": "X", "pid": pid, "tid": 0, "ts": 0,
+                   "dur": round((self.seconds or 0.0) * 1e6), "args": self.counters}]
+        events.extend({"name": name, "ph": "X", "pid": pid, "tid": 0,
+                       "ts": round((start - self.started) * 1e6),
+                       "dur": round((end - start) * 1e6)}
+                      for name, start, end in self.spans)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def current() -> Optional[Trace]:
+    """Trace of the operation running in this context, if any."""
+    return _current.get()
+
+
+def count(name: str, n: int = 1) -> None:
+    """Add to a counter of the current trace, if any."""
+    trace = _current.get()
+    if trace is not None:
+        trace.count(name, n)
+
+
+@contextmanager
+def phase(name: str):
+    """Time a block as a phase of the current trace, if any."""
+    trace = _current.get()
+    if trace is None:
+        yield
+    else:
+        with trace.phase(name):
+            yield
+
+
+def profiling() -> bool:
+    return bool(os.environ.get(PROFILE_ENV))
+
+
+@contextmanager
+def traced(operation: str, hook: Optional[Callable[[dict], None]] = None):
+    """
+    Trace an operation, and profile it when CC_DEV_SESSIONS_PROFILE is set.
+
+    Calls nested in a traced operation add to its trace.
+
+    Args:
+        operation: Name of the operation
+        hook: Called with Trace.as_dict() once the operation succeeds
+    """
+    outer = _current.get()
+    if outer is not None:
+        yield outer
+        return
+
+    trace = Trace(operation)
+    token = _current.set(trace)
+    profile_dir = os.environ.get(PROFILE_ENV)
+    profiler = None
+    if profile_dir:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        yield trace
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        trace.seconds = time.perf_counter() - trace.started
+        _current.reset(token)
+        if profiler is not None:
+            _dump(Path(profile_dir), trace, profiler)
+
+    if hook is not None:
+        hook(trace.as_dict())
+
+
+def _dump(directory: Path, trace: Trace, profiler: cProfile.Profile) -> None:
+    directory.mkdir(parents=True, exist_ok=True)
+    stem = f"{trace.operation}-{datetime.now():%Y%m%dT%H%M%S%f}-{os.getpid()}"
+    profiler.dump_stats(directory / f"{stem}.prof")
+    with open(directory / f"{stem}.json", "w") as f:
+        json.dump(trace.chrome_trace(), f)
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Index watcher.
+
+Keeps the index seconds behind live sessions instead of waiting for the
+next sync. Session files under PROJECTS_DIR are watched with inotify on
+Linux, or by polling their stat data elsewhere. Changes are debounced:
+once files stop changing for a moment (or a busy session has kept changing
+for a while) the changed files are indexed in one incremental build_index
+call, which parses only their appended lines and embeds them in one batch.
+
+Usage:
+    python -m cc_dev.sessions.watch              # watch until interrupted
+    python -m cc_dev.sessions.watch --poll 2     # force stat polling
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import os
+import select
+import signal
+import sqlite3
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from cc_dev.sessions import core
+
+# Seconds without further changes before changed files are indexed
+DEBOUNCE_SECONDS = 2.0
+
+# Seconds a continuously changing file waits at most before it is indexed
+MAX_DELAY_SECONDS = 15.0
+
+# Seconds between scans of the polling watcher
+POLL_INTERVAL = 1.0
+
+# inotify(7) event masks
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_EVENT = struct.Struct("iIII")
+
+_FILE_EVENTS = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+_DIR_EVENTS = _IN_CREATE | _IN_MOVED_TO
+
+
+def _session_files(root: Path) -> list:
+    return list(root.glob("*/*.jsonl"))
+
+
+class PollingWatcher:
+    """Detects changed session files by comparing their stat data."""
+
+    def __init__(self, root: Path, interval: float = POLL_INTERVAL):
+        self.root = root
+        self.interval = interval
+        self._stats = self._scan()
+        self._next_scan = time.monotonic() + interval
+
+    def _scan(self) -> dict:
+        stats = {}
+        try:
+            projects = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return stats
+        for project in projects:
+            if not project.is_dir():
+                continue
+            try:
+                entries = list(os.scandir(project.path))
+            except OSError:
+                continue
+            for entry in entries:
+                if not entry.name.endswith(".jsonl"):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                stats[entry.path] = (st.st_size, st.st_mtime_ns, st.st_ino)
+        return stats
+
+    def changes(self, timeout: float) -> set:
+        """Session files created or changed since the last call, waiting up to timeout."""
+        wait = self._next_scan - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return set()
+        if wait > 0:
+            time.sleep(wait)
+        self._next_scan = time.monotonic() + self.interval
+
+        stats = self._scan()
+        changed = {Path(path) for path, stat in stats.items() if self._stats.get(path) != stat}
+        self._stats = stats
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Detects changed session files from inotify events (Linux only)."""
+
+    def __init__(self, root: Path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self._libc = libc
+        self.root = root
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs = {}
+        # Files in directories that appeared between two reads of events
+        self._found = set()
+        try:
+            self._add(root, _DIR_EVENTS)
+            for project in root.iterdir():
+                if project.is_dir():
+                    self._add(project, _FILE_EVENTS)
+        except OSError:
+            self.close()
+            raise
+
+    def _add(self, path: Path, mask: int):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_add_watch {path}: {os.strerror(errno)}")
+        self._dirs[wd] = path
+
+    def changes(self, timeout: float) -> set:
+        """Session files created or changed since the last call, waiting up to timeout."""
+        changed, self._found = self._found, set()
+        if not changed:
+            readable, _, _ = select.select([self._fd], [], [], timeout)
+            if not readable:
+                return changed
+
+        while True:
+            try:
+                data = os.read(self._fd, 1 << 16)
+            except BlockingIOError:
+                return changed
+            position = 0
+            while position < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, position)
+                name = data[position + _EVENT.size:position + _EVENT.size + length].rstrip(b"\0")
+                position += _EVENT.size + length
+
+                if mask & _IN_Q_OVERFLOW:
+                    # Events were dropped; treat every session as changed
+                    changed.update(_session_files(self.root))
+                    continue
+                directory = self._dirs.get(wd)
+                if directory is None or mask & _IN_IGNORED:
+                    self._dirs.pop(wd, None)
+                    continue
+                path = directory / os.fsdecode(name)
+                if directory == self.root:
+                    if mask & _IN_ISDIR:
+                        # A new project: watch it, and pick up files written
+                        # before the watch was in place
+                        self._add(path, _FILE_EVENTS)
+                        self._found.update(path.glob("*.jsonl"))
+                elif path.suffix == ".jsonl":
+                    changed.add(path)
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def _watcher(poll: Optional[float]):
+    """inotify watcher if available, else (or when poll is set) a polling one."""
+    if poll is None and sys.platform.startswith("linux") and core.PROJECTS_DIR.is_dir():
+        try:
+            return InotifyWatcher(core.PROJECTS_DIR)
+        except OSError:
+            pass  # e.g. out of inotify watches; polling still works
+    return PollingWatcher(core.PROJECTS_DIR, poll or POLL_INTERVAL)
+
+
+def watch(debounce: float = DEBOUNCE_SECONDS, max_delay: float = MAX_DELAY_SECONDS,
+          poll: Optional[float] = None, verbose: bool = False,
+          stop: Optional[threading.Event] = None) -> None:
+    """
+    Keep the index in sync with session files until stopped.
+
+    Runs one full sync first, then indexes changed files as they settle.
+
+    Args:
+        debounce: Seconds without further changes before indexing
+        max_delay: Seconds a continuously changing file waits at most
+        poll: Poll stat data at this interval instead of using inotify
+        verbose: Print a line per incremental sync
+        stop: Event that ends the loop when set (default: run until
+            interrupted)
+    """
+    stop = stop or threading.Event()
+    watcher = _watcher(poll)
+    try:
+        stats = core.build_index()
+        if verbose:
+            print(f"Watching {core.PROJECTS_DIR} ({type(watcher).__name__}); "
+                  f"initial sync indexed {stats['indexed']}", flush=True)
+
+        pending = set()
+        first_change = last_change = None
+        while not stop.is_set():
+            timeout = 1.0
+            if pending:
+                now = time.monotonic()
+                timeout = max(0.0, min(timeout, last_change + debounce - now,
+                                       first_change + max_delay - now))
+            changed = watcher.changes(timeout)
+
+            now = time.monotonic()
+            if changed:
+                pending |= changed
+                last_change = now
+                if first_change is None:
+                    first_change = now
+            if not pending or (now - last_change < debounce and now - first_change < max_delay):
+                continue
+
+            try:
+                stats = core.build_index(paths=sorted(pending))
+            except sqlite3.OperationalError as e:
+                # Another sync holds the database; retry after the next wait
+                if verbose:
+                    print(f"Sync deferred: {e}", flush=True)
+                first_change = last_change = now
+                continue
+            if verbose:
+                print(f"Synced {len(pending)} changed files: indexed {stats['indexed']} "
+                      f"({stats['appended']} appended)", flush=True)
+            pending.clear()
+            first_change = last_change = None
+    finally:
+        watcher.close()
+
+
+def _terminate(signum, frame):
+    raise SystemExit(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep the session index in sync")
+    parser.add_argument("--debounce", type=float, default=DEBOUNCE_SECONDS,
+                        help="Seconds without changes before indexing (default: %(default)s)")
+    parser.add_argument("--max-delay", type=float, default=MAX_DELAY_SECONDS,
+                        help="Longest wait for a busy session (default: %(default)s)")
+    parser.add_argument("--poll", type=float, metavar="SECONDS",
+                        help="Poll file stats at this interval instead of using inotify")
+    parser.add_argument("--quiet", action="store_true", help="Don't print syncs")
+    args = parser.parse_args()
+
+    signal.signal(signal.SIGTERM, _terminate)
+    try:
+        watch(args.debounce, args.max_delay, args.poll, verbose=not args.quiet)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
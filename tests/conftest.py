@@ -93,7 +93,12 @@ def temp_claude_dir(tmp_path, monkeypatch):
     monkeypatch.setattr(core, "PROJECTS_DIR", projects_dir)
     monkeypatch.setattr(core, "INDEX_DIR", index_dir)
     monkeypatch.setattr(core, "DB_PATH", index_dir / "sessions.db")
-    monkeypatch.setattr(core, "EMBEDDINGS_PATH", index_dir / "embeddings.npy")
+    monkeypatch.setattr(core, "EMBEDDINGS_PATH", index_dir / "embeddings.bin")
+    monkeypatch.setattr(core, "SERVER_SOCKET", index_dir / "server.sock")
+    monkeypatch.setattr(core, "QUERY_CACHE_PATH", index_dir / "query_cache.db")
+    monkeypatch.setattr(core, "CHUNKS_PATH", index_dir / "chunks.bin")
+    # Model-free embeddings, so the tests need no model download
+    monkeypatch.setattr(core, "EMBEDDING_BACKEND", "hashing")
 
     return {
         "claude_dir": claude_dir,
@@ -112,6 +117,48 @@ def indexed_sessions(temp_claude_dir):
     return {**temp_claude_dir, "stats": stats}
 
 
+TOPICS = [
+    "Postgres migration deadlock on the orders table",
+    "React hook stuck in a rerender loop",
+    "Kubernetes pods evicted under memory pressure",
+    "Rust borrow checker rejects struct lifetimes",
+    "CSS grid layout overflows on mobile",
+    "Terraform state lock left behind by a crashed run",
+    "Flaky pytest fixture leaking temp files",
+    "Webpack bundle size doubled after upgrade",
+    "Redis cache stampede at midnight",
+    "Git rebase conflict in generated lockfile",
+    "Slow Pandas groupby on a wide dataframe",
+    "Nginx returns 502 behind the load balancer",
+]
+
+
+@pytest.fixture
+def topic_sessions(indexed_sessions):
+    """Index a dozen more sessions, each about one of TOPICS."""
+    from cc_dev.sessions import core
+    project_dir = indexed_sessions["projects_dir"] / "-test-topics"
+    project_dir.mkdir()
+    start = datetime(2026, 1, 6, 9, 0, 0)
+    for i, topic in enumerate(TOPICS):
+        messages = [
+            {"type": "summary", "summary": topic},
+            {
+                "type": "user",
+                "message": {"role": "user", "content": f"Help me with this: {topic.lower()}"},
+                "timestamp": (start + timedelta(hours=i)).isoformat() + "Z",
+                "cwd": "/test/topics",
+                "gitBranch": "main"
+            },
+        ]
+        with open(project_dir / f"topic-session-{i:03d}.jsonl", "w") as f:
+            for msg in messages:
+                f.write(json.dumps(msg) + "\n")
+
+    stats = core.build_index()
+    return {**indexed_sessions, "topics": TOPICS, "stats": stats}
+
+
 def pytest_markdown_docs_globals():
     """Provide globals available to all markdown code blocks."""
     # Import lazily to avoid issues when package isn't installed
@@ -120,8 +167,10 @@ def pytest_markdown_docs_globals():
         return {
             "sessions": sessions,
             "search": sessions.search,
+            "search_many": sessions.search_many,
             "meta": sessions.meta,
             "read": sessions.read,
+            "iter_messages": sessions.iter_messages,
             "list_sessions": sessions.list_sessions,
             "sync": sessions.sync,
         }
@@ -0,0 +1,46 @@
+"""Tests of the background encoding stage of build_index."""
+
+import threading
+
+import numpy as np
+import pytest
+
+from cc_dev.sessions import core
+from cc_dev.sessions.encode import EncodePipeline
+
+
+def _lengths(texts):
+    return np.array([[len(text)] for text in texts])
+
+
+def test_pipeline_keeps_last_text_of_each_key():
+    pipeline = EncodePipeline(_lengths, window=2)
+    pipeline.submit([("a", "x"), ("b", "yy"), ("c", "zzz")])
+    pipeline.submit([("a", "wwww")])
+    keys, embeddings = pipeline.finish()
+    assert keys == ["b", "c", "a"]
+    assert embeddings.tolist() == [[2], [3], [4]]
+    assert pipeline.texts == 4
+
+
+def test_close_stops_encoder_thread():
+    pipeline = EncodePipeline(_lengths)
+    pipeline.submit([("a", "x")])
+    pipeline.close()
+    assert not pipeline._thread.is_alive()
+    pipeline.close()
+
+
+def _encoder_threads():
+    return sum(thread.name == "encode" for thread in threading.enumerate())
+
+
+def test_failed_sync_stops_encoder_thread(indexed_sessions, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(core, "_write_sessions", fail)
+    before = _encoder_threads()
+    with pytest.raises(RuntimeError):
+        core.build_index(force=True)
+    assert _encoder_threads() == before
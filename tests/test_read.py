@@ -0,0 +1,111 @@
+"""Tests of positional reads through the message index and the message store."""
+
+import json
+import sqlite3
+
+import pytest
+
+from cc_dev.sessions import core, iter_messages, read
+
+
+def check_reads(session_id):
+    """Check positional reads against a full read, and return the full read."""
+    full = list(iter_messages(session_id))
+    assert read(session_id) == full
+    assert read(session_id, first=3) == full[:3]
+    assert read(session_id, last=2) == full[-2:]
+    assert read(session_id, offset=2, limit=3) == full[2:5]
+    assert read(session_id, types=["user"], last=1) == [m for m in full if m["type"] == "user"][-1:]
+    return full
+
+
+def append_message(path, content):
+    with open(path, "a") as f:
+        f.write(json.dumps({"type": "user", "message": {"role": "user", "content": content},
+                            "timestamp": "2026-01-05T10:09:00Z"}) + "\n")
+
+
+def forget_message_index(keep_rows: bool = False):
+    """Make the index look like one built before the message index existed."""
+    conn = sqlite3.connect(core.DB_PATH)
+    if not keep_rows:
+        conn.execute("DELETE FROM message_index")
+    conn.execute("UPDATE sessions SET parsed_offset = NULL, parsed_digest = NULL, "
+                 "extracted_messages = NULL")
+    conn.commit()
+    conn.close()
+
+
+def count_full_scans(monkeypatch) -> list:
+    """Record reads that decode the session file from its start."""
+    scans = []
+    extract = core._extract_messages
+
+    def counted(file_path, *args, start=0, **kwargs):
+        if start == 0:
+            scans.append(file_path)
+        return extract(file_path, *args, start=start, **kwargs)
+
+    monkeypatch.setattr(core, "_extract_messages", counted)
+    return scans
+
+
+def test_indexed_reads(indexed_sessions, monkeypatch):
+    session_id, path = indexed_sessions["session_id"], indexed_sessions["session_file"]
+    scans = count_full_scans(monkeypatch)
+    check_reads(session_id)
+    append_message(path, "One more thing")
+    assert check_reads(session_id)[-1]["content"] == "One more thing"
+    assert scans == []
+
+
+def test_backfilled_message_index_serves_reads(indexed_sessions, monkeypatch):
+    session_id, path = indexed_sessions["session_id"], indexed_sessions["session_file"]
+    forget_message_index()
+    assert core.build_index()["messages_indexed"] == 1
+
+    scans = count_full_scans(monkeypatch)
+    check_reads(session_id)
+    assert scans == []
+
+    # Appends are parsed from where the backfill stopped
+    users = core.meta(session_id)["message_counts"]["user"]
+    append_message(path, "One more thing")
+    assert core.build_index()["appended"] == 1
+    assert core.meta(session_id)["message_counts"]["user"] == users + 1
+    assert check_reads(session_id)[-1]["content"] == "One more thing"
+    assert scans == []
+
+
+def test_stored_reads(indexed_sessions, monkeypatch):
+    session_id, path = indexed_sessions["session_id"], indexed_sessions["session_file"]
+    monkeypatch.setattr(core, "MESSAGE_STORE", True)
+    assert core.build_index()["messages_stored"] == 1
+    check_reads(session_id)
+    append_message(path, "One more thing")
+    assert check_reads(session_id)[-1]["content"] == "One more thing"
+
+
+@pytest.mark.parametrize("keep_rows", [False, True])
+def test_backfilled_message_store_serves_moved_files(indexed_sessions, monkeypatch, keep_rows):
+    session_id, path = indexed_sessions["session_id"], indexed_sessions["session_file"]
+    full = check_reads(session_id)
+    forget_message_index(keep_rows)
+    monkeypatch.setattr(core, "MESSAGE_STORE", True)
+    assert core.build_index()["messages_stored"] == 1
+
+    path.rename(path.with_suffix(".jsonl.bak"))
+    assert read(session_id) == full
+    assert read(session_id, last=2) == full[-2:]
+
+
+def test_stored_reads_take_search_offsets(indexed_sessions, monkeypatch):
+    """read() takes the offset of keyword hits (None) and chunk hits from the store too."""
+    monkeypatch.setattr(core, "CHUNK_EMBEDDINGS", True)
+    monkeypatch.setattr(core, "MESSAGE_STORE", True)
+    core.build_index()
+    for hit in (core.search("JWT token validation", limit=1)[0],
+                core.search("expiry", mode="keyword", limit=1)[0]):
+        from_file = core._extract_messages(str(indexed_sessions["session_file"]),
+                                           offset=hit["offset"] or 0, limit=10)
+        assert read(hit["session_id"], offset=hit["offset"], limit=10) == from_file
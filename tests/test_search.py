@@ -0,0 +1,85 @@
+"""Tests of search ranking against full rebuilds and exact scoring."""
+
+import json
+
+from cc_dev.sessions import core
+
+
+def _keyword_scores(query):
+    return {hit["session_id"]: hit["score"] for hit in core.search(query, mode="keyword", limit=50)}
+
+
+def test_keyword_scores_match_full_rebuild(topic_sessions, monkeypatch):
+    """A session synced line by line scores as one written at once."""
+    monkeypatch.setattr(core, "QUERY_CACHE_SIZE", 0)
+    project_dir = topic_sessions["projects_dir"] / "-test-keyword"
+    project_dir.mkdir()
+    lines = [json.dumps({"type": "user", "message": {"role": "user", "content": text},
+                         "timestamp": f"2026-01-07T10:0{i}:00Z"})
+             for i, text in enumerate(["Redis evicts keys early", "Check maxmemory policy",
+                                       "Redis eviction fixed by raising maxmemory"])]
+    (project_dir / "whole.jsonl").write_text("\n".join(lines) + "\n")
+    core.build_index()
+    for line in lines:
+        with open(project_dir / "appended.jsonl", "a") as f:
+            f.write(line + "\n")
+        core.build_index()
+
+    query = "redis maxmemory eviction"
+    incremental = _keyword_scores(query)
+    assert incremental["appended"] == incremental["whole"]
+    core.build_index(force=True)
+    assert _keyword_scores(query) == incremental
+
+
+def _traces(monkeypatch) -> list:
+    traces = []
+    monkeypatch.setattr(core, "TRACE_HOOK", traces.append)
+    return traces
+
+
+def test_ann_index_is_opt_in(topic_sessions, monkeypatch):
+    monkeypatch.setattr(core, "ANN_MIN_ROWS", 10)
+    assert "ann" not in core.build_index()
+    monkeypatch.setattr(core, "ANN_INDEX", True)
+    assert core.build_index()["ann"] == "trained"
+
+
+def test_approximate_search_probes_part_of_the_index(topic_sessions, monkeypatch):
+    monkeypatch.setattr(core, "QUERY_CACHE_SIZE", 0)
+    monkeypatch.setattr(core, "ANN_INDEX", True)
+    monkeypatch.setattr(core, "ANN_MIN_ROWS", 10)
+    core.build_index()
+    traces = _traces(monkeypatch)
+    for topic in topic_sessions["topics"]:
+        approximate = core.search(topic, limit=1, nprobe=1)
+        exact = core.search(topic, limit=1, exact=True)
+        assert approximate == exact
+        approximate_trace, exact_trace = traces[-2:]
+        assert approximate_trace["rows_scored"] < exact_trace["rows_scored"]
+
+
+def test_quantized_search_returns_exact_scores(topic_sessions, monkeypatch):
+    for quantization in ("int8", "float16"):
+        monkeypatch.setattr(core, "EMBEDDING_QUANTIZATION", quantization)
+        assert core.build_index()["quantized"] == quantization
+        for topic in topic_sessions["topics"]:
+            approximate = core.search(topic, limit=3)
+            exact = core.search(topic, limit=3, exact=True)
+            assert approximate[0] == exact[0]
+            assert [r["score"] for r in approximate] == [r["score"] for r in exact]
+
+
+def test_sync_invalidates_cached_results(indexed_sessions):
+    session_id, path = indexed_sessions["session_id"], indexed_sessions["session_file"]
+    query = "rotate signing keys"
+    assert core.search(query, mode="keyword") == []
+    before = core.search(query)[0]["score"]
+
+    with open(path, "a") as f:
+        f.write(json.dumps({"type": "user", "message": {"role": "user", "content": "Now rotate the signing keys"},
+                            "timestamp": "2026-01-05T10:09:00Z"}) + "\n")
+        f.write(json.dumps({"type": "summary", "summary": "Rotate the signing keys"}) + "\n")
+    core.build_index()
+    assert core.search(query, mode="keyword")[0]["session_id"] == session_id
+    assert core.search(query)[0]["score"] > before
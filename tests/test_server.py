@@ -0,0 +1,103 @@
+"""Tests of routing API calls to the warm session server."""
+
+import threading
+import time
+
+import pytest
+
+from cc_dev.sessions import core, server
+
+
+@pytest.fixture
+def running_server(indexed_sessions, monkeypatch):
+    """Serve the test index on a thread, recording the calls it answers."""
+    served = []
+
+    def recorded(name, method):
+        def run(**params):
+            served.append(name)
+            return method(**params)
+        return run
+
+    for name, method in list(server.SessionServer.methods.items()):
+        monkeypatch.setitem(server.SessionServer.methods, name, recorded(name, method))
+
+    thread = threading.Thread(target=server.serve, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            server.call(core.SERVER_SOCKET, "ping", timeout=1.0, reply_timeout=1.0)
+            break
+        except (OSError, server.ServerError):
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.01)
+
+    socket_path = core.SERVER_SOCKET
+    yield {**indexed_sessions, "served": served}
+    server.call(socket_path, "shutdown", timeout=1.0, reply_timeout=1.0)
+    thread.join(timeout=10)
+
+
+def test_calls_route_to_server(running_server):
+    session_id = running_server["session_id"]
+    info = core.meta(session_id)
+    hits = core.search("JWT token validation")
+    assert running_server["served"] == ["meta", "search"]
+    assert info == core.meta.__wrapped__(session_id)
+    assert hits[0]["session_id"] == session_id
+
+
+def test_other_settings_run_in_process(running_server, monkeypatch):
+    settings = {**core._server_settings(), "QUERY_CACHE_SIZE": 0}
+    with pytest.raises(server.ServerError, match="QUERY_CACHE_SIZE"):
+        server.call(core.SERVER_SOCKET, "list_sessions", settings=settings)
+
+    # The server shares this process's settings, so differ in this thread only
+    caller = threading.current_thread()
+    served_settings = core._server_settings
+    monkeypatch.setattr(core, "_server_settings", lambda: (
+        settings if threading.current_thread() is caller else served_settings()))
+    assert core.search("JWT token validation")
+    assert running_server["served"] == []
+
+
+def test_unreachable_server_runs_in_process(running_server, monkeypatch):
+    monkeypatch.setattr(core, "SERVER_SOCKET", core.SERVER_SOCKET.with_name("stale.sock"))
+    core.SERVER_SOCKET.touch()
+    assert core.meta(running_server["session_id"]) is not None
+    assert running_server["served"] == []
+
+
+
+def _slow_search_many(monkeypatch, seconds):
+    search_many = server.SessionServer.methods["search_many"]
+
+    def slow(**params):
+        time.sleep(seconds)
+        return search_many(**params)
+
+    monkeypatch.setitem(server.SessionServer.methods, "search_many", slow)
+
+
+def test_calls_longer_than_timeout_complete(running_server, monkeypatch):
+    monkeypatch.setattr(core, "SERVER_TIMEOUT", 0.2)
+    _slow_search_many(monkeypatch, 0.5)
+    batches = core.search_many(["JWT token"])
+    assert batches[0][0]["session_id"] == running_server["session_id"]
+    assert running_server["served"] == ["search_many"]
+
+
+def test_slow_calls_dont_hold_up_others(running_server, monkeypatch):
+    _slow_search_many(monkeypatch, 1.0)
+    batches = []
+    thread = threading.Thread(target=lambda: batches.append(core.search_many(["JWT token"])))
+    thread.start()
+    time.sleep(0.1)
+
+    start = time.monotonic()
+    assert core.meta(running_server["session_id"]) is not None
+    assert time.monotonic() - start < 0.5
+    thread.join()
+    assert batches and sorted(running_server["served"]) == ["meta", "search_many"]
@@ -0,0 +1,49 @@
+"""Tests of in-place updates of the embedding store."""
+
+import shutil
+
+import pytest
+
+from cc_dev.sessions import core, embedders
+from cc_dev.sessions.store import EmbeddingStore
+
+
+def test_upserts_tombstones_and_compaction(indexed_sessions, monkeypatch):
+    monkeypatch.setattr(core, "QUERY_CACHE_SIZE", 0)
+    original = indexed_sessions["session_file"]
+    copy = original.with_name("test-session-002.jsonl")
+    shutil.copy(original, copy)
+    core.build_index()
+    rows = EmbeddingStore.open(core.EMBEDDINGS_PATH).rows
+
+    # A new summary changes the embedding text: its row is overwritten in place
+    with open(copy, "a") as f:
+        f.write('{"type": "summary", "summary": "Rotate the JWT signing keys"}\n')
+    stats = core.build_index()
+    assert stats["appended"] == 1 and stats["embeddings_generated"] == 1
+    assert EmbeddingStore.open(core.EMBEDDINGS_PATH).rows == rows
+
+    # A deleted session leaves a tombstone until enough of them pile up
+    monkeypatch.setattr(core, "COMPACT_TOMBSTONE_RATIO", 1.0)
+    copy.unlink()
+    assert core.build_index()["deleted"] == 1
+    assert EmbeddingStore.open(core.EMBEDDINGS_PATH).tombstones == 1
+    before = core.search("JWT token validation")
+    assert [r["session_id"] for r in before] == [indexed_sessions["session_id"]]
+
+    monkeypatch.setattr(core, "COMPACT_TOMBSTONE_RATIO", 0.25)
+    assert core.build_index()["embeddings_compacted"]
+    assert EmbeddingStore.open(core.EMBEDDINGS_PATH).tombstones == 0
+    assert core.search("JWT token validation") == before
+
+
+def test_switching_embedders_reembeds(indexed_sessions, monkeypatch):
+    """Vectors of another embedder are refused until the next sync replaces them."""
+    assert core.EMBEDDING_BACKEND == "hashing"
+    monkeypatch.setattr(embedders, "HASHING_DIM", 256)
+    with pytest.raises(ValueError):
+        core.search("JWT token")
+
+    stats = core.build_index()
+    assert stats["embeddings_generated"] == len(core.list_sessions())
+    assert core.search("JWT token")[0]["session_id"] == indexed_sessions["session_id"]
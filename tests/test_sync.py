@@ -0,0 +1,104 @@
+"""Tests of incremental syncs against full rebuilds."""
+
+import functools
+import json
+import multiprocessing
+import shutil
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+from cc_dev.sessions import core
+
+
+def test_repeated_sync_reads_nothing(indexed_sessions):
+    for _ in range(2):
+        stats = core.build_index()
+        assert stats["indexed"] == 0 and stats["skipped"] == stats["total"]
+        assert "embeddings_generated" not in stats and stats["bytes_read"] == 0
+
+
+def test_appended_lines_index_as_full_rebuild(indexed_sessions):
+    """Appends index the same as a rebuild, even while the last line is being written."""
+    session_id, path = indexed_sessions["session_id"], indexed_sessions["session_file"]
+    question = {"type": "user", "message": {"role": "user", "content": "Should the refresh token expire too?"},
+                "timestamp": "2026-01-05T10:07:00Z", "cwd": "/test/project", "gitBranch": "main"}
+    answer = json.dumps({"type": "assistant", "message": {"role": "assistant", "content": [
+        {"type": "text", "text": "Yes, a week after it is issued."}]}})
+
+    def indexed():
+        return core.meta(session_id), core.read(session_id)
+
+    # The answer is still being written
+    with open(path, "a") as f:
+        f.write(json.dumps(question) + "\n" + answer[:30])
+    assert core.build_index()["appended"] == 1
+    appended = indexed()
+    assert appended[1][-1]["content"] == question["message"]["content"]
+    core.build_index(force=True)
+    assert indexed() == appended
+
+    with open(path, "a") as f:
+        f.write(answer[30:] + "\n")
+    assert core.build_index()["appended"] == 1
+    appended = indexed()
+    assert appended[1][-1]["content"] == "Yes, a week after it is issued."
+    core.build_index(force=True)
+    assert indexed() == appended
+
+
+def test_spawned_parsers_use_callers_settings(indexed_sessions, monkeypatch):
+    """Parser processes that re-import core still hash with the caller's settings."""
+    spawn = multiprocessing.get_context("spawn")
+    monkeypatch.setattr(core, "ProcessPoolExecutor",
+                        functools.partial(ProcessPoolExecutor, mp_context=spawn))
+    monkeypatch.setattr(core, "_PARALLEL_MIN_FILES", 1)
+    monkeypatch.setattr(core, "HASH_SAMPLE_BYTES", 16)
+    original = indexed_sessions["session_file"]
+    shutil.copy(original, original.with_name("test-session-002.jsonl"))
+
+    core.build_index(force=True, sampled_hash=True, workers=2)
+
+    conn = sqlite3.connect(core.DB_PATH)
+    rows = conn.execute("SELECT file_path, file_hash FROM sessions").fetchall()
+    conn.close()
+    assert len(rows) == 2
+    for file_path, file_hash in rows:
+        assert file_hash == core._file_hash(file_path, sampled=True)
+
+
+def test_deleted_sessions_leave_the_index(indexed_sessions):
+    session_id, path = indexed_sessions["session_id"], indexed_sessions["session_file"]
+    path.unlink()
+    assert core.build_index()["deleted"] == 1
+    assert core.meta(session_id) is None
+    assert core.search("JWT token validation") == []
+
+
+def test_stored_sessions_outlive_their_file(indexed_sessions, monkeypatch):
+    session_id, path = indexed_sessions["session_id"], indexed_sessions["session_file"]
+    monkeypatch.setattr(core, "MESSAGE_STORE", True)
+    core.build_index()
+    messages, info = core.read(session_id), core.meta(session_id)
+
+    path.rename(path.with_suffix(".jsonl.gz"))
+    stats = core.build_index()
+    assert stats["missing"] == 1 and "deleted" not in stats
+    assert core.read(session_id) == messages
+    assert core.meta(session_id) == info
+
+    # Without the message store they are removed like deleted ones; the
+    # first sync drops the store, the next one sweeps the session
+    monkeypatch.setattr(core, "MESSAGE_STORE", False)
+    assert "deleted" not in core.build_index()
+    assert core.build_index()["deleted"] == 1
+    assert core.read(session_id) == []
+
+
+def test_trace_callback_gets_phase_timings(indexed_sessions):
+    traces = []
+    stats = core.build_index(force=True, trace=traces.append)
+    timings = traces[0]["timings"]
+    assert traces[0]["operation"] == "build_index"
+    assert traces[0]["bytes_read"] == stats["bytes_read"]
+    assert {"discovery", "parsing", "embedding", "store_write"} <= timings.keys()
+    assert all(seconds <= timings["total"] for seconds in timings.values())
@@ -0,0 +1,39 @@
+"""Tests of the index watcher."""
+
+import json
+import threading
+import time
+
+from cc_dev.sessions import core
+from cc_dev.sessions.watch import watch
+
+
+def _wait_for(condition, seconds: float = 30.0) -> None:
+    deadline = time.monotonic() + seconds
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_watcher_syncs_changed_file(indexed_sessions, monkeypatch):
+    """After its first sync, the watcher syncs just the file that changed."""
+    session_id, path = indexed_sessions["session_id"], indexed_sessions["session_file"]
+    users = core.meta(session_id)["message_counts"]["user"]
+
+    syncs = []
+    build_index = core.build_index
+    monkeypatch.setattr(core, "build_index",
+                        lambda **kwargs: syncs.append(kwargs) or build_index(**kwargs))
+    stop = threading.Event()
+    watcher = threading.Thread(target=watch, kwargs={"poll": 0.05, "debounce": 0.0, "stop": stop})
+    watcher.start()
+    try:
+        _wait_for(lambda: syncs)
+        with open(path, "a") as f:
+            f.write(json.dumps({"type": "user", "message": {"role": "user", "content": "Watch this"},
+                                "timestamp": "2026-01-05T10:09:00Z"}) + "\n")
+        _wait_for(lambda: core.meta(session_id)["message_counts"]["user"] > users)
+    finally:
+        stop.set()
+        watcher.join()
+    assert syncs[1] == {"paths": [path]}
+    assert core.meta(session_id)["message_counts"]["user"] == users + 1